@@ -3,6 +3,7 @@ __all__ = [
 ]
 
 import sys
+from contextvars import ContextVar
 from pathlib import Path
 from datetime import datetime
 from typing import List, Union
@@ -26,6 +27,9 @@ def _get_work_path(path: Path = Path.cwd()):
 
 sys.path.append(str(_get_work_path()))
 robot = Robot()
+# 当前协程上下文中运行的爬虫及其配置，同一事件循环中运行多个爬虫时互不干扰
+_current_spider = ContextVar('spider', default=None)
+_current_settings = ContextVar('settings', default=None)
 
 
 class Browser:
@@ -85,11 +89,11 @@ class GlobalConstant:
 
     @property
     def spider(self):
-        return self._spider
+        return _current_spider.get() or self._spider
 
     @property
     def settings(self) -> sts:
-        return self._settings or sts
+        return _current_settings.get() or self._settings or sts
 
     @property
     def download_middleware(self):
@@ -112,10 +116,12 @@ class GlobalConstant:
     @spider.setter
     def spider(self, k):
         self._spider = k
+        _current_spider.set(k)
 
     @settings.setter
     def settings(self, k):
         self._settings = k
+        _current_settings.set(k)
 
     @download_middleware.setter
     def download_middleware(self, k):
@@ -3,7 +3,8 @@ from typing import List
 
 from AioSpider.cmd import (
     ArgsP, ArgsS, ArgsI, ArgsO, ArgsH, OptionsU,
-    OptionsEn, OptionsS, OptionsT, OptionsD
+    OptionsEn, OptionsS, OptionsT, OptionsD, OptionsN, OptionsC,
+    OptionsH, OptionsL, OptionsB, OptionsE, OptionsM
 )
 from AioSpider.cmd.cmd import (
     CommandName, HelpCommand, ListCommand, VirsionCommand
@@ -12,6 +13,7 @@ from AioSpider.cmd.make import MakeCommand
 from AioSpider.cmd.create import CreateCommand
 from AioSpider.cmd.test import TestCommand
 from AioSpider.cmd.server import ServerCommand
+from AioSpider.cmd.bench import BenchCommand
 
 
 class Client:
@@ -38,6 +40,7 @@ class Client:
             '-h': HelpCommand,
             '-v': VirsionCommand,
             'server': ServerCommand,
+            'bench': BenchCommand,
         }
         try:
             return command_mapping[cmd_name]()
@@ -90,6 +93,13 @@ class Client:
             '--s': OptionsS,
             '--t': OptionsT,
             '--d': OptionsD,
+            '--n': OptionsN,
+            '--c': OptionsC,
+            '--h': OptionsH,
+            '--l': OptionsL,
+            '--b': OptionsB,
+            '--e': OptionsE,
+            '--m': OptionsM,
         }
         for option, name in options:
             command.add_options(option_mapping[option](name))
@@ -115,6 +125,7 @@ if __name__ == '__main__':
     # argv = ['aioSpider', 'stopServer']
     # argv = ['aioSpider', 'make', 'model', '-i', r'D:\companyspider\utils\table.txt']
     # argv = ['aioSpider', 'test', 'proxy', '-p', 'http://127.0.0.1:7890', '--d', '5']
+    # argv = ['aioSpider', 'bench', 'crawl', '--n', '2000', '--c', '100', '--l', '20', '-o', r'D:\bench.csv']
     # argv = ['aioSpider', '-h']
     # argv = ['aioSpider', '-v']
     # argv = ['aioSpider', 'make', 'bat', '-o', r'D:\companyspider\utils\table.txt']
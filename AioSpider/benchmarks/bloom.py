@@ -0,0 +1,125 @@
+"""
+布隆过滤器基准测试，对比旧版按盐值多次摘要的实现、双重哈希实现和布谷鸟过滤器的添加、查询耗时、实际误判率和内存占用
+
+    python -m AioSpider.benchmarks.bloom
+    python -m AioSpider.benchmarks.bloom -n 10000000 --skip-legacy
+"""
+
+import time
+import argparse
+
+import bitarray
+
+from AioSpider.filter.bloom import BloomFilter, make_hash_funcs
+from AioSpider.filter.cuckoo import CuckooFilter
+
+
+class LegacyBloomFilter:
+    """旧版实现：每个元素按盐值计算多次 SHA/MD5 摘要，逐位读写"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        reference = BloomFilter(capacity, error_rate)
+        self.num_slices = reference.num_slices
+        self.bits_per_slice = reference.bits_per_slice
+        self.make_hashes = make_hash_funcs(self.num_slices, self.bits_per_slice)
+        self.bitarray = bitarray.bitarray(reference.num_bits, endian='little')
+        self.bitarray.setall(False)
+
+    def __contains__(self, key):
+        offset = 0
+        for k in self.make_hashes(key):
+            if not self.bitarray[offset + k]:
+                return False
+            offset += self.bits_per_slice
+        return True
+
+    def add(self, key):
+        offset = 0
+        for k in self.make_hashes(key):
+            self.bitarray[offset + k] = True
+            offset += self.bits_per_slice
+
+
+def _timeit(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run(n: int, error_rate: float, legacy: bool = True) -> list:
+    """返回每种实现的添加、查询耗时（秒）、单次操作耗时（微秒）和误判率"""
+
+    keys = [f'https://example.com/item/{i}' for i in range(n)]
+    # 查询一半已添加、一半未添加的元素
+    probes = keys[::2] + [f'https://example.com/miss/{i}' for i in range(n // 2)]
+    misses = n // 2
+
+    items = []
+
+    def record(name, add, contains, nbytes):
+        add_time = _timeit(add)
+        hits = []
+        contains_time = _timeit(lambda: hits.append(contains()))
+        false_positive = int(sum(hits[0][len(probes) - misses:])) / misses
+        items.append({
+            'impl': name,
+            'add(s)': round(add_time, 2),
+            'contains(s)': round(contains_time, 2),
+            'add(us/key)': round(add_time / n * 1e6, 3),
+            'contains(us/key)': round(contains_time / len(probes) * 1e6, 3),
+            'false positive': f'{false_positive:.5f}',
+            'memory(MB)': round(nbytes() / 1024 / 1024, 2),
+        })
+
+    if legacy:
+        bloom = LegacyBloomFilter(n, error_rate)
+        record(
+            'legacy add/in', lambda: [bloom.add(k) for k in keys], lambda: [k in bloom for k in probes],
+            lambda: len(bloom.bitarray) // 8
+        )
+
+    bloom = BloomFilter(n, error_rate)
+    record(
+        'double hash add/in', lambda: [bloom.add(k, skip_check=True) for k in keys],
+        lambda: [k in bloom for k in probes], lambda: len(bloom.bitarray) // 8
+    )
+
+    bloom = BloomFilter(n, error_rate)
+    record(
+        'add_many/contains_many', lambda: bloom.add_many(keys, skip_check=True),
+        lambda: bloom.contains_many(probes), lambda: len(bloom.bitarray) // 8
+    )
+
+    cuckoo = CuckooFilter(n, error_rate)
+    record(
+        'cuckoo add/in', lambda: [cuckoo.add(k) for k in keys], lambda: [k in cuckoo for k in probes],
+        lambda: cuckoo.nbytes
+    )
+
+    cuckoo = CuckooFilter(n, error_rate)
+    record(
+        'cuckoo add_many/contains_many', lambda: cuckoo.add_many(keys), lambda: cuckoo.contains_many(probes),
+        lambda: cuckoo.nbytes
+    )
+
+    return items
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='AioSpider 布隆过滤器基准测试')
+    parser.add_argument('-n', type=int, default=1000000, help='添加的元素数量')
+    parser.add_argument('--error-rate', type=float, default=0.001, help='目标误判率')
+    parser.add_argument('--skip-legacy', action='store_true', help='不运行旧版实现，元素较多时旧版实现耗时很长')
+    args = parser.parse_args(argv)
+
+    from AioSpider import pretty_table
+
+    items = run(args.n, args.error_rate, legacy=not args.skip_legacy)
+
+    print(f'n={args.n}, error_rate={args.error_rate}：')
+    print(pretty_table(items))
+
+
+if __name__ == '__main__':
+    main()
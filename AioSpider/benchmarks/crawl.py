@@ -0,0 +1,275 @@
+"""
+爬取吞吐基准测试，启动本地模拟站点，通过 Engine 运行参考爬虫，数据分别写入 SQLite 和 CSV
+统计请求速度、下载延迟分位数、内存峰值和入库速度，每种数据引擎在独立的子进程中运行
+
+    python -m AioSpider.benchmarks.crawl
+    python -m AioSpider.benchmarks.crawl -n 5000 --latency 50 --error-rate 0.01 --sink csv -o bench.csv
+"""
+
+import sys
+import csv
+import json
+import time
+import types
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+from AioSpider import field, models
+from AioSpider.constants import SchedulerMode, Stage
+from AioSpider.http import Request
+from AioSpider.spider import Spider
+
+
+SINKS = ('sqlite', 'csv')
+
+
+class BenchSQLiteItem(models.SQLiteModel):
+
+    item_id = field.IntField(name='数据ID')
+    title = field.CharField(name='标题', max_length=50)
+    size = field.IntField(name='响应大小')
+
+
+class BenchCSVItem(models.CSVModel):
+
+    item_id = field.IntField(name='数据ID')
+    title = field.CharField(name='标题', max_length=50)
+    size = field.IntField(name='响应大小')
+
+
+class ListDetailSpider(Spider):
+    """参考爬虫：列表页 -> 详情页 -> 数据入库"""
+
+    name = 'bench'
+    source = 'bench'
+
+    ports = []
+    pages = 0
+    item_model = BenchSQLiteItem
+
+    class SpiderRequestConfig:
+        REQUEST_SCHEDULER_MODE = SchedulerMode.window
+        REQUEST_CONCURRENCY_SLEEP = 0
+        RANDOM_HEADERS = False
+        RETRY_STATUS = [429, 500, 503]
+
+    class ConcurrencyStrategyConfig:
+        fix = {
+            'enabled': True,
+            'task_limit': 100
+        }
+
+    class RequestFilterConfig:
+        Enabled = False
+
+    def start_requests(self):
+        for page in range(self.pages):
+            port = self.ports[page % len(self.ports)]
+            yield Request(f'http://127.0.0.1:{port}/list/{page}', callback=self.parse, help='list')
+
+    def parse(self, response):
+        for href in response.xpath('//a[@class="item"]/@href').extract():
+            yield Request(response.request.website + href, callback=self.parse_detail, help='detail')
+
+    def parse_detail(self, response):
+        yield self.item_model(
+            item_id=int(response.request.url.rsplit('/', 1)[-1]),
+            title=response.xpath('//title/text()').extract_first(),
+            size=len(response.content)
+        )
+
+
+def _install_settings(workdir: Path):
+    """基准测试不依赖项目目录，使用内存中的 settings 和 middleware 模块代替项目中的同名模块"""
+
+    sts = types.ModuleType('settings')
+
+    class SystemConfig:
+        AioSpiderPath = workdir
+        StageMetrics = True
+        StageMetricsInterval = 0
+
+    class LoggingConfig:
+        Console = {'engine': False}
+        File = {'engine': False}
+
+    class DataBaseConfig:
+        Csv = {'enabled': True, 'CONNECT': {'DEFAULT': {'CSV_PATH': workdir / 'data', 'ENCODING': 'utf-8'}}}
+        Sqlite = {
+            'enabled': True,
+            'CONNECT': {
+                'DEFAULT': {
+                    'SQLITE_PATH': workdir / 'data', 'SQLITE_DB': 'bench', 'CHUNK_SIZE': 20 * 1024 * 1024,
+                    'SQLITE_TIMEOUT': 10
+                },
+            },
+        }
+
+    sts.SystemConfig = SystemConfig
+    sts.LoggingConfig = LoggingConfig
+    sts.DataBaseConfig = DataBaseConfig
+    sys.modules['settings'] = sts
+    sys.modules['middleware'] = types.ModuleType('middleware')
+
+
+def _peak_rss() -> float:
+    """进程内存峰值，单位MB，无法获取时返回0"""
+
+    try:
+        import resource
+    except ImportError:
+        pass
+    else:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 单位为字节，Linux 为KB
+        return round(rss / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)
+
+    try:
+        import psutil
+    except ImportError:
+        return 0
+    else:
+        return round(psutil.Process().memory_info().peak_wset / 1024 / 1024, 1)
+
+
+def run_sink(sink: str, ports: list, pages: int, concurrency: int) -> dict:
+    """在当前进程中运行一次参考爬虫，返回统计结果"""
+
+    from AioSpider.core import Engine
+
+    workdir = Path(tempfile.mkdtemp(prefix='aiospider-bench-'))
+    _install_settings(workdir)
+
+    ListDetailSpider.ports = ports
+    ListDetailSpider.pages = pages
+    ListDetailSpider.item_model = BenchSQLiteItem if sink == 'sqlite' else BenchCSVItem
+    ListDetailSpider.ConcurrencyStrategyConfig.fix['task_limit'] = concurrency
+
+    engine = Engine()
+    engine.add_spider(ListDetailSpider)
+
+    start = time.perf_counter()
+    engine.start()
+    elapsed = time.perf_counter() - start
+
+    fetch = engine.metrics.histograms.get((Stage.fetch, 'all', ''))
+    requests = fetch.count if fetch else 0
+
+    return {
+        'sink': sink, 'concurrency': concurrency, 'requests': requests, 'items': engine.data_count,
+        'elapsed(s)': round(elapsed, 3), 'requests/s': round(requests / elapsed, 1),
+        'items/s': round(engine.data_count / elapsed, 1),
+        'p50(ms)': round(fetch.percentile(50) * 1000, 2) if fetch else 0,
+        'p99(ms)': round(fetch.percentile(99) * 1000, 2) if fetch else 0,
+        'peak_rss(MB)': _peak_rss(),
+    }
+
+
+def run(
+        pages: int = 50, hosts: int = 4, latency: float = 20, size: int = 2048, error_rate: float = 0,
+        host_limit: int = 0, concurrency: int = 100, sinks=SINKS, links: int = 20
+) -> list:
+    """
+    启动模拟站点并依次在子进程中运行各数据引擎的基准
+    Args:
+        pages: 列表页数量，总请求数为 pages * (links + 1)
+        hosts: 模拟站点数量
+        latency: 平均响应延迟，毫秒
+        size: 详情页响应大小，字节
+        error_rate: 模拟站点返回500的概率
+        host_limit: 单站点最大并发，超过时返回429
+        concurrency: 爬虫并发数
+        sinks: 数据引擎
+        links: 每个列表页的详情页数量
+    Return:
+        每个数据引擎一行统计结果
+    """
+
+    from AioSpider.benchmarks.server import start_server
+
+    ports, stop = start_server(
+        hosts=hosts, latency=latency, size=size, error_rate=error_rate, host_limit=host_limit, links=links
+    )
+
+    results = []
+
+    try:
+        for sink in sinks:
+            proc = subprocess.run(
+                [
+                    sys.executable, '-m', 'AioSpider.benchmarks.crawl', '--run', sink,
+                    '--ports', ','.join(map(str, ports)), '--pages', str(pages), '-c', str(concurrency)
+                ],
+                capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                print(f'{sink} 基准运行失败：\n{proc.stderr}')
+                continue
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    finally:
+        stop()
+
+    return results
+
+
+def save(results: list, path: Path):
+    """将结果追加写入CSV，便于跨版本对比"""
+
+    path = Path(path)
+    exists = path.exists()
+
+    with path.open('a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['time'] + list(results[0].keys()))
+        if not exists:
+            writer.writeheader()
+        for row in results:
+            writer.writerow({'time': time.strftime('%Y-%m-%d %H:%M:%S'), **row})
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='AioSpider 爬取吞吐基准测试')
+    parser.add_argument('-n', type=int, default=2000, help='总请求数量')
+    parser.add_argument('-c', type=int, default=100, help='爬虫并发数')
+    parser.add_argument('--hosts', type=int, default=4, help='模拟站点数量')
+    parser.add_argument('--latency', type=float, default=20, help='平均响应延迟，毫秒')
+    parser.add_argument('--size', type=int, default=2048, help='详情页响应大小，字节')
+    parser.add_argument('--error-rate', type=float, default=0, help='模拟站点返回500的概率')
+    parser.add_argument('--host-limit', type=int, default=0, help='单站点最大并发，超过时返回429')
+    parser.add_argument('--sink', choices=SINKS, default=None, help='只运行指定数据引擎')
+    parser.add_argument('-o', default=None, help='结果追加写入的CSV文件')
+    # 以下参数由主进程传给子进程
+    parser.add_argument('--run', choices=SINKS, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--ports', default='', help=argparse.SUPPRESS)
+    parser.add_argument('--pages', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run:
+        ports = [int(i) for i in args.ports.split(',')]
+        print(json.dumps(run_sink(args.run, ports, args.pages, args.c)))
+        return
+
+    links = 20
+    results = run(
+        pages=max(args.n // (links + 1), 1), hosts=args.hosts, latency=args.latency, size=args.size,
+        error_rate=args.error_rate, host_limit=args.host_limit, concurrency=args.c,
+        sinks=(args.sink,) if args.sink else SINKS, links=links
+    )
+
+    if not results:
+        return
+
+    from AioSpider import pretty_table
+
+    print(f'爬取吞吐基准测试，延迟 {args.latency}ms，响应 {args.size} 字节，错误率 {args.error_rate}：')
+    print(pretty_table(results))
+
+    if args.o:
+        save(results, args.o)
+        print(f'结果已追加写入 {args.o}')
+
+
+if __name__ == '__main__':
+    main()
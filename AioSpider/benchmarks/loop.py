@@ -0,0 +1,103 @@
+"""
+事件循环开销基准测试，对比各事件循环模式下创建任务和 await 的开销
+每种模式在独立的子进程中运行，因为嵌套补丁一旦打上就无法在进程内恢复
+
+    python -m AioSpider.benchmarks.loop
+    python -m AioSpider.benchmarks.loop -n 200000
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+
+from AioSpider.constants import LoopMode
+
+
+async def _noop():
+    pass
+
+
+async def bench_create_task(n: int):
+    """创建并等待 n 个任务"""
+    await asyncio.gather(*[asyncio.ensure_future(_noop()) for _ in range(n)])
+
+
+async def bench_await_future(n: int):
+    """逐个 await n 个由事件循环完成的 Future"""
+
+    loop = asyncio.get_event_loop()
+
+    for _ in range(n):
+        future = loop.create_future()
+        loop.call_soon(future.set_result, None)
+        await future
+
+
+async def bench_sleep_zero(n: int):
+    """await asyncio.sleep(0) n 次，衡量让出事件循环的开销"""
+    for _ in range(n):
+        await asyncio.sleep(0)
+
+
+BENCHMARKS = {
+    'create_task': bench_create_task,
+    'await_future': bench_await_future,
+    'sleep_zero': bench_sleep_zero,
+}
+
+
+def run_mode(mode: str, n: int) -> dict:
+    """在当前进程中以指定模式运行所有基准，返回每次操作的耗时（微秒）"""
+
+    from AioSpider.core.loop import setup_event_loop
+
+    loop = setup_event_loop(mode)
+    result = {'mode': mode, 'task_class': f'{asyncio.Task.__module__}.{asyncio.Task.__name__}'}
+
+    for name, bench in BENCHMARKS.items():
+        # 预热
+        loop.run_until_complete(bench(min(n, 1000)))
+        start = time.perf_counter()
+        loop.run_until_complete(bench(n))
+        result[name] = round((time.perf_counter() - start) / n * 1e6, 3)
+
+    loop.close()
+    return result
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='AioSpider 事件循环开销基准测试')
+    parser.add_argument('-n', type=int, default=100000, help='每项基准的操作次数')
+    parser.add_argument('--mode', default=None, help='只在当前进程中运行指定模式并输出json')
+    args = parser.parse_args(argv)
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.n)))
+        return
+
+    from AioSpider import pretty_table
+
+    items = []
+    for mode in (LoopMode.nested, LoopMode.fast, LoopMode.uvloop):
+        proc = subprocess.run(
+            [sys.executable, '-m', 'AioSpider.benchmarks.loop', '-n', str(args.n), '--mode', mode],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f'{mode} 模式运行失败：\n{proc.stderr}')
+            continue
+        items.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    if not items:
+        return
+
+    print(f'单次操作耗时（微秒），n={args.n}：')
+    print(pretty_table(items))
+
+
+if __name__ == '__main__':
+    main()
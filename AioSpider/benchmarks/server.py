@@ -0,0 +1,170 @@
+"""
+基准测试用的本地HTTP服务，模拟目标站点的延迟、响应大小、错误率和单站点并发限制
+每个站点监听一个端口，爬虫按 127.0.0.1:port 区分站点
+
+    python -m AioSpider.benchmarks.server --hosts 4 --latency 20 --size 2048
+"""
+
+__all__ = ['BenchServer', 'start_server']
+
+import random
+import asyncio
+import argparse
+import multiprocessing
+
+from aiohttp import web
+
+
+class BenchServer:
+    """
+    模拟站点
+    Args:
+        hosts: 站点数量，每个站点占用一个端口
+        port: 起始端口，0 表示由系统分配
+        latency: 平均响应延迟，单位毫秒
+        jitter: 延迟抖动比例，实际延迟在 latency * (1 ± jitter) 之间
+        size: 详情页响应大小，单位字节
+        error_rate: 返回500的概率
+        host_limit: 单站点最大并发，超过时返回429，0 表示不限制
+        links: 每个列表页包含的详情页链接数量
+    """
+
+    def __init__(
+            self, hosts: int = 4, port: int = 0, latency: float = 20, jitter: float = 0.5, size: int = 2048,
+            error_rate: float = 0, host_limit: int = 0, links: int = 20
+    ):
+        self.hosts = hosts
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.size = size
+        self.error_rate = error_rate
+        self.host_limit = host_limit
+        self.links = links
+
+        self.ports = []
+        self._runner = None
+        self._active = {}
+        self._body = ('<p>' + 'x' * max(size - 7, 0) + '</p>').encode()
+
+    async def _delay(self):
+        if self.latency:
+            jitter = self.latency * self.jitter
+            await asyncio.sleep(max(self.latency + random.uniform(-jitter, jitter), 0) / 1000)
+
+    @web.middleware
+    async def _limit(self, request: web.Request, handler):
+
+        port = request.url.port
+
+        if self.host_limit and self._active.get(port, 0) >= self.host_limit:
+            return web.Response(status=429, text='too many requests')
+
+        self._active[port] = self._active.get(port, 0) + 1
+
+        try:
+            await self._delay()
+            if self.error_rate and random.random() < self.error_rate:
+                return web.Response(status=500, text='server error')
+            return await handler(request)
+        finally:
+            self._active[port] -= 1
+
+    async def list_page(self, request: web.Request):
+
+        page = int(request.match_info['page'])
+        links = ''.join(
+            f'<a class="item" href="/detail/{page * self.links + i}">item {page * self.links + i}</a>'
+            for i in range(self.links)
+        )
+
+        return web.Response(text=f'<html><body>{links}</body></html>', content_type='text/html')
+
+    async def detail_page(self, request: web.Request):
+
+        item_id = request.match_info['id']
+        html = f'<html><head><title>item {item_id}</title></head><body><h1>{item_id}</h1>'.encode()
+
+        return web.Response(body=html + self._body + b'</body></html>', content_type='text/html')
+
+    async def start(self):
+
+        app = web.Application(middlewares=[self._limit])
+        app.router.add_get('/list/{page}', self.list_page)
+        app.router.add_get('/detail/{id}', self.detail_page)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+
+        for i in range(self.hosts):
+            site = web.TCPSite(self._runner, '127.0.0.1', self.port + i if self.port else 0)
+            await site.start()
+            self.ports.append(site._server.sockets[0].getsockname()[1])
+
+        return self.ports
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+def _serve(kwargs: dict, conn):
+
+    async def main():
+        server = BenchServer(**kwargs)
+        conn.send(await server.start())
+        # 阻塞直到主进程发送关闭信号
+        await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+        await server.close()
+
+    asyncio.run(main())
+
+
+def start_server(**kwargs):
+    """
+    在子进程中启动模拟站点，避免服务端和爬虫争用同一个事件循环
+    Return:
+        (端口列表, 关闭函数)
+    """
+
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve, args=(kwargs, child), name='AioSpider-bench-server', daemon=True)
+    process.start()
+    ports = parent.recv()
+
+    def stop():
+        parent.send(None)
+        process.join(5)
+        if process.is_alive():
+            process.terminate()
+
+    return ports, stop
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='AioSpider 基准测试模拟站点')
+    parser.add_argument('--hosts', type=int, default=4, help='站点数量')
+    parser.add_argument('--port', type=int, default=8600, help='起始端口')
+    parser.add_argument('--latency', type=float, default=20, help='平均响应延迟，毫秒')
+    parser.add_argument('--size', type=int, default=2048, help='详情页响应大小，字节')
+    parser.add_argument('--error-rate', type=float, default=0, help='返回500的概率')
+    parser.add_argument('--host-limit', type=int, default=0, help='单站点最大并发')
+    args = parser.parse_args(argv)
+
+    async def serve():
+        server = BenchServer(
+            hosts=args.hosts, port=args.port, latency=args.latency, size=args.size,
+            error_rate=args.error_rate, host_limit=args.host_limit
+        )
+        print(f'模拟站点已启动，端口：{await server.start()}')
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,8 @@ from AioSpider.cmd.args import (
     AioSpiderArgs, ArgsP, ArgsS, ArgsI, ArgsO, ArgsH
 )
 from AioSpider.cmd.options import (
-    AioSpiderOptions, OptionsU, OptionsEn, OptionsS, OptionsT, OptionsD
+    AioSpiderOptions, OptionsU, OptionsEn, OptionsS, OptionsT, OptionsD, OptionsN, OptionsC, OptionsH,
+    OptionsL, OptionsB, OptionsE, OptionsM
 )
 from AioSpider.cmd.cmd import (
     CommandName, AioSpiderCommand, HelpCommand, ListCommand, VirsionCommand
@@ -0,0 +1,93 @@
+from AioSpider.cmd.cmd import AioSpiderCommand, CommandName
+from AioSpider.cmd.args import AioSpiderArgs, ArgsO, ArgsH
+from AioSpider.cmd.options import (
+    AioSpiderOptions, OptionsN, OptionsC, OptionsH, OptionsL, OptionsB, OptionsE, OptionsM, OptionsS
+)
+
+
+class BenchCommand(AioSpiderCommand):
+
+    def execute(self):
+
+        name = self.command_name.name if self.command_name else 'crawl'
+
+        if name == 'crawl':
+            self.bench_crawl()
+        elif name == 'loop':
+            self.bench_loop()
+        elif name == 'bloom':
+            self.bench_bloom()
+        else:
+            raise Exception(f'command error, AioSpider bench 没有该参数，AioSpider {ArgsH()} 查看帮助')
+
+    def bench_crawl(self):
+        """
+        爬取吞吐基准测试   aioSpider bench crawl --n 2000 --c 100 --l 20 --b 2048 --e 0.01 --m 50 --s csv -o bench.csv
+            --n: 总请求数量
+            --c: 爬虫并发数
+            --h: 模拟站点数量
+            --l: 平均响应延迟，毫秒
+            --b: 详情页响应大小，字节
+            --e: 模拟站点返回500的概率
+            --m: 单站点最大并发，超过时返回429
+            --s: 只运行指定数据引擎，sqlite 或 csv
+            -o: 结果追加写入的CSV文件
+        """
+
+        from AioSpider.benchmarks import crawl
+
+        flags = {
+            OptionsN: '-n', OptionsC: '-c', OptionsH: '--hosts', OptionsL: '--latency', OptionsB: '--size',
+            OptionsE: '--error-rate', OptionsM: '--host-limit', OptionsS: '--sink',
+        }
+
+        argv = []
+
+        for option in self.options:
+            if type(option) in flags:
+                argv.extend([flags[type(option)], option.name])
+
+        for arg in self.args:
+            if isinstance(arg, ArgsO):
+                argv.extend(['-o', arg.name])
+
+        crawl.main(argv)
+
+    def bench_loop(self):
+        """
+        事件循环开销基准测试   aioSpider bench loop --n 100000
+        """
+
+        from AioSpider.benchmarks import loop
+
+        argv = []
+
+        for option in self.options:
+            if isinstance(option, OptionsN):
+                argv.extend(['-n', option.name])
+
+        loop.main(argv)
+
+    def bench_bloom(self):
+        """
+        布隆过滤器基准测试   aioSpider bench bloom --n 1000000
+        """
+
+        from AioSpider.benchmarks import bloom
+
+        argv = []
+
+        for option in self.options:
+            if isinstance(option, OptionsN):
+                argv.extend(['-n', option.name])
+
+        bloom.main(argv)
+
+    def add_name(self, name: CommandName):
+        self.command_name = name
+
+    def add_args(self, args: AioSpiderArgs):
+        self.args.append(args)
+
+    def add_options(self, option: AioSpiderOptions):
+        self.options.append(option)
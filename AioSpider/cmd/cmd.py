@@ -56,6 +56,18 @@ class HelpCommand(AioSpiderCommand):
         -argv:
             -i: 输入路径(inputPath)
             -o: 输出路径(outputPath)
+    aioSpider bench sth [--option value]
+        sth:
+            crawl: 启动本地模拟站点运行参考爬虫，统计请求速度、延迟分位数、内存峰值和入库速度
+                exp: aioSpider bench crawl --n 2000 --c 100 --l 20
+                exp: aioSpider bench crawl --n 5000 --e 0.01 --m 50 --s csv -o D:\\bench.csv
+            loop: 对比各事件循环模式下创建任务和 await 的开销
+                exp: aioSpider bench loop --n 100000
+            bloom: 对比旧版布隆过滤器、双重哈希布隆过滤器和布谷鸟过滤器的单个和批量添加、查询耗时及内存占用
+                exp: aioSpider bench bloom --n 10000000
+        --option:
+            --n: 请求数量/操作次数    --c: 并发数    --h: 站点数量    --l: 响应延迟(ms)
+            --b: 响应大小(字节)    --e: 错误率    --m: 单站点并发限制    --s: 数据引擎(sqlite/csv)
         """)
 
     def add_name(self, *args, **kwargs):
@@ -48,3 +48,52 @@ class OptionsD(AioSpiderOptions):
     def __init__(self, name=None):
         self.p = '--d'
         self.name = name
+
+
+class OptionsN(AioSpiderOptions):
+
+    def __init__(self, name=None):
+        self.p = '--n'
+        self.name = name
+
+
+class OptionsC(AioSpiderOptions):
+
+    def __init__(self, name=None):
+        self.p = '--c'
+        self.name = name
+
+
+class OptionsH(AioSpiderOptions):
+
+    def __init__(self, name=None):
+        self.p = '--h'
+        self.name = name
+
+
+class OptionsL(AioSpiderOptions):
+
+    def __init__(self, name=None):
+        self.p = '--l'
+        self.name = name
+
+
+class OptionsB(AioSpiderOptions):
+
+    def __init__(self, name=None):
+        self.p = '--b'
+        self.name = name
+
+
+class OptionsE(AioSpiderOptions):
+
+    def __init__(self, name=None):
+        self.p = '--e'
+        self.name = name
+
+
+class OptionsM(AioSpiderOptions):
+
+    def __init__(self, name=None):
+        self.p = '--m'
+        self.name = name
@@ -1,7 +1,8 @@
 __all__ = [
     'Path', 'LogLevel', 'TimeFormater', 'Formater', 'UserAgent', 'WriteMode', 'Browser', 
     'PaddingMode', 'AESMode', 'ProxyPoolStrategy', 'RequestWay', 'ProxyType', 'ModelNameType', 
-    'BackendEngine', 'ProxyVerifySource', 'RequestMethod', 'NoticeType'
+    'BackendEngine', 'ProxyVerifySource', 'RequestMethod', 'NoticeType', 'SchedulerMode', 'LoopMode',
+    'Stage', 'RequestState'
 ]
 
 
@@ -14,6 +15,15 @@ class BackendEngine:
 
     queue = 'queue'
     redis = 'redis'
+    disk = 'disk'               # 内存中保留部分请求，其余请求溢写到本地磁盘
+
+
+class LoopMode:
+    """事件循环模式"""
+
+    nested = 'nested'           # 兼容模式，给asyncio打补丁以支持嵌套事件循环
+    fast = 'fast'               # 高性能模式，不打补丁，使用C实现的Task和Future
+    uvloop = 'uvloop'           # 高性能模式，并使用uvloop作为事件循环
 
 
 class LogLevel:
@@ -184,6 +194,36 @@ class RequestWay:
 
     aiohttp = 'aiohttp'
     requests = 'requests'
+
+
+class SchedulerMode:
+    """请求调度模式"""
+
+    batch = 'batch'             # 批次模式，每批 task_limit 个请求全部完成后再调度下一批
+    window = 'window'           # 滑动窗口模式，维持 task_limit 个并发请求，任一请求完成立即补位
+
+
+class Stage:
+    """请求处理阶段，用于耗时统计"""
+
+    waiting = 'waiting'         # waiting队列等待时间
+    spider_mw = 'spider_mw'     # 爬虫中间件
+    download_mw = 'download_mw' # 下载中间件
+    fetch = 'fetch'             # 网络请求
+    decode = 'decode'           # 响应解码
+    callback = 'callback'       # 解析回调，不含数据提交
+    commit = 'commit'           # 数据提交
+
+    ALL = (waiting, spider_mw, download_mw, fetch, decode, callback, commit)
+
+
+class RequestState:
+    """请求在请求池中的状态"""
+
+    waiting = 'waiting'         # 等待调度
+    pending = 'pending'         # 正在下载
+    failure = 'failure'         # 失败待重试
+    done = 'done'               # 已完成，包括成功和失败次数超限被丢弃的请求
     
 
 RequestMethod = ['GET', 'POST']
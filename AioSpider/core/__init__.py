@@ -1,3 +1,5 @@
-__all__ = ['Engine']
+__all__ = ['Engine', 'SpiderRunner', 'BatchScheduler']
 
 from AioSpider.core.engine import Engine
+from AioSpider.core.runner import SpiderRunner
+from AioSpider.core.batch import BatchScheduler
@@ -0,0 +1,26 @@
+__all__ = ['BatchScheduler']
+
+from typing import Callable, Union
+
+from AioSpider.core.runner import SpiderRunner
+from AioSpider.spider import BatchSpider
+
+
+class BatchScheduler(SpiderRunner):
+    """
+    批次爬虫调度器，在同一个事件循环中运行多个批次爬虫
+    每个爬虫按各自的 next_time 异步等待，下载器会话和数据库连接池由所有爬虫共用
+    Args:
+        concurrency: 所有爬虫共享的并发总数，为 None 时读取 SystemConfig.GlobalConcurrency，仍为 None 则不限制
+        loop_mode: 事件循环模式，为 None 时从配置中读取
+    """
+
+    def add_spider(self, spider: Union[BatchSpider, Callable], *args, **kwargs):
+
+        super().add_spider(spider, *args, **kwargs)
+
+        if not isinstance(self.engines[-1].spider, BatchSpider):
+            self.engines.pop()
+            raise Exception(f'{spider} 不是批次爬虫类！')
+
+        return self
@@ -1,9 +1,13 @@
 import asyncio
+import contextvars
+import functools
 import inspect
 import itertools
+import multiprocessing
 import os
 import time
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pprint import pformat
 from typing import Callable, Union
@@ -11,7 +15,11 @@ from typing import Callable, Union
 from AioSpider import (
     GlobalConstant, logger, pretty_table, tools, welcom_print
 )
-from AioSpider.core.patch import apply
+from AioSpider.constants import SchedulerMode, Stage
+from AioSpider.core.offload import OffloadExecutor
+from AioSpider.core.loop import setup_event_loop
+from AioSpider.core.metrics import StageMetrics
+from AioSpider.core.shard import ShardContext
 from AioSpider.datamanager import DataManager
 from AioSpider.downloader import Downloader
 from AioSpider.exceptions import *
@@ -23,12 +31,13 @@ from AioSpider.requestpool import RequestPool
 from AioSpider.spider import BatchSpider, Spider
 
 
-apply()
+# 批次爬虫任务表读写线程池，进程内所有引擎共用
+_task_executor: ThreadPoolExecutor = None
 
 
 class Engine:
 
-    def __init__(self):
+    def __init__(self, loop_mode: str = None):
 
         self.spider: Spider = None
         self.bootloader = BootLoader()
@@ -41,10 +50,25 @@ class Engine:
         self.connector = None
         self.datamanager: DataManager = None
         self.driver = None
-
-        # 开始事件循环
-        self.loop = asyncio.get_event_loop()
+        self.offload: OffloadExecutor = None
+        self.metrics: StageMetrics = None
+        self._metrics_time = 0
+        self._callback_params = {}
+        self.shard: ShardContext = None
+        self._spider_factory = None
+        # 由 BatchScheduler 统一管理下载器会话和数据库连接池时为True，引擎关闭时不释放共享资源
+        self.shared = False
+        # 多爬虫运行时的全局并发预算
+        self.budget = None
+
+        # 开始事件循环，loop_mode 为 None 时从配置中读取
+        self.loop = setup_event_loop(loop_mode)
         self.req_tasks = None
+        self._seed_count = 0
+        # {request.hash: 下载任务}，租约过期时取消对应的任务
+        self._crawl_tasks = {}
+        # 爬取正常结束时为True，中断退出时保留断点文件
+        self.finished = False
 
         self.start_time = time.time()
         self.start_time1 = datetime.now()
@@ -53,7 +77,10 @@ class Engine:
 
     def add_spider(self, spider: Union[Spider, Callable], *args, **kwargs):
 
-        if issubclass(spider, Spider):
+        # 多进程模式下，工作进程根据该信息重新实例化爬虫
+        self._spider_factory = (spider, args, kwargs)
+
+        if isinstance(spider, type) and issubclass(spider, Spider):
             self.spider = spider(*args, **kwargs)
             return
 
@@ -63,8 +90,15 @@ class Engine:
 
         raise Exception(f'{spider} 不是爬虫类！')
 
-    def start(self):
-        """启动引擎"""
+    def start(self, workers: int = 1):
+        """
+        启动引擎
+        Args:
+            workers: 工作进程数量，大于1时启动多个引擎进程，按域名哈希划分请求
+        """
+
+        if workers > 1:
+            return self._start_workers(workers)
 
         try:
             # 将协程注册到事件循环中
@@ -84,31 +118,76 @@ class Engine:
         finally:
             self.loop.run_until_complete(self.loop.shutdown_asyncgens())
 
+    def _start_workers(self, workers: int):
+        """启动多个引擎进程，请求按域名哈希分配到各进程，start_requests 只由第一个进程遍历，数据去重状态保存在共享内存中"""
+
+        if self._spider_factory is None:
+            raise Exception('未添加爬虫，请先调用 add_spider')
+
+        ctx = multiprocessing.get_context()
+        shard = ShardContext(workers, ctx)
+        spider, args, kwargs = self._spider_factory
+
+        processes = [
+            ctx.Process(
+                target=_run_worker, args=(spider, args, kwargs, shard, index), name=f'AioSpider-worker-{index}'
+            )
+            for index in range(workers)
+        ]
+
+        for p in processes:
+            p.start()
+
+        logger.info(f'已启动 {workers} 个工作进程，进程ID：{[p.pid for p in processes]}')
+
+        try:
+            for p in processes:
+                p.join()
+        except KeyboardInterrupt:
+            # 工作进程同样会收到中断信号并自行关闭，等待其退出即可
+            for p in processes:
+                p.join()
+            logger.error('手动退出')
+        finally:
+            item = [{
+                '进程数量': workers, '完成数量': shard.done_count.value, '数据数量': shard.item_count.value,
+                '运行时间': str(datetime.now() - self.start_time1)
+            }]
+            logger.info(f'所有工作进程已结束，汇总详情：\n{pretty_table(item)}')
+
     async def execute(self):
         """ 执行初始化start_urls里面的请求 """
 
         await self.open()
+        await self.run()
+        await self.close()
+
+    async def run(self):
         if isinstance(self.spider, BatchSpider):
             await self._scheduler_batch_spider()
         else:
             await self._scheduler_spider()
-        await self.close()
+        self.finished = True
 
     async def _init_request_pool(self) -> RequestPool:
-        request_pool = RequestPool(self.spider, self.settings, self.connector)
+        # 批次爬虫每次运行都会重新开始，不需要断点续爬
+        request_pool = RequestPool(
+            self.spider, self.settings, self.connector, shard=self.shard,
+            checkpoint=not isinstance(self.spider, BatchSpider), metrics=self.metrics
+        )
         await request_pool.loads_cache()
         return request_pool
 
     async def _init_dataloader(self) -> DataManager:
 
-        data_manager = DataManager(self.settings, self.connector, self.models)
+        data_manager = DataManager(self.settings, self.connector, self.models, shard=self.shard)
         logger.info(f'数据管理器已启动，加载到 {len(data_manager.models)} 个模型，\n{pformat(data_manager.models)}')
 
         await data_manager.open()
         return data_manager
 
     def _init_downloader(self) -> Downloader:
-        return Downloader(self.settings, self.download_middleware)
+        return Downloader(self.settings, self.download_middleware, metrics=self.metrics)
 
     def close_redis(self, port=6379):
 
@@ -140,8 +219,11 @@ class Engine:
         self.settings = self.bootloader.reload_settings(self.spider)
         self.bootloader.reload_logger(self.spider.name, self.settings)
         self.bootloader.reload_notice(self.spider.name, self.settings)
-        self.connector = await self.bootloader.reload_connection(self.settings)
+        if self.connector is None:
+            self.connector = await self.bootloader.reload_connection(self.settings)
         self.models = self.bootloader.reload_models(self.spider, self.settings)
+        if self.settings.SystemConfig.StageMetrics:
+            self.metrics = StageMetrics()
         self.request_pool = await self._init_request_pool()
         self.download_middleware, self.spider_middleware = self.bootloader.reload_middleware(
             self.spider, self.settings, self.request_pool
@@ -149,6 +231,7 @@ class Engine:
         self.driver = self.bootloader.reload_driver(self.settings)
         self.downloader = self._init_downloader()
         self.datamanager = await self._init_dataloader()
+        self.offload = OffloadExecutor(self.spider, self.settings.SystemConfig.OffloadWorkers)
 
     async def close(self):
 
@@ -157,20 +240,31 @@ class Engine:
 
         completed_count = await self.request_pool.done_size()
         failure_count = self.request_pool.failure_size()
+
+        if self.shard is not None:
+            self.shard.add_done(completed_count)
+
         item = [{
             "完成数量": completed_count, "失败数量": failure_count, "运行时间": self.spider.attrs['running'],
             '并发速度': self.spider.attrs['avg_speed'], '完成进度': '100%'
         }]
         logger.info(f'爬取结束，总请求详情：\n{pretty_table(item)}')
 
+        if self.metrics is not None:
+            self.log_metrics()
+            self.log_metrics('help')
+
         if self.driver is not None:
             self.driver.quit()
         if self.request_pool is not None:
-            await self.request_pool.close()
-        if self.downloader is not None:
+            await self.request_pool.close(finished=self.finished)
+        if self.downloader is not None and not self.shared:
             await self.downloader.close_session()
+        if self.offload is not None:
+            self.offload.close()
 
-        await self.close_connect()
+        if not self.shared:
+            await self.close_connect()
 
         logger.info(f'{">" * 25} {self.spider.name}: 采集结束 {"<" * 25}')
         logger.info(f'{">" * 25} 总共用时: {datetime.now() - self.start_time1} {"<" * 25}')
@@ -249,128 +343,368 @@ class Engine:
 
         # 将请求批量添加到waiting队列
         self.req_tasks = deque()
-        self.start_requests_iterator = self.spider.start_requests()
+        self.start_requests_iterator = self._start_requests_iterator()
+        self._seed_count = 0
+        self.crawing_time = time.time()
+
+        reaper = asyncio.create_task(self._reap_pending()) if self.request_pool.pending.lease else None
+
+        cluster = self.request_pool.cluster
+        if cluster is not None:
+            await cluster.register()
+            heartbeat = asyncio.create_task(self._heartbeat())
+            logger.info(f'节点 {cluster.node} 已加入，当前存活节点：{await cluster.nodes()}')
+
+        try:
+            if self.settings.SpiderRequestConfig.REQUEST_SCHEDULER_MODE == SchedulerMode.window:
+                await self._scheduler_window()
+            else:
+                await self._scheduler_batch()
+        finally:
+            if reaper is not None:
+                reaper.cancel()
+            if cluster is not None:
+                heartbeat.cancel()
+                # 异常退出时本节点持有的请求放回队列，由其他节点继续采集
+                remaining = await cluster.unregister()
+                logger.info(f'节点 {cluster.node} 已退出，剩余节点数量：{remaining}')
+
+        self.spider_close()
+
+    async def _reap_pending(self):
+        """后台回收租约过期的pending请求并取消对应的下载任务，避免卡死的请求导致请求池永远无法清空"""
+
+        interval = max(self.request_pool.pending.lease / 10, 1)
+
+        while True:
+            await asyncio.sleep(interval)
+            for request in await self.request_pool.reap_pending():
+                task = self._crawl_tasks.pop(request.hash, None)
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _heartbeat(self):
+        """后台发送节点心跳，续约本节点持有的请求，回收心跳超时节点持有的请求"""
+
+        cluster = self.request_pool.cluster
+
+        while True:
+            await asyncio.sleep(cluster.interval)
+            for node, count in await cluster.heartbeat(self.request_pool.held_hashes()):
+                logger.warning(f'节点 {node} 心跳超时，已将其持有的 {count} 个请求放回waiting队列')
+
+    def _create_crawl_task(self, coro, request) -> asyncio.Task:
+        """创建下载任务并按 request.hash 登记，任务结束后自动注销"""
+
+        task = asyncio.create_task(coro)
+        self._crawl_tasks[request.hash] = task
+
+        def _done(t, h=request.hash):
+            if self._crawl_tasks.get(h) is t:
+                del self._crawl_tasks[h]
+
+        task.add_done_callback(_done)
+        return task
+
+    def _get_task_limit(self):
+
+        task_limit = self.spider.attrs['task_limit']
+
+        if task_limit <= 0:
+            raise ValueError('Task limit 必须大于0')
+
+        if self.budget is not None:
+            task_limit = self.budget.allot(self, task_limit)
+
+        return task_limit
+
+    def _start_requests_iterator(self):
+
+        checkpoint = self.request_pool.checkpoint
+
+        if self.shard is not None and not self.shard.seeder:
+            # start_requests 只由第一个工作进程遍历，按域名转发给所属分片
+            if checkpoint is not None:
+                checkpoint.resumed = False
+            return iter(())
+
+        if checkpoint is None or not checkpoint.resumed:
+            return iter(self.spider.start_requests())
+
+        checkpoint.resumed = False
+
+        if checkpoint.seeds_done:
+            logger.info('断点续爬：start_requests 已全部取出，跳过种子请求')
+            return iter(())
+
+        # 跳过断点之前已取出的种子请求，这些请求已经在恢复的队列中
+        logger.info(f'断点续爬：跳过 start_requests 中前 {checkpoint.seeds} 个已取出的种子请求')
+        return itertools.islice(self.spider.start_requests(), checkpoint.seeds, None)
+
+    def _pull_start_requests(self, count: int):
+        """从start_requests中取出count个请求，返回start_requests是否还有剩余"""
+
+        new_requests = list(itertools.islice(self.start_requests_iterator, count))
+
+        if not new_requests:
+            if self.request_pool.checkpoint is not None:
+                self.request_pool.checkpoint.seed_end()
+            return False
+
+        # 种子请求写入waiting队列后才计入断点
+        self._seed_count += len(new_requests)
+
+        self.req_tasks.extend(new_requests)
+        return True
+
+    async def _flush_req_tasks(self):
+        """将缓存的请求添加到waiting队列"""
+
+        if self.shard is not None:
+            self.req_tasks.extend(self.shard.receive())
+
+        if self.req_tasks:
+            # 先取出再写入，写入期间其他回调追加的请求留到下次写入
+            requests = list(self.req_tasks)
+            self.req_tasks.clear()
+            await self.request_pool.push_to_waiting(requests)
+
+        if self._seed_count and self.request_pool.checkpoint is not None:
+            self.request_pool.checkpoint.seed(self._seed_count)
+        self._seed_count = 0
+
+    async def _dispatch_requests(self, count: int):
+        """从请求池中取出count个请求，经过爬虫中间件后返回需要下载的请求"""
+
+        requests = []
+
+        async for request in self.request_pool.get_request(count):
+            if self.metrics is None:
+                obj = await self.process_spider_request(request)
+            else:
+                start = time.perf_counter()
+                obj = await self.process_spider_request(request)
+                self.metrics.record(Stage.spider_mw, time.perf_counter() - start, request)
+            if obj is None:
+                requests.append(request)
+            elif isinstance(obj, BaseRequest):
+                await self.request_pool.pending.remove_request(request)
+                await self.request_pool.push_to_waiting(obj)
+            elif isinstance(obj, Response):
+                await self.process_response(obj, request)
+            else:
+                continue
+
+        return requests
+
+    async def _handle_response(self, response):
+        """将响应交给爬虫中间件和回调函数处理"""
+
+        if response is None:
+            return
+
+        if self.metrics is None:
+            obj = await self.process_spider_response(response)
+        else:
+            start = time.perf_counter()
+            obj = await self.process_spider_response(response)
+            self.metrics.record(Stage.spider_mw, time.perf_counter() - start, response.request)
+
+        if obj is None:
+            await self.process_response(response, response.request)
+        elif isinstance(obj, BaseRequest):
+            await self.request_pool.pending.remove_request(response.request)
+            await self.request_pool.push_to_failure(obj)
+
+    async def _crawl(self, request):
+        """下载请求，响应到达后立即解析"""
+
+        response = await self.download(request)
+        await self._handle_response(response)
+
+    async def _crawl_finished(self, iterator_exhausted: bool):
+        """判断采集是否结束，多进程模式下需要所有分片都空闲，多节点模式下需要所有节点都空闲"""
+
+        finished = iterator_exhausted and not self.req_tasks and await self.request_pool_empty()
+
+        cluster = self.request_pool.cluster
+        if cluster is not None and finished:
+            if await cluster.finished():
+                return True
+            # 本节点已空闲，等待其他节点完成或产生新的请求
+            await asyncio.sleep(cluster.poll_interval)
+            return False
 
-        settings = self.settings.SpiderRequestConfig
-        task_sleep = settings.REQUEST_CONCURRENCY_SLEEP
+        if self.shard is None:
+            return finished
+
+        self.shard.set_idle(finished)
+        return finished and self.shard.all_idle()
+
+    async def _scheduler_batch(self):
+        """批次调度，每批请求全部完成后再调度下一批"""
+
+        task_sleep = self.settings.SpiderRequestConfig.REQUEST_CONCURRENCY_SLEEP
 
         # 如果start_requests_iterator已用完，则添加要跟踪的变量
         iterator_exhausted = False
-        self.crawing_time = time.time()
 
         # 连续循环，从调度程序队列中获取请求
         while True:
 
-            task_limit = self.spider.attrs['task_limit']
-
-            if task_limit <= 0:
-                raise ValueError('Task limit 必须大于0')
+            task_limit = self._get_task_limit()
 
             # Add requests from start_requests generator to self.req_tasks
             if not iterator_exhausted:
-
-                new_requests = list(itertools.islice(self.start_requests_iterator, task_limit))
-
-                if new_requests:
-                    self.req_tasks.extend(new_requests)
-                else:
-                    # 如果没有提取新的请求，则将迭代器标记为已用完
-                    iterator_exhausted = True
+                # 如果没有提取新的请求，则将迭代器标记为已用完
+                iterator_exhausted = not self._pull_start_requests(task_limit)
 
             # 将请求添加到waiting队列
-            if self.req_tasks:
-                await self.request_pool.push_to_waiting(list(self.req_tasks))
-                self.req_tasks.clear()
-
-            tasks = []
+            await self._flush_req_tasks()
 
             # 处理waiting队列中的请求
-            async for request in self.request_pool.get_request(task_limit):
-                obj = await self.process_spider_request(request)
-                if obj is None:
-                    tasks.append(asyncio.create_task(self.download(request)))
-                elif isinstance(obj, BaseRequest):
-                    await self.request_pool.pending.remove_request(request)
-                    await self.request_pool.push_to_waiting(obj)
-                elif isinstance(obj, Response):
-                    await self.process_response(obj, request)
-                else:
-                    continue
+            tasks = [self._create_crawl_task(self.download(r), r) for r in await self._dispatch_requests(task_limit)]
 
-            responses = await asyncio.gather(*tasks)
+            if tasks:
+                await asyncio.wait(tasks)
+            else:
+                # waiting队列中的域名都还未到就绪时间
+                await asyncio.sleep(self.request_pool.ready_delay())
 
-            # 使用asyncio.gather处理所有请求
-            for response in responses:
-                if response is None:
-                    continue
-                obj = await self.process_spider_response(response)
-                if obj is None:
-                    await self.process_response(response, response.request)
-                elif isinstance(obj, BaseRequest):
-                    await self.request_pool.pending.remove_request(response.request)
-                    await self.request_pool.push_to_failure(obj)
-                else:
+            for task in tasks:
+                # 租约过期被取消的任务，请求已重新放回waiting队列
+                if task.cancelled():
                     continue
+                await self._handle_response(task.result())
 
             # 暂停以遵循请求速率限制
             await asyncio.sleep(task_sleep)
             await self.fresh_progress()
 
             # 如果没有请求需要处理，则中断循环
-            if iterator_exhausted and not self.req_tasks and await self.request_pool_empty():
+            if await self._crawl_finished(iterator_exhausted):
                 break
 
-        self.spider_close()
+    async def _scheduler_window(self):
+        """滑动窗口调度，维持task_limit个并发请求，任一请求完成后立即补位"""
+
+        idle_sleep = self.settings.SpiderRequestConfig.REQUEST_CONCURRENCY_SLEEP
+        iterator_exhausted = False
+        in_flight = set()
+
+        while True:
+
+            task_limit = self._get_task_limit()
+
+            # waiting队列不足一个窗口时才从start_requests补充，避免种子请求一次性堆满内存
+            if not iterator_exhausted and await self.request_pool.waiting_size() < task_limit:
+                iterator_exhausted = not self._pull_start_requests(task_limit)
+
+            await self._flush_req_tasks()
+
+            free = task_limit - len(in_flight)
+            if free > 0:
+                for request in await self._dispatch_requests(free):
+                    in_flight.add(self._create_crawl_task(self._crawl(request), request))
+
+            if in_flight:
+                # 有域名即将就绪时提前醒来补位
+                done, in_flight = await asyncio.wait(
+                    in_flight, timeout=self.request_pool.ready_delay() or None, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    # 租约过期被取消的任务，请求已重新放回waiting队列
+                    if task.cancelled():
+                        continue
+                    # 抛出下载或解析过程中的异常
+                    task.result()
+                await self.fresh_progress()
+                continue
+
+            await self.fresh_progress()
+
+            # 如果没有请求需要处理，则中断循环
+            if await self._crawl_finished(iterator_exhausted):
+                break
+
+            # 没有可调度的请求，但请求池尚未清空，等待waiting队列中的域名就绪或failure队列中的请求到期
+            await asyncio.sleep(self.request_pool.ready_delay() or idle_sleep)
 
     async def _scheduler_batch_spider(self):
 
         while True:
 
-            if not self.spider.is_time_to_run():
-                if self.spider.next_time < datetime.now():
-                    self.spider.next_time = self.spider.get_next_time()
-                    continue
+            now = datetime.now().replace(microsecond=0)
+            # 错过的运行时间直接顺延到下一个周期
+            while self.spider.next_time < now:
+                self.spider.next_time = self.spider.get_next_time()
+
+            delay = (self.spider.next_time - datetime.now()).total_seconds()
+            if delay > 0:
                 logger.debug(
                     f"爬虫({self.spider.name})还未到运行时间，{self.spider.name}将在{self.spider.next_time}启动，当前北京"
-                    f"时间是{datetime.now()}，距离启动还有 {(self.spider.next_time - datetime.now()).total_seconds():,.5f} 秒"
+                    f"时间是{datetime.now()}，距离启动还有 {delay:,.5f} 秒"
                 )
-                time.sleep(0.9)
+                # 异步等待，同一事件循环中的其他批次爬虫可以继续运行
+                await asyncio.sleep(delay)
                 continue
 
-            self.spider.create_task()
-
-            # 爬虫运行前回调
-            if not self.spider.cust_call_before():
+            if not await self._run_batch_once():
                 break
 
-            self.spider.next_time = self.spider.get_next_time()
+    async def _run_batch_once(self) -> bool:
+        """执行一次批次爬虫任务，返回False表示停止调度"""
 
-            # 更新爬虫状态 --- 爬虫即将开始运行
-            TaskModel.objects.update(
-                items={'id': self.spider.task.id, 'status': 1},
-                where='id',
-            )
+        await self._run_task_io(self.spider.create_task)
 
-            # 执行登录逻辑
-            self.spider.token = self.spider.cust_call_login(self.spider.username, self.spider.password)
+        # 爬虫运行前回调
+        if not self.spider.cust_call_before():
+            return False
 
-            await self._scheduler_spider()
+        self.spider.next_time = self.spider.get_next_time()
 
-            # 更新爬虫状态 --- 爬虫运行结束
-            TaskModel.objects.update(
-                items={
-                    'id': self.spider.task.id, 'status': 3, 'end_time': datetime.now(),
-                    'data_count': self.data_count,
-                    'running_time': self.spider.get_running_time()
-                },
-                where='id'
-            )
+        # 更新爬虫状态 --- 爬虫即将开始运行
+        await self._update_task(status=1)
 
-            # 爬虫结束后回调
-            if not self.spider.cust_call_end():
-                break
+        # 执行登录逻辑
+        self.spider.token = self.spider.cust_call_login(self.spider.username, self.spider.password)
+
+        await self._scheduler_spider()
+
+        # 两次批次运行之间不占用全局并发份额
+        if self.budget is not None:
+            self.budget.release(self)
+
+        # 更新爬虫状态 --- 爬虫运行结束
+        await self._update_task(
+            status=3, end_time=datetime.now(), data_count=self.data_count,
+            running_time=self.spider.get_running_time()
+        )
+
+        # 爬虫结束后回调
+        if not self.spider.cust_call_end():
+            return False
+
+        await self.request_pool.done.close()
+
+        return True
+
+    async def _run_task_io(self, func: Callable, *args, **kwargs):
+        """任务表的读写是同步数据库操作，放到单线程池中执行，避免阻塞事件循环"""
+
+        global _task_executor
 
-            await self.request_pool.done.close()
+        if _task_executor is None:
+            # 同步数据库连接不是线程安全的，多个批次爬虫共用一个线程串行写入
+            _task_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='AioSpider-task')
+
+        # 复制当前上下文，保证线程中创建的模型能取到当前爬虫
+        ctx = contextvars.copy_context()
+        return await self.loop.run_in_executor(_task_executor, functools.partial(ctx.run, func, *args, **kwargs))
+
+    async def _update_task(self, **items):
+        items['id'] = self.spider.task.id
+        await self._run_task_io(TaskModel.objects.update, items=items, where='id')
 
     async def fresh_progress(self):
 
@@ -391,6 +725,17 @@ class Engine:
         self.spider.attrs['avg_speed'] = speed
         self.spider.attrs['progress'] = progress
 
+        interval = self.settings.SystemConfig.StageMetricsInterval
+        if self.metrics is not None and interval and time.time() - self._metrics_time >= interval:
+            self._metrics_time = time.time()
+            self.log_metrics()
+
+    def log_metrics(self, dimension: str = 'all'):
+
+        rows = self.metrics.summary(dimension)
+        if rows:
+            logger.info(f'请求各阶段耗时统计：\n{pretty_table(rows)}')
+
     async def request_pool_empty(self):
         return True if self.request_pool.pending_empty() and await self.request_pool.waiting_empty() and \
                        self.request_pool.failure_empty() else False
@@ -426,34 +771,75 @@ class Engine:
         """处理响应"""
 
         callback = request.callback or self.spider.parse or self.spider.default_parse
+        start = time.perf_counter() if self.metrics is not None else 0
 
-        args = []
-        for k in inspect.signature(callback).parameters:
-            if k == 'self':
-                args.append(self.spider)
-            elif k == 'response':
-                args.append(response)
-            else:
-                args.append(None)
+        if self.offload is not None and self.offload.is_offload(callback, request):
+            # CPU密集型回调交给进程池执行，避免阻塞事件循环
+            result = await self.offload.run(callback, response)
+        else:
+            result = callback(*self._bind_callback_args(callback, response))
+            # 支持 async def 回调
+            if inspect.isawaitable(result):
+                result = await result
+
+        commit_time = await self._process_callback(result, request)
+
+        if self.metrics is not None:
+            # 生成器回调的解析和数据提交交替进行，解析耗时需要扣除数据提交耗时
+            self.metrics.record(Stage.callback, time.perf_counter() - start - commit_time, request)
+
+    def _bind_callback_args(self, callback, response):
+        """根据回调签名绑定参数，签名解析结果按回调函数缓存"""
 
-        result = callback(*args)
+        key = (getattr(callback, '__func__', callback), inspect.ismethod(callback))
+        params = self._callback_params.get(key)
 
-        await self._process_callback(result)
+        if params is None:
+            params = self._callback_params[key] = tuple(inspect.signature(callback).parameters)
 
-    async def _process_callback(self, result):
-        """处理响应回调结果"""
+        return [self.spider if k == 'self' else response if k == 'response' else None for k in params]
+
+    async def _process_callback(self, result, request: BaseRequest = None) -> float:
+        """处理响应回调结果，生成器和异步生成器逐条处理，不会一次性加载到内存，返回数据提交耗时"""
 
         if result is None:
-            return None
+            return 0
+
+        commit_time = 0
 
         if isinstance(result, Model):
-            await self.datamanager.commit(result)
+            if self.metrics is None:
+                await self.datamanager.commit(result)
+            else:
+                start = time.perf_counter()
+                await self.datamanager.commit(result)
+                commit_time = time.perf_counter() - start
+                self.metrics.record(Stage.commit, commit_time, request)
         elif isinstance(result, BaseRequest):
             self.req_tasks.append(result)
+            # 回调产生大量请求时分批写入waiting队列，并让出事件循环
+            if len(self.req_tasks) >= self.settings.SpiderRequestConfig.CALLBACK_BUFFER_SIZE:
+                await self._flush_req_tasks()
+                await asyncio.sleep(0)
+        elif hasattr(result, '__aiter__'):
+            async for item in result:
+                commit_time += await self._process_callback(item, request)
         elif hasattr(result, '__iter__'):
             for item in result:
-                await self._process_callback(item)
+                commit_time += await self._process_callback(item, request)
         else:
             raise ValueError('回调必须返回Model对象或BaseRequest对象')
 
-        return None
+        return commit_time
+
+
+def _run_worker(spider, args, kwargs, shard: ShardContext, index: int):
+    """工作进程入口"""
+
+    # 不复用父进程的事件循环
+    asyncio.set_event_loop(asyncio.new_event_loop())
+
+    engine = Engine()
+    engine.add_spider(spider, *args, **kwargs)
+    engine.shard = shard.bind(index)
+    engine.start()
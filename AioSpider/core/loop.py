@@ -0,0 +1,68 @@
+__all__ = ['setup_event_loop', 'get_loop_mode']
+
+import os
+import asyncio
+
+from AioSpider import logger, GlobalConstant
+from AioSpider.constants import LoopMode
+from AioSpider.core.patch import apply
+
+
+# fast/uvloop 模式下创建的事件循环，进程内多个引擎共用同一个循环
+_loop: asyncio.AbstractEventLoop = None
+
+
+def get_loop_mode() -> str:
+    """事件循环模式，优先级：环境变量 AIOSPIDER_LOOP_MODE > 项目settings > 系统settings"""
+
+    mode = os.environ.get('AIOSPIDER_LOOP_MODE')
+    if mode:
+        return mode
+
+    try:
+        sts = __import__('settings')
+    except ImportError:
+        sts = None
+
+    mode = getattr(getattr(sts, 'SystemConfig', None), 'EventLoopMode', None)
+    return mode or GlobalConstant().settings.SystemConfig.EventLoopMode
+
+
+def setup_event_loop(mode: str = None) -> asyncio.AbstractEventLoop:
+    """
+    按模式初始化事件循环
+    Args:
+        mode: 事件循环模式，nested 兼容模式，fast 高性能模式，uvloop uvloop模式
+    Return:
+        事件循环
+    """
+
+    global _loop
+
+    mode = mode or get_loop_mode()
+
+    if mode == LoopMode.nested:
+        apply()
+        return asyncio.get_event_loop()
+
+    if _loop is not None and not _loop.is_closed():
+        return _loop
+
+    if hasattr(asyncio, '_nest_patched'):
+        # 补丁是类级别的，进程内一旦打过补丁就无法恢复
+        logger.warning(f'当前进程中asyncio已打过嵌套补丁，{mode} 模式无法使用C实现的Task和Future')
+
+    if mode == LoopMode.uvloop:
+        try:
+            import uvloop
+        except ImportError:
+            logger.warning('未安装uvloop，将使用asyncio默认事件循环，安装：pip install uvloop')
+        else:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    elif mode != LoopMode.fast:
+        raise ValueError(f'不支持的事件循环模式：{mode}')
+
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+
+    return _loop
@@ -0,0 +1,145 @@
+__all__ = ['LatencyHistogram', 'StageMetrics']
+
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from AioSpider.constants import Stage
+from AioSpider.http.base import BaseRequest
+
+
+# 每个2的幂区间再线性细分为 2 ** _SUB_BITS 个桶，相对误差不超过 1 / 2 ** _SUB_BITS
+_SUB_BITS = 4
+_SUB_COUNT = 1 << _SUB_BITS
+
+
+class LatencyHistogram:
+    """
+    HDR风格的延迟直方图，以微秒为单位按对数线性分桶，记录和查询都不需要排序
+    """
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts: List[int] = []
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def _index_of(value: int) -> int:
+
+        if value < _SUB_COUNT:
+            return value
+
+        shift = value.bit_length() - _SUB_BITS - 1
+        return (shift + 1) * _SUB_COUNT + (value >> shift) - _SUB_COUNT
+
+    @staticmethod
+    def _value_of(index: int) -> int:
+
+        if index < _SUB_COUNT:
+            return index
+
+        shift = index // _SUB_COUNT - 1
+        return (index % _SUB_COUNT + _SUB_COUNT) << shift
+
+    def record(self, seconds: float):
+
+        index = self._index_of(int(seconds * 1_000_000))
+
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """
+        分位数
+        Args:
+            q: 0 ~ 100
+        Return:
+            分位数所在桶的下界，单位秒
+        """
+
+        if not self.count:
+            return 0.0
+
+        target = max(self.count * q / 100, 1)
+        seen = 0
+
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return self._value_of(index) / 1_000_000
+
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class StageMetrics:
+    """
+    请求各阶段耗时统计，分别按全部请求、request.help、域名三个维度记录直方图
+    """
+
+    def __init__(self):
+        # {(stage, dimension, key): LatencyHistogram}
+        self.histograms: Dict[Tuple[str, str, str], LatencyHistogram] = defaultdict(LatencyHistogram)
+        # {请求指纹: 入队时间}，redis、disk 引擎出队的是重新解码的请求对象，按指纹对应
+        self._enqueued: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float, request: BaseRequest = None):
+
+        self.histograms[(stage, 'all', '')].record(seconds)
+
+        if request is None:
+            return
+
+        self.histograms[(stage, 'help', request.help or '')].record(seconds)
+        self.histograms[(stage, 'domain', request.domain or '')].record(seconds)
+
+    def enqueue(self, request: BaseRequest):
+        self._enqueued[request.hash] = time.perf_counter()
+
+    def dequeue(self, request: BaseRequest):
+        start = self._enqueued.pop(request.hash, None)
+        if start is not None:
+            self.record(Stage.waiting, time.perf_counter() - start, request)
+
+    def discard(self, request: BaseRequest):
+        """请求被丢弃或已完成，删除入队时间，不计入统计"""
+        self._enqueued.pop(request.hash, None)
+
+    def summary(self, dimension: str = 'all') -> List[dict]:
+        """
+        生成统计表
+        Args:
+            dimension: all 全部请求，help 按 request.help，domain 按域名
+        Return:
+            可以直接交给 pretty_table 的行列表，耗时单位毫秒
+        """
+
+        rows = []
+
+        for (stage, dim, key), hist in sorted(
+                self.histograms.items(), key=lambda x: (x[0][2], Stage.ALL.index(x[0][0]))
+        ):
+            if dim != dimension:
+                continue
+            row = {'阶段': stage} if dimension == 'all' else {dimension: key, '阶段': stage}
+            row.update({
+                '次数': hist.count, '平均(ms)': round(hist.mean * 1000, 3),
+                'P50(ms)': round(hist.percentile(50) * 1000, 3), 'P90(ms)': round(hist.percentile(90) * 1000, 3),
+                'P99(ms)': round(hist.percentile(99) * 1000, 3), '最大(ms)': round(hist.max * 1000, 3),
+                '总耗时(s)': round(hist.total, 3),
+            })
+            rows.append(row)
+
+        return rows
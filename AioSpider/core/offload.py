@@ -0,0 +1,134 @@
+__all__ = ['OffloadExecutor']
+
+import asyncio
+import inspect
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Tuple
+
+from AioSpider import GlobalConstant
+from AioSpider.http import Response, BaseRequest
+from AioSpider.models import Model
+
+
+# 工作进程中的爬虫实例，只用于给回调提供 self，不执行 __init__
+_worker_spider = None
+
+
+def _init_worker(spider_cls):
+    global _worker_spider
+    _worker_spider = spider_cls.__new__(spider_cls)
+    GlobalConstant().spider = _worker_spider
+
+
+def _resolve_callback(ref: Tuple[str, str]) -> Callable:
+    module, qualname = ref
+    obj = importlib.import_module(module)
+    for name in qualname.split('.'):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _flatten_result(result):
+    """展开回调结果，Request 转为字典以便跨进程传输，回调在主进程中重新绑定"""
+
+    if result is None:
+        return
+
+    if isinstance(result, Model):
+        yield 'model', result
+    elif isinstance(result, BaseRequest):
+        yield 'request', result.to_dict()
+    elif hasattr(result, '__iter__'):
+        for item in result:
+            yield from _flatten_result(item)
+    else:
+        raise ValueError('回调必须返回Model对象或BaseRequest对象')
+
+
+def _run_callback(ref: Tuple[str, str], snapshot: dict):
+    """在工作进程中执行解析回调"""
+
+    callback = _resolve_callback(ref)
+
+    # meta 随请求传输，通过 response.request.meta 访问
+    request = BaseRequest.from_dict(snapshot.pop('request'))
+    response = Response(request=request, **snapshot)
+
+    args = []
+    for k in inspect.signature(callback).parameters:
+        if k == 'self':
+            args.append(_worker_spider)
+        elif k == 'response':
+            args.append(response)
+        else:
+            args.append(None)
+
+    return list(_flatten_result(callback(*args)))
+
+
+class OffloadExecutor:
+    """
+    将CPU密集型的解析回调交给进程池执行，避免阻塞事件循环
+    Args:
+        spider: 爬虫实例
+        max_workers: 进程池大小，None 表示使用 CPU 核数
+    """
+
+    def __init__(self, spider, max_workers: int = None):
+        self.spider_cls = type(spider)
+        self.max_workers = max_workers
+        self._executor = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_init_worker, initargs=(self.spider_cls,)
+            )
+
+        return self._executor
+
+    @staticmethod
+    def is_offload(callback: Callable, request: BaseRequest) -> bool:
+        return bool(request.offload or getattr(callback, '__offload__', False))
+
+    @staticmethod
+    def check(callback: Callable):
+        """工作进程中没有事件循环，异步回调不能交给进程池执行"""
+
+        func = getattr(callback, '__func__', callback)
+        if inspect.iscoroutinefunction(func) or inspect.isasyncgenfunction(func):
+            raise TypeError(f'{func.__qualname__} 是异步回调，不能在进程池中执行，请去掉 offload 标记或改为同步函数')
+
+    @staticmethod
+    def snapshot(response: Response) -> dict:
+        """生成可序列化的响应快照"""
+
+        return {
+            'url': str(response.url),
+            'status': response.status,
+            'headers': dict(response.headers),
+            'content': response.content,
+            'text': response.text,
+            'request': response.request.to_dict(),
+        }
+
+    async def run(self, callback: Callable, response: Response) -> list:
+        """在进程池中执行回调，返回回调产生的 Model 和 Request 列表"""
+
+        self.check(callback)
+
+        func = getattr(callback, '__func__', callback)
+        ref = (func.__module__, func.__qualname__)
+
+        loop = asyncio.get_event_loop()
+        result = await loop.run_in_executor(self.executor, _run_callback, ref, self.snapshot(response))
+
+        return [BaseRequest.from_dict(obj) if kind == 'request' else obj for kind, obj in result]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
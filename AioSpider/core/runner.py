@@ -0,0 +1,146 @@
+__all__ = ['SpiderRunner', 'ConcurrencyBudget']
+
+import asyncio
+from typing import Callable, Dict, List, Union
+
+from AioSpider import logger
+from AioSpider.core.engine import Engine
+from AioSpider.core.loop import setup_event_loop
+from AioSpider.spider import Spider
+
+
+class ConcurrencyBudget:
+    """
+    全局并发预算，按最大最小公平原则在多个爬虫之间分配
+    需求小于平均份额的爬虫按需求分配，剩余份额平分给其余爬虫
+    Args:
+        total: 所有爬虫共享的并发总数
+    """
+
+    def __init__(self, total: int):
+        if total <= 0:
+            raise ValueError('并发总数必须大于0')
+        self.total = total
+        self._demands: Dict[int, int] = {}
+        self._shares: Dict[int, int] = {}
+
+    def _allocate(self):
+
+        shares = {}
+        remaining = self.total
+        pending = sorted(self._demands.items(), key=lambda x: x[1])
+
+        for index, (key, demand) in enumerate(pending):
+            fair = max(remaining // (len(pending) - index), 1)
+            shares[key] = min(demand, fair)
+            remaining = max(remaining - shares[key], 0)
+
+        self._shares = shares
+
+    def allot(self, owner, demand: int) -> int:
+        """登记爬虫的并发需求，返回分配给该爬虫的并发数"""
+
+        key = id(owner)
+
+        if self._demands.get(key) != demand:
+            self._demands[key] = demand
+            self._allocate()
+
+        return self._shares[key]
+
+    def release(self, owner):
+        """爬虫运行结束后释放份额，分配给其余爬虫"""
+
+        if self._demands.pop(id(owner), None) is not None:
+            self._allocate()
+
+
+class SpiderRunner:
+    """
+    多爬虫运行器，在同一个引擎进程和事件循环中运行多个爬虫
+    每个爬虫拥有独立的配置、请求池、数据管理器和下载器，数据库连接池由所有爬虫共用
+    Args:
+        concurrency: 所有爬虫共享的并发总数，为 None 时读取 SystemConfig.GlobalConcurrency，仍为 None 则不限制
+        loop_mode: 事件循环模式，为 None 时从配置中读取
+    """
+
+    def __init__(self, concurrency: int = None, loop_mode: str = None):
+        self.concurrency = concurrency
+        self.loop_mode = loop_mode
+        self.loop = setup_event_loop(loop_mode)
+        self.engines: List[Engine] = []
+        self.budget: ConcurrencyBudget = None
+
+    def add_spider(self, spider: Union[Spider, Callable], *args, **kwargs):
+
+        engine = Engine(self.loop_mode)
+        engine.add_spider(spider, *args, **kwargs)
+        engine.shared = True
+        self.engines.append(engine)
+
+        return self
+
+    def start(self):
+
+        if not self.engines:
+            raise Exception('未添加爬虫，请先调用 add_spider')
+
+        try:
+            self.loop.run_until_complete(self.execute())
+        except KeyboardInterrupt:
+            self.loop.run_until_complete(self.close())
+            logger.error('手动退出')
+        finally:
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+
+    async def execute(self):
+
+        tasks = []
+        connector = None
+
+        for engine in self.engines:
+            # 第一个引擎建立数据库连接池，其余引擎复用
+            engine.connector = connector
+            await engine.open()
+            connector = engine.connector
+
+            if self.budget is None:
+                # 第一个爬虫加载配置后再读取全局并发数
+                concurrency = self.concurrency or engine.settings.SystemConfig.GlobalConcurrency
+                if concurrency:
+                    self.budget = ConcurrencyBudget(concurrency)
+            engine.budget = self.budget
+            if self.budget is not None:
+                # 提前登记并发需求，避免先启动的爬虫独占全部份额
+                engine._get_task_limit()
+
+            # 任务创建时复制当前上下文，各爬虫的 GlobalConstant().spider 和 settings 互不干扰
+            tasks.append(asyncio.create_task(self._run(engine), name=engine.spider.name))
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        for engine, result in zip(self.engines, results):
+            if isinstance(result, BaseException):
+                logger.error(f'爬虫({engine.spider.name})异常退出：{result!r}')
+
+        await self.close()
+
+    async def _run(self, engine: Engine):
+        try:
+            await engine.run()
+        finally:
+            if self.budget is not None:
+                self.budget.release(engine)
+            await engine.close()
+
+    async def close(self):
+        """释放各引擎的下载器会话和数据库连接池，共用的连接池只关闭一次"""
+
+        closed = set()
+
+        for engine in self.engines:
+            if engine.downloader is not None:
+                await engine.downloader.close_session()
+            if engine.connector is not None and id(engine.connector) not in closed:
+                closed.add(id(engine.connector))
+                await engine.close_connect()
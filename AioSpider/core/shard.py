@@ -0,0 +1,161 @@
+__all__ = ['ShardContext', 'shard_of']
+
+import queue
+import multiprocessing
+from collections import defaultdict
+from typing import Iterable, List
+
+from AioSpider import tools
+from AioSpider.filter import BloomFilter
+from AioSpider.http.base import BaseRequest
+from AioSpider.http.codec import RequestCodec
+
+
+# 转发的请求使用二进制编码，编码器不随 ShardContext 传递，各进程使用本进程的回调注册表
+_codec = RequestCodec()
+
+
+def shard_of(domain: str, workers: int) -> int:
+    """根据域名计算请求所属的分片，使用md5保证各进程计算结果一致"""
+    return int(tools.make_md5(domain or '')[:8], 16) % workers
+
+
+class ShardContext:
+    """
+    多进程分片上下文，在主进程中创建后传递给各个工作进程。
+    请求按域名哈希归属于一个分片，start_requests 只由第一个分片遍历，其余请求按批转发给所属分片；
+    数据去重状态保存在共享内存中的布隆过滤器里，提交数据时不需要进程间通信，内存占用固定
+    Args:
+        workers: 工作进程数量
+        ctx: multiprocessing 上下文
+        capacity: 跨进程数据去重的容量，超出后误判率升高
+        error_rate: 跨进程数据去重的误判率，误判的数据会被当作重复数据丢弃
+    """
+
+    def __init__(self, workers: int, ctx=None, capacity: int = 10000000, error_rate: float = 0.001):
+
+        ctx = ctx or multiprocessing.get_context()
+
+        self.index = None
+        self.workers = workers
+        # 每个工作进程一个收件箱，用于接收其他分片转发过来的请求，每条消息是一批编码后的请求
+        self.inboxes = [ctx.Queue() for _ in range(workers)]
+        self.lock = ctx.Lock()
+        self.idle = ctx.Array('b', workers, lock=False)
+        self.in_transit = ctx.Value('q', 0, lock=False)
+        self.item_count = ctx.Value('q', 0)
+        self.done_count = ctx.Value('q', 0)
+        # 跨进程共享的数据去重位数组，各进程在其上建立布隆过滤器
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.claims = ctx.RawArray('B', BloomFilter.nbytes(capacity, error_rate))
+        self.claim_lock = ctx.Lock()
+        self._claim_filter = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # 布隆过滤器引用共享内存，在各进程中重新建立
+        state['_claim_filter'] = None
+        return state
+
+    def bind(self, index: int):
+        """在工作进程中绑定分片编号"""
+        self.index = index
+        return self
+
+    @property
+    def seeder(self) -> bool:
+        """是否由本分片遍历 start_requests"""
+        return self.index == 0
+
+    def owns(self, request: BaseRequest) -> bool:
+        return shard_of(request.domain, self.workers) == self.index
+
+    def route(self, request: BaseRequest):
+        """将不属于本分片的请求转发给所属分片"""
+        self.route_many([request])
+
+    def route_many(self, requests: Iterable[BaseRequest]) -> List[BaseRequest]:
+        """
+        按所属分片分组，不属于本分片的请求每个分片一次转发
+        Return:
+            属于本分片的请求
+        """
+
+        owned, groups = [], defaultdict(list)
+        for request in requests:
+            target = shard_of(request.domain, self.workers)
+            if target == self.index:
+                owned.append(request)
+            else:
+                groups[target].append(_codec.encode(request))
+
+        if groups:
+            with self.lock:
+                self.in_transit.value += sum(len(payloads) for payloads in groups.values())
+            for target, payloads in groups.items():
+                self.inboxes[target].put(payloads)
+
+        return owned
+
+    def receive(self) -> List[BaseRequest]:
+        """取出其他分片转发给本分片的请求"""
+
+        requests = []
+        inbox = self.inboxes[self.index]
+
+        while True:
+            try:
+                data = inbox.get_nowait()
+            except queue.Empty:
+                break
+
+            with self.lock:
+                # 先标记为忙碌再减少在途数量，保证 all_idle 判断不会漏掉在途请求
+                self.idle[self.index] = False
+                self.in_transit.value -= len(data)
+
+            requests.extend(_codec.decode_many(data))
+
+        return requests
+
+    def set_idle(self, idle: bool):
+        with self.lock:
+            self.idle[self.index] = idle
+
+    def all_idle(self) -> bool:
+        """所有分片均空闲且没有在途请求时，整个爬取任务结束"""
+
+        with self.lock:
+            return all(self.idle) and self.in_transit.value == 0
+
+    def _claims(self) -> BloomFilter:
+        if self._claim_filter is None:
+            self._claim_filter = BloomFilter.frombuffer(
+                self.claims, self.capacity, self.error_rate, prehashed=True
+            )
+        return self._claim_filter
+
+    def claim(self, item_hash: str) -> bool:
+        """跨进程数据去重，直接读写共享内存，返回True表示该数据由本分片首次提交"""
+
+        bloom = self._claims()
+        offsets = list(bloom._offsets(*bloom._pair(item_hash)))
+        bits = bloom.bitarray
+
+        # 检查和置位在同一把锁内完成，两个进程同时提交同一条数据时只有一个成功
+        with self.claim_lock:
+            if all(bits[k] for k in offsets):
+                return False
+            for k in offsets:
+                bits[k] = True
+
+        return True
+
+    def add_item(self, count: int = 1):
+        with self.item_count.get_lock():
+            self.item_count.value += count
+
+    def add_done(self, count: int):
+        with self.done_count.get_lock():
+            self.done_count.value += count
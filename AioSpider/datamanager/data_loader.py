@@ -1,15 +1,44 @@
+from struct import Struct
+
+import numpy as np
+# pd.util.hash_array 内部使用的逐元素 siphash，直接调用避免单条数据时的类型分派开销
+from pandas._libs.hashing import hash_object_array
+
 from AioSpider import tools, logger
 from AioSpider.constants import BackendEngine
 from AioSpider.filter import AutoBloom, RedisBloomFilter, BloomFilter
 
 
+# 数据哈希的两个64位整数按小端序拼接，与布隆过滤器 prehashed 模式解析摘要的方式一致
+_PAIR = Struct('<QQ')
+
+_MASK = 0xFFFFFFFFFFFFFFFF
+# 逐列合并使用的 FNV-1a 初始值和素数
+_SEED = 0xCBF29CE484222325
+_PRIME = 0x100000001B3
+# splitmix64 的常数
+_GAMMA = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+
+
 class DataLoader:
+    """
+    数据去重的布隆过滤器，启动时从数据表批量加载已有数据的哈希。
+    数据哈希只保存在内存中，每次启动时按当前算法重新计算，算法变化不需要迁移
+    """
+
+    # 批量预加载时每批计算的行数
+    chunk_size = 100000
+    # 数据哈希使用的 siphash 密钥，16个字符
+    hash_key = 'AioSpider.dedup!'
 
     def __init__(self, connector, capacity: int, max_capacity: int, models: list):
         self.connector = connector
         self.capacity = capacity
         self.max_capacity = max_capacity
-        self.bloom = AutoBloom(capacity=capacity, max_capacity=max_capacity)
+        # 数据哈希都是32位十六进制字符串，直接作为布隆过滤器的摘要
+        self.bloom = AutoBloom(capacity=capacity, max_capacity=max_capacity, prehashed=True)
         self._connector = self.connector
         self._models = models
 
@@ -23,22 +52,72 @@ class DataLoader:
 
         return [f for f in field if f in desc_field]
 
+    @staticmethod
+    def _strings(values) -> np.ndarray:
+        """转为字符串数组，非字符串的值按 str() 转换，与 tools.join 一致"""
+        if not all(type(v) is str for v in values):
+            values = [v if isinstance(v, str) else str(v) for v in values]
+        return np.array(values, dtype=object)
+
+    @classmethod
+    def row_hashes(cls, rows: list, fields: list) -> tuple:
+        """
+        批量计算数据哈希：每个字段按列一次计算 siphash，再按 FNV 的方式逐列合并为第一个64位整数，
+        第二个整数由第一个经 splitmix64 混合得到，两者用于布隆过滤器的双重哈希，没有逐行的 Python 调用
+        Args:
+            rows: 查询结果，字典列表
+            fields: 参与计算的字段，顺序与提交时一致
+        Return:
+            两个 uint64 数组
+        """
+
+        h1 = np.full(len(rows), _SEED, dtype=np.uint64)
+        for f in fields:
+            column = cls._strings([row.get(f) for row in rows])
+            h1 = (h1 ^ hash_object_array(column, cls.hash_key)) * np.uint64(_PRIME)
+
+        z = h1 + np.uint64(_GAMMA)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX1)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX2)
+
+        return h1, z ^ (z >> np.uint64(31))
+
+    @classmethod
+    def item_hash(cls, values: list) -> str:
+        """
+        单条数据的哈希，与 row_hashes 对同一行的计算结果一致。所有字段值一次计算 siphash，
+        合并和混合按 Python 整数计算，避免小数组运算的开销
+        Args:
+            values: 参与计算的字段值，顺序与预加载时一致
+        Return:
+            32位十六进制字符串
+        """
+
+        column = np.array([v if type(v) is str else str(v) for v in values], dtype=object)
+
+        h1 = _SEED
+        for h in hash_object_array(column, cls.hash_key).tolist():
+            h1 = ((h1 ^ h) * _PRIME) & _MASK
+
+        z = (h1 + _GAMMA) & _MASK
+        z = ((z ^ (z >> 30)) * _MIX1) & _MASK
+        z = ((z ^ (z >> 27)) * _MIX2) & _MASK
+
+        return _PAIR.pack(h1, z ^ (z >> 31)).hex()
+
+    def add_rows(self, rows: list, fields: list):
+        """分批计算行哈希并批量写入布隆过滤器"""
+        for i in range(0, len(rows), self.chunk_size):
+            self.bloom.add_pairs(*self.row_hashes(rows[i:i + self.chunk_size], fields))
+
     async def load_unique_data(self, model):
 
         table = model.Meta.tb_name
-        unique_field = model.get_unique_field()
+        field = model.get_unique_field() or [i for i in model.fields.keys() if i != 'id']
 
-        if unique_field:
-            data = await self._connector[model.Meta.engine][model.Meta.db].find_many(
-                table=table, field=model.get_unique_field()
-            )
-        else:
-            field = [i for i in model.fields.keys() if i != 'id']
-            data = await self._connector[model.Meta.engine][model.Meta.db].find_many(
-                table=table, field=field
-            )
+        data = await self._connector[model.Meta.engine][model.Meta.db].find_many(table=table, field=field)
 
-        self.bloom.add_many([tools.join([v for v in i.values()], on='-') for i in data])
+        self.add_rows(data, field)
 
         if len(data):
             logger.info(f'已加载到 {table} 表 {len(data)} 条数据')
@@ -59,7 +138,7 @@ class DataLoader:
         )
         logger.debug(f'{table}表的哈希值加载完成')
 
-        self.bloom.add_many(data)
+        self.add_rows(data, field)
 
         if len(data):
             logger.info(f'已加载到 {table} 表 {len(data)} 条数据')
@@ -1,6 +1,5 @@
 from typing import List, Dict, Type
 
-from AioSpider import tools
 from AioSpider.models.models import Model
 from AioSpider.datamanager.create_table import CreateTable
 from AioSpider.datamanager.data_loader import DataLoader
@@ -9,11 +8,12 @@ from AioSpider.datamanager.commit import SQLCommit, FileCommit, CSVCommit, Conta
 
 class DataManager:
 
-    def __init__(self, settings, connector, models: List[Type[Model]]):
+    def __init__(self, settings, connector, models: List[Type[Model]], shard=None):
 
         self.settings = settings
         self.connector = connector
         self.models = models
+        self.shard = shard
         self._capacity = settings.DataFilterConfig.BLOOM_INIT_CAPACITY
         self._max_capacity = settings.DataFilterConfig.BLOOM_MAX_CAPACITY
         self._size = settings.DataFilterConfig.COMMIT_SIZE
@@ -106,20 +106,22 @@ class DataManager:
 
         duplicate_field = [f for f in model.get_unique_field() if f in item]
         if duplicate_field:
-            item_hash = tools.make_md5(
-                tools.join([item.get(i) for i in duplicate_field], on='-')
-            )
+            item_hash = DataLoader.item_hash([item.get(i) for i in duplicate_field])
         else:
             field = [i for i in model.fields.keys() if i != 'id']
-            item_hash = tools.make_md5(
-                tools.join([item.get(i) for i in field], on='-')
-            )
+            item_hash = DataLoader.item_hash([item.get(i) for i in field])
 
         if await self.hash_in_bloom(item_hash):
             return None
 
         await self.add_hash(item_hash)
 
+        if self.shard is not None:
+            # 多进程模式下，同一条数据可能由不同的工作进程采集到
+            if not self.shard.claim(item_hash):
+                return None
+            self.shard.add_item()
+
         container = self.containers[model.Meta.engine]
         await container.add(table, item=item)
 
@@ -534,14 +534,27 @@ class AsyncRdisAPI:
 
     def __init__(
             self, *, host: str, port: int = 6379, username: Optional[str] = None, password: Optional[str] = None,
-            db: [int, str] = 0, encoding: str = "utf-8", max_connections: Optional[int] = None
+            db: [int, str] = 0, encoding: str = "utf-8", max_connections: Optional[int] = None,
+            decode_responses: bool = True
     ):
         self._conn_kwargs = {
             'host': host, 'port': port, 'username': username, 'password': password, 'db': db,
-            'encoding': encoding, 'decode_responses': True, 'retry_on_timeout': True,
+            'encoding': encoding, 'decode_responses': decode_responses, 'retry_on_timeout': True,
             'max_connections': max_connections,
         }
         self._pool = Redis(**self._conn_kwargs)
+        self._binary = None
+
+    @property
+    def binary(self) -> 'AsyncRdisAPI':
+        """使用相同参数、不解码响应的连接，用于读写二进制数据"""
+
+        if self._binary is None:
+            kwargs = {k: v for k, v in self._conn_kwargs.items() if k != 'retry_on_timeout'}
+            kwargs['decode_responses'] = False
+            self._binary = AsyncRdisAPI(**kwargs)
+
+        return self._binary
 
     @property
     def string(self) -> String:
@@ -611,9 +624,19 @@ class AsyncRdisAPI:
         """清空所有数据"""
         await self._pool.flushdb()
 
+    def pipeline(self, transaction: bool = False):
+        """创建管道，多条命令一次往返发送"""
+        return self._pool.pipeline(transaction=transaction)
+
+    def register_script(self, script: str):
+        """注册Lua脚本，调用时优先使用 EVALSHA"""
+        return self._pool.register_script(script)
+
     async def close(self):
         """关闭数据库连接"""
         await self._pool.connection_pool.disconnect()
+        if self._binary is not None:
+            await self._binary.close()
 
     async def ping(self):
         await self._pool.ping()
\ No newline at end of file
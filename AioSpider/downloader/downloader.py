@@ -1,3 +1,6 @@
+import time
+
+from AioSpider.constants import Stage
 from AioSpider.exceptions import *
 from AioSpider.http import Response
 from AioSpider.http.base import BaseRequest
@@ -37,18 +40,30 @@ class RequestHandler:
 
 class Downloader:
 
-    def __init__(self, settings, middleware):
+    def __init__(self, settings, middleware, metrics=None):
         self.handler = RequestHandler(settings)
         self.middleware = middleware
+        self.metrics = metrics
 
     async def fetch(self, request):
 
-        http_obj = await self._process_request(request)
+        if self.metrics is None:
+            http_obj = await self._process_request(request)
+        else:
+            start = time.perf_counter()
+            http_obj = await self._process_request(request)
+            self.metrics.record(Stage.download_mw, time.perf_counter() - start, request)
+
         if http_obj is None:
             return None
 
         if isinstance(http_obj, BaseRequest):
-            res_obj = await self.handler.fetch(http_obj)
+            if self.metrics is None:
+                res_obj = await self.handler.fetch(http_obj)
+            else:
+                start = time.perf_counter()
+                res_obj = await self.handler.fetch(http_obj)
+                self.metrics.record(Stage.fetch, time.perf_counter() - start, http_obj)
 
             if isinstance(res_obj, Response):
                 response = await self._process_response(res_obj)
@@ -94,7 +109,14 @@ class Downloader:
             if not hasattr(m, 'process_response'):
                 continue
 
-            ret = await m.process_response(response) if m.is_async else m.process_response(response)
+            if self.metrics is None:
+                ret = await m.process_response(response) if m.is_async else m.process_response(response)
+            else:
+                start = time.perf_counter()
+                ret = await m.process_response(response) if m.is_async else m.process_response(response)
+                self.metrics.record(
+                    getattr(m, 'stage', Stage.download_mw), time.perf_counter() - start, response.request
+                )
 
             if ret is None:
                 continue
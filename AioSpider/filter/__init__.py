@@ -1,5 +1,6 @@
 __all__ = [
-    'BloomFilter', 'RedisBloomFilter'
+    'BloomFilter', 'ScalableBloomFilter', 'RedisBloomFilter', 'CuckooFilter', 'ScalableCuckooFilter'
 ]
 
-from AioSpider.filter.bloom import BloomFilter, RedisBloomFilter, AutoBloom
+from AioSpider.filter.bloom import BloomFilter, ScalableBloomFilter, RedisBloomFilter, AutoBloom
+from AioSpider.filter.cuckoo import CuckooFilter, ScalableCuckooFilter
@@ -1,9 +1,11 @@
 import math
+import mmap
 import hashlib
 import bitarray
 from io import BytesIO
-from struct import unpack, pack
+from struct import Struct, unpack, pack, calcsize, error as struct_error
 
+import numpy as np
 import redis
 
 
@@ -15,6 +17,46 @@ def is_string_io(instance):
     return isinstance(instance, BytesIO)
 
 
+_PAIR = Struct('<QQ')
+
+
+def _key_bytes(key):
+    return key.encode('utf-8') if isinstance(key, str) else str(key).encode('utf-8')
+
+
+def hash_pair(key):
+    """元素 md5 摘要的两个64位整数，用于双重哈希"""
+    return _PAIR.unpack(hashlib.md5(_key_bytes(key)).digest())
+
+
+def hash_pairs(keys):
+    """批量计算 hash_pair，返回两个 uint64 数组"""
+    md5 = hashlib.md5
+    try:
+        # 元素一般都是字符串，避免逐个调用 _key_bytes
+        digests = b''.join([md5(key.encode('utf-8')).digest() for key in keys])
+    except AttributeError:
+        digests = b''.join([md5(_key_bytes(key)).digest() for key in keys])
+    digests = np.frombuffer(digests, dtype='<u8')
+    return digests[0::2].astype(np.uint64), digests[1::2].astype(np.uint64)
+
+
+def hex_pair(key):
+    """元素本身是 md5 十六进制字符串时直接作为摘要，不再计算一次 md5"""
+    return _PAIR.unpack(bytes.fromhex(key))
+
+
+def hex_pairs(keys):
+    """批量计算 hex_pair，所有元素拼接后一次转换"""
+
+    digests = bytes.fromhex(''.join(keys))
+    if len(digests) != 16 * len(keys):
+        raise ValueError('prehashed 布隆过滤器的元素必须是32位的十六进制字符串')
+
+    digests = np.frombuffer(digests, dtype='<u8')
+    return digests[0::2].astype(np.uint64), digests[1::2].astype(np.uint64)
+
+
 def make_hash_funcs(num_slices, num_bits):
 
     def _make_hash_funcs(key):
@@ -52,32 +94,105 @@ class BloomBase:
 
 
 class BloomFilter(BloomBase):
-
-    FILE_FMT = b'<dQQQQ'
-
-    def __init__(self, capacity, error_rate=0.001):
+    """
+    布隆过滤器，每个元素只计算一次 md5，取其两个64位整数 h1、h2，第 i 个分片的位置为 (h1 + i * h2) % bits_per_slice。
+    add_many、contains_many 按块计算摘要，位置计算和读写位数组由 NumPy 批量完成
+    Args:
+        capacity: 容量
+        error_rate: 错误率
+        prehashed: 元素是否为 md5 十六进制字符串（请求指纹、数据哈希），是则直接作为摘要
+    """
+
+    # 魔数用于区分旧版本的文件，旧版本的位置计算方式不兼容
+    MAGIC = b'AIOBLM3\0'
+    FILE_FMT = b'<8sdQQQQ?'
+
+    # 批量操作每块的元素数量，限制位置矩阵（块大小 * num_slices * 8 字节）的内存
+    chunk_size = 1 << 16
+
+    def __init__(self, capacity, error_rate=0.001, prehashed=False):
         if not (0 < error_rate < 1):
             raise ValueError("Error_Rate must be between 0 and 1.")
         if not capacity > 0:
             raise ValueError("Capacity must be > 0")
 
+        self._setup(error_rate, *self.dimensions(capacity, error_rate), capacity, 0, prehashed)
+        self.bitarray = bitarray.bitarray(self.num_bits, endian='little')
+        self.bitarray.setall(False)
+
+    @staticmethod
+    def dimensions(capacity, error_rate):
+        """按容量和错误率计算 (分片数量, 每个分片的位数)"""
+
         num_slices = int(math.ceil(math.log(1.0 / error_rate, 2)))
         bits_per_slice = int(math.ceil(
             (capacity * abs(math.log(error_rate))) / (num_slices * (math.log(2) ** 2)))
         )
-        self._setup(error_rate, num_slices, bits_per_slice, capacity, 0)
-        self.bitarray = bitarray.bitarray(self.num_bits, endian='little')
-        self.bitarray.setall(False)
+        return num_slices, bits_per_slice
+
+    @classmethod
+    def nbytes(cls, capacity, error_rate=0.001) -> int:
+        """位数组占用的字节数"""
+        num_slices, bits_per_slice = cls.dimensions(capacity, error_rate)
+        return (num_slices * bits_per_slice + 7) // 8
+
+    @classmethod
+    def frombuffer(cls, buffer, capacity, error_rate=0.001, prehashed=False):
+        """
+        在已有的可写缓冲区上创建布隆过滤器，不复制数据，用于多进程共享内存
+        Args:
+            buffer: 可写缓冲区，长度至少为 nbytes(capacity, error_rate)，初始内容应全为0
+        """
+
+        bloom = cls.__new__(cls)
+        bloom._setup(error_rate, *cls.dimensions(capacity, error_rate), capacity, 0, prehashed)
+        bloom.bitarray = bitarray.bitarray(buffer=buffer, endian='little')
+
+        if len(bloom.bitarray) < bloom.num_bits:
+            raise ValueError('缓冲区长度小于布隆过滤器的位数组长度')
+
+        return bloom
+
+    def _setup(self, error_rate, num_slices, bits_per_slice, capacity, count, prehashed=False):
+        self.error_rate = error_rate
+        self.num_slices = num_slices
+        self.bits_per_slice = bits_per_slice
+        self.capacity = capacity
+        self.num_bits = num_slices * bits_per_slice
+        self.count = count
+        self.prehashed = prehashed
+        self._slice_offsets = range_fn(0, self.num_bits, bits_per_slice)
+        self._pair = hex_pair if prehashed else hash_pair
+        self._pairs = hex_pairs if prehashed else hash_pairs
+
+    def _offsets(self, h1, h2):
+        """各分片中的位置，第 i 个分片为 (h1 + i * h2) % bits_per_slice，逐个累加避免大整数运算"""
 
-    def __contains__(self, key):
         bits_per_slice = self.bits_per_slice
+        a, b = h1 % bits_per_slice, h2 % bits_per_slice
+
+        for offset in self._slice_offsets:
+            yield offset + a
+            a += b
+            if a >= bits_per_slice:
+                a -= bits_per_slice
+
+    def __contains__(self, key):
+        return self._contains_pair(*self._pair(key))
+
+    def _contains_pair(self, h1, h2):
+
         bitarray = self.bitarray
-        hashes = self.make_hashes(key)
-        offset = 0
-        for k in hashes:
-            if not bitarray[offset + k]:
+        bits_per_slice = self.bits_per_slice
+        a, b = h1 % bits_per_slice, h2 % bits_per_slice
+
+        for offset in self._slice_offsets:
+            if not bitarray[offset + a]:
                 return False
-            offset += bits_per_slice
+            a += b
+            if a >= bits_per_slice:
+                a -= bits_per_slice
+
         return True
 
     def __len__(self):
@@ -85,37 +200,399 @@ class BloomFilter(BloomBase):
 
     def add(self, key, skip_check=False):
 
+        if self.count > self.capacity:
+            raise IndexError("BloomFilter is at capacity")
+
         bitarray = self.bitarray
-        bits_per_slice = self.bits_per_slice
-        hashes = self.make_hashes(key)
         found_all_bits = True
 
+        for k in self._offsets(*self._pair(key)):
+            if found_all_bits and not bitarray[k]:
+                found_all_bits = False
+            bitarray[k] = True
+
+        if skip_check or not found_all_bits:
+            self.count += 1
+            return False
+
+        return True
+
+    def _positions(self, h1, h2):
+        """h1、h2 为 uint64 数组，返回 (元素数量, num_slices) 的位置矩阵，与 _offsets 的结果一致"""
+        i = np.arange(self.num_slices, dtype=np.uint64)
+        bits_per_slice = np.uint64(self.bits_per_slice)
+        a, b = h1 % bits_per_slice, h2 % bits_per_slice
+        return (a[:, None] + i * b[:, None]) % bits_per_slice + i * bits_per_slice
+
+    def _view(self):
+        # 小端位序的 bitarray 中第 k 位位于第 k >> 3 个字节的第 k & 7 位
+        return np.frombuffer(self.bitarray, dtype=np.uint8)
+
+    def _contains_hashed(self, h1, h2):
+        pos = self._positions(h1, h2)
+        return ((self._view()[pos >> 3] >> (pos & 7).astype(np.uint8)) & 1).all(axis=1)
+
+    def _add_hashed(self, h1, h2):
+        pos = self._positions(h1, h2).ravel()
+        np.bitwise_or.at(self._view(), pos >> 3, np.left_shift(1, pos & 7).astype(np.uint8))
+
+    def add_many(self, keys, skip_check=False):
+        """
+        批量添加，skip_check 为 False 时只有添加前不存在的元素计入 count（同一批内重复的元素分别计数）
+        Return:
+            添加前是否已存在的布尔数组，skip_check 为 True 时返回 None
+        """
+
+        keys = keys if isinstance(keys, (list, tuple)) else list(keys)
+
         if self.count > self.capacity:
             raise IndexError("BloomFilter is at capacity")
 
-        offset = 0
-        for k in hashes:
-            if not skip_check and found_all_bits and not bitarray[offset + k]:
-                found_all_bits = False
-    
-            self.bitarray[offset + k] = True
-            offset += bits_per_slice
-    
+        found = []
+        for i in range_fn(0, len(keys), self.chunk_size):
+            h1, h2 = self._pairs(keys[i:i + self.chunk_size])
+            if not skip_check:
+                exists = self._contains_hashed(h1, h2)
+                found.append(exists)
+                self.count += int((~exists).sum())
+            else:
+                self.count += len(h1)
+            self._add_hashed(h1, h2)
+
         if skip_check:
-            self.count += 1
-            return False
-        elif not found_all_bits:
-            self.count += 1
-            return False
+            return None
+
+        return np.concatenate(found) if found else np.zeros(0, dtype=bool)
+
+    def contains_many(self, keys):
+        """批量查询，返回与 keys 等长的布尔数组"""
+
+        keys = keys if isinstance(keys, (list, tuple)) else list(keys)
+
+        result = [
+            self._contains_hashed(*self._pairs(keys[i:i + self.chunk_size]))
+            for i in range_fn(0, len(keys), self.chunk_size)
+        ]
+
+        return np.concatenate(result) if result else np.zeros(0, dtype=bool)
+
+    def clear(self):
+        self.bitarray.setall(False)
+        self.count = 0
+
+    def tofile(self, f):
+        """写入文件对象，文件头为 FILE_FMT 格式的参数，之后是位数组"""
+
+        f.write(pack(
+            self.FILE_FMT, self.MAGIC, self.error_rate, self.num_slices, self.bits_per_slice, self.capacity,
+            self.count, self.prehashed
+        ))
+
+        if is_string_io(f):
+            f.write(self.bitarray.tobytes())
+        else:
+            self.bitarray.tofile(f)
+
+    @classmethod
+    def fromfile(cls, f, n=-1):
+        """
+        从文件对象读取
+        Args:
+            f: 文件对象
+            n: 读取的字节数，-1 表示读取到文件末尾
+        """
+
+        headerlen = calcsize(cls.FILE_FMT)
+        if 0 < n < headerlen:
+            raise ValueError('读取的字节数小于文件头长度')
+
+        magic, *params = unpack(cls.FILE_FMT, f.read(headerlen))
+        if magic != cls.MAGIC:
+            raise ValueError('不是当前版本的布隆过滤器文件')
+
+        bloom = cls.__new__(cls)
+        bloom._setup(*params)
+        bloom.bitarray = bitarray.bitarray(endian='little')
+
+        if n > 0:
+            bloom.bitarray.frombytes(f.read(n - headerlen))
+        elif is_string_io(f):
+            bloom.bitarray.frombytes(f.read())
+        else:
+            bloom.bitarray.fromfile(f)
+
+        # 位数组按字节对齐，长度可能比 num_bits 多出不足一个字节的填充位
+        if not 0 <= len(bloom.bitarray) - bloom.num_bits < 8:
+            raise ValueError('布隆过滤器文件的位数组长度不正确')
+
+        return bloom
+
+    @classmethod
+    def frommmap(cls, f):
+        """
+        以只读 mmap 打开 tofile 写入的文件，位数组不读入内存，查询时由操作系统按需换页
+        Args:
+            f: 以二进制方式打开的文件对象
+        Return:
+            (只读的布隆过滤器, mmap 对象)，不再使用时先删除过滤器再关闭 mmap
+        """
+
+        headerlen = calcsize(cls.FILE_FMT)
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            bloom = cls.fromheader(mm[:headerlen], len(mm))
+        except Exception:
+            mm.close()
+            raise
+
+        bloom.bitarray = bitarray.bitarray(buffer=memoryview(mm)[headerlen:], endian='little')
+
+        return bloom, mm
+
+    @classmethod
+    def fromheader(cls, header, size):
+        """
+        按 tofile 写入的文件头创建过滤器并校验长度，位数组由调用方设置
+        Args:
+            header: 文件头
+            size: 文件头和位数组的总字节数
+        """
+
+        headerlen = calcsize(cls.FILE_FMT)
+        if size < headerlen or len(header) < headerlen:
+            raise ValueError('读取的字节数小于文件头长度')
+
+        magic, *params = unpack(cls.FILE_FMT, header[:headerlen])
+        if magic != cls.MAGIC:
+            raise ValueError('不是当前版本的布隆过滤器文件')
+
+        bloom = cls.__new__(cls)
+        bloom._setup(*params)
+        if not 0 <= (size - headerlen) * 8 - bloom.num_bits < 8:
+            raise ValueError('布隆过滤器文件的位数组长度不正确')
+
+        return bloom
+
+
+class ScalableBloomFilter:
+    """
+    可扩容的布隆过滤器，当前分片写满后追加一个容量为 mode 倍、错误率为 ratio 倍的新分片，
+    查询时检查所有分片，整体错误率不超过 error_rate。各分片使用同一个摘要，元素只计算一次 md5
+    Args:
+        initial_capacity: 第一个分片的容量
+        error_rate: 整体错误率
+        mode: 分片容量增长倍数，SMALL_SET_GROWTH 或 LARGE_SET_GROWTH
+        ratio: 分片错误率收紧比例
+        prehashed: 元素是否为 md5 十六进制字符串，是则直接作为摘要
+    """
+
+    SMALL_SET_GROWTH = 2
+    LARGE_SET_GROWTH = 4
+    MAGIC = b'AIOSBF1\0'
+    FILE_FMT = b'<8sidQd?'
+
+    def __init__(self, initial_capacity=100, error_rate=0.001, mode=LARGE_SET_GROWTH, ratio=0.9, prehashed=False):
+        if not (0 < error_rate < 1):
+            raise ValueError("Error_Rate must be between 0 and 1.")
+        if not initial_capacity > 0:
+            raise ValueError("Capacity must be > 0")
+
+        self._setup(mode, ratio, initial_capacity, error_rate, prehashed)
+        self.filters = []
+
+    def _setup(self, mode, ratio, initial_capacity, error_rate, prehashed=False):
+        self.scale = mode
+        self.ratio = ratio
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.prehashed = prehashed
+        self._pair = hex_pair if prehashed else hash_pair
+        self._pairs = hex_pairs if prehashed else hash_pairs
+
+    def __contains__(self, key):
+        return self._contains_pair(*self._pair(key))
+
+    def _contains_pair(self, h1, h2):
+        # 新分片更大，命中的可能性更高，从后往前检查
+        for bloom in reversed(self.filters):
+            if bloom._contains_pair(h1, h2):
+                return True
+        return False
+
+    def _current(self) -> BloomFilter:
+        """当前写入的分片，写满或是从文件映射的只读分片时追加新分片"""
+
+        if not self.filters:
+            bloom = BloomFilter(
+                capacity=self.initial_capacity, error_rate=self.error_rate * (1.0 - self.ratio),
+                prehashed=self.prehashed
+            )
+            self.filters.append(bloom)
         else:
+            bloom = self.filters[-1]
+            if bloom.count >= bloom.capacity or bloom.bitarray.readonly:
+                bloom = BloomFilter(
+                    capacity=bloom.capacity * self.scale, error_rate=bloom.error_rate * self.ratio,
+                    prehashed=self.prehashed
+                )
+                self.filters.append(bloom)
+
+        return bloom
+
+    def add(self, key):
+        """添加元素，元素已存在时返回 True"""
+
+        h1, h2 = self._pair(key)
+        if self._contains_pair(h1, h2):
             return True
-    
-    def add_many(self, keys: list, skip_check=False):
-        for k in keys:
-            self.add(k, skip_check=skip_check)
+
+        bloom = self._current()
+        for k in bloom._offsets(h1, h2):
+            bloom.bitarray[k] = True
+        bloom.count += 1
+
+        return False
+
+    def _contains_hashed(self, h1, h2):
+        found = np.zeros(len(h1), dtype=bool)
+        for bloom in self.filters:
+            found |= bloom._contains_hashed(h1, h2)
+        return found
+
+    def add_many(self, keys):
+        """批量添加，已存在的元素跳过，当前分片写满时剩余的元素写入新分片"""
+
+        keys = list(dict.fromkeys(keys))
+
+        for i in range_fn(0, len(keys), BloomFilter.chunk_size):
+            self.add_pairs(*self._pairs(keys[i:i + BloomFilter.chunk_size]))
+
+    def add_pairs(self, h1, h2):
+        """
+        按摘要批量添加，已存在的元素跳过
+        Args:
+            h1: 摘要的第一个64位整数，uint64 数组
+            h2: 摘要的第二个64位整数，uint64 数组
+        """
+
+        for i in range_fn(0, len(h1), BloomFilter.chunk_size):
+            c1, c2 = h1[i:i + BloomFilter.chunk_size], h2[i:i + BloomFilter.chunk_size]
+            absent = ~self._contains_hashed(c1, c2)
+            c1, c2 = c1[absent], c2[absent]
+            while len(c1):
+                bloom = self._current()
+                room = bloom.capacity - bloom.count
+                bloom._add_hashed(c1[:room], c2[:room])
+                bloom.count += len(c1[:room])
+                c1, c2 = c1[room:], c2[room:]
+
+    def contains_many(self, keys):
+        """批量查询，返回与 keys 等长的布尔数组"""
+
+        keys = keys if isinstance(keys, (list, tuple)) else list(keys)
+
+        result = [
+            self._contains_hashed(*self._pairs(keys[i:i + BloomFilter.chunk_size]))
+            for i in range_fn(0, len(keys), BloomFilter.chunk_size)
+        ]
+
+        return np.concatenate(result) if result else np.zeros(0, dtype=bool)
+
+    @property
+    def capacity(self):
+        return sum(bloom.capacity for bloom in self.filters)
+
+    @property
+    def count(self):
+        return sum(bloom.count for bloom in self.filters)
+
+    def __len__(self):
+        return self.count
 
     def clear(self):
-        self.bitarray.clear()
+        self.filters = []
+
+    def tofile(self, f):
+        """写入文件对象，文件头之后依次写入各分片的长度和内容"""
+
+        f.write(pack(
+            self.FILE_FMT, self.MAGIC, self.scale, self.ratio, self.initial_capacity, self.error_rate, self.prehashed
+        ))
+        f.write(pack('<Q', len(self.filters)))
+
+        for bloom in self.filters:
+            buffer = BytesIO()
+            bloom.tofile(buffer)
+            f.write(pack('<Q', buffer.tell()))
+            f.write(buffer.getvalue())
+
+    @classmethod
+    def _header(cls, data):
+
+        magic, *params = unpack(cls.FILE_FMT, data)
+        if magic != cls.MAGIC:
+            raise ValueError('不是当前版本的可扩容布隆过滤器文件')
+
+        bloom = cls.__new__(cls)
+        bloom._setup(*params)
+        bloom.filters = []
+
+        return bloom
+
+    @classmethod
+    def fromfile(cls, f):
+
+        bloom = cls._header(f.read(calcsize(cls.FILE_FMT)))
+
+        num_filters, = unpack('<Q', f.read(8))
+        for _ in range_fn(num_filters):
+            size, = unpack('<Q', f.read(8))
+            bloom.filters.append(BloomFilter.fromfile(BytesIO(f.read(size)), size))
+
+        return bloom
+
+    @classmethod
+    def frommmap(cls, f, offset=0):
+        """
+        以只读 mmap 打开 tofile 写入的文件，已有分片不读入内存，之后添加的元素写入新分片
+        Args:
+            f: 以二进制方式打开的文件对象
+            offset: 过滤器在文件中的起始位置
+        Return:
+            (布隆过滤器, mmap 对象)，不再使用时先删除过滤器再关闭 mmap
+        """
+
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        headerlen = calcsize(cls.FILE_FMT)
+        bloomlen = calcsize(BloomFilter.FILE_FMT)
+
+        # 先校验全部文件头，校验通过后再创建引用 mmap 的位数组
+        try:
+            bloom = cls._header(mm[offset:offset + headerlen])
+            offset += headerlen
+            num_filters, = unpack('<Q', mm[offset:offset + 8])
+            offset += 8
+
+            slices = []
+            for _ in range_fn(num_filters):
+                size, = unpack('<Q', mm[offset:offset + 8])
+                offset += 8
+                if offset + size > len(mm):
+                    raise ValueError('可扩容布隆过滤器文件不完整')
+                sub = BloomFilter.fromheader(mm[offset:offset + bloomlen], size)
+                slices.append((sub, offset + bloomlen, offset + size))
+                offset += size
+        except (ValueError, struct_error):
+            mm.close()
+            raise ValueError('不是可扩容布隆过滤器文件或已损坏')
+
+        view = memoryview(mm)
+        for sub, start, end in slices:
+            sub.bitarray = bitarray.bitarray(buffer=view[start:end], endian='little')
+            bloom.filters.append(sub)
+
+        return bloom, mm
 
 
 class RedisBloomFilter(BloomBase):
@@ -151,11 +628,14 @@ class RedisBloomFilter(BloomBase):
 
 class AutoBloom:
 
-    def __init__(self, capacity, error_rate=0.001, max_capacity=float('inf')):
+    def __init__(self, capacity, error_rate=0.001, max_capacity=float('inf'), prehashed=False):
 
         self.capacity = capacity
         self.error_rate = error_rate
         self.max_capacity = max_capacity
+        self.prehashed = prehashed
+        self._pair = hex_pair if prehashed else hash_pair
+        self._pairs = hex_pairs if prehashed else hash_pairs
         self._bloom = None
         self.y = 0
         self.count = 0
@@ -164,7 +644,7 @@ class AutoBloom:
     def bloom(self):
 
         if self._bloom is None:
-            self._bloom = [BloomFilter(capacity=self.capacity, error_rate=self.error_rate)]
+            self._bloom = [BloomFilter(capacity=self.capacity, error_rate=self.error_rate, prehashed=self.prehashed)]
 
         if self.count // self.capacity != self.y:
             if self.count >= self.max_capacity:
@@ -172,7 +652,7 @@ class AutoBloom:
                     f"从数据库中加载到的数据数量已经超过最大限制，data_count：{self.count}, "
                     f"max_capacity：{self.max_capacity}"
                 )
-            self._bloom.append(BloomFilter(capacity=self.capacity, error_rate=self.error_rate))
+            self._bloom.append(BloomFilter(capacity=self.capacity, error_rate=self.error_rate, prehashed=self.prehashed))
             self.y += 1
 
         return self._bloom[self.y]
@@ -182,11 +662,50 @@ class AutoBloom:
         self.count += 1
 
     def add_many(self, items):
-        for item in items:
-            self.add(item)
+        """批量添加，按各分片的剩余容量切分后批量写入"""
+
+        items = items if isinstance(items, (list, tuple)) else list(items)
+
+        for i in range_fn(0, len(items), BloomFilter.chunk_size):
+            self.add_pairs(*self._pairs(items[i:i + BloomFilter.chunk_size]))
+
+    def add_pairs(self, h1, h2):
+        """
+        按摘要批量添加，摘要由调用方批量计算
+        Args:
+            h1: 摘要的第一个64位整数，uint64 数组
+            h2: 摘要的第二个64位整数，uint64 数组
+        """
+
+        start = 0
+        while start < len(h1):
+            bloom = self.bloom
+            room = self.capacity * (self.y + 1) - self.count
+            end = min(start + room, len(h1))
+            bloom._add_hashed(h1[start:end], h2[start:end])
+            bloom.count += end - start
+            self.count += end - start
+            start = end
 
     def __contains__(self, item):
-        return any(item in bf for bf in self._bloom) if self._bloom is not None else False
+        if self._bloom is None:
+            return False
+        # 各分片使用同一个摘要
+        h1, h2 = self._pair(item)
+        return any(bf._contains_pair(h1, h2) for bf in self._bloom)
+
+    def contains_many(self, items):
+        """批量查询，返回与 items 等长的布尔数组"""
+
+        items = items if isinstance(items, (list, tuple)) else list(items)
+        found = np.zeros(len(items), dtype=bool)
+
+        for i in range_fn(0, len(items), BloomFilter.chunk_size):
+            h1, h2 = self._pairs(items[i:i + BloomFilter.chunk_size])
+            for bf in self._bloom or ():
+                found[i:i + len(h1)] |= bf._contains_hashed(h1, h2)
+
+        return found
 
     def __len__(self):
         return self.count
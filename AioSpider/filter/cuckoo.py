@@ -0,0 +1,376 @@
+"""
+布谷鸟过滤器，支持删除的集合成员判断，用于记录请求的成功、失败状态。
+每个元素只保存一个 8/16/32 位的指纹，存放在两个候选桶之一，内存占用在创建时固定，与已添加的元素数量无关
+
+    cuckoo = CuckooFilter(capacity=1000000, error_rate=0.001)
+    cuckoo.add(key)
+    key in cuckoo
+    cuckoo.remove(key)
+
+add 总是插入一个指纹，同一元素添加多次就保存多个指纹，需要删除同样的次数。
+不能因为查询命中就跳过插入：命中可能是误判，跳过后该元素没有自己的指纹，删除时会删掉与它冲突的元素
+
+候选桶：i1 = h1 & mask，i2 = i1 ^ (fp * M & mask)，由任一候选桶和指纹都能算出另一个候选桶，踢出指纹时不需要原始元素
+"""
+
+__all__ = ['CuckooFilter', 'ScalableCuckooFilter']
+
+import math
+import random
+from array import array
+
+import numpy as np
+
+from AioSpider.filter.bloom import hash_pair, hash_pairs, hex_pair, hex_pairs, range_fn
+
+
+# 计算另一个候选桶时指纹的乘数，打散相近指纹的桶编号
+_M = 0x5bd1e995
+
+
+class CuckooFilter:
+    """
+    布谷鸟过滤器，元素摘要的两个64位整数 h1、h2 分别决定候选桶和指纹（指纹非0，0 表示空位）。
+    指纹位数按 log2(2 * bucket_size / error_rate) 计算后向上取整到 8/16/32 位，实际误判率不高于 error_rate。
+    桶数量取 2 的幂，装载率约 95% 时写满；写满后 add 抛出 IndexError
+    Args:
+        capacity: 容量
+        error_rate: 错误率
+        bucket_size: 每个桶的指纹数量
+        max_kicks: 两个候选桶都满时最多踢出的次数，超过后被踢出的指纹暂存，过滤器视为写满
+        prehashed: 元素是否为 md5 十六进制字符串（请求指纹、数据哈希），是则直接作为摘要
+    """
+
+    # 桶数量按该装载率计算
+    load_factor = 0.95
+
+    # 批量操作每块的元素数量
+    chunk_size = 1 << 16
+
+    def __init__(self, capacity, error_rate=0.001, bucket_size=4, max_kicks=500, prehashed=False):
+        if not (0 < error_rate < 1):
+            raise ValueError("Error_Rate must be between 0 and 1.")
+        if not capacity > 0:
+            raise ValueError("Capacity must be > 0")
+
+        bits = math.ceil(math.log2(2 * bucket_size / error_rate))
+        if bits > 32:
+            raise ValueError("Error_Rate is too small, fingerprint must be <= 32 bits")
+
+        self.error_rate = error_rate
+        self.bucket_size = bucket_size
+        self.max_kicks = max_kicks
+        self.prehashed = prehashed
+        self.fingerprint_bits = 8 if bits <= 8 else 16 if bits <= 16 else 32
+        self.num_buckets = 1 << max(math.ceil(math.log2(capacity / (bucket_size * self.load_factor))), 0)
+        self.capacity = int(self.num_buckets * bucket_size * self.load_factor)
+        self.count = 0
+
+        self._mask = self.num_buckets - 1
+        # 指纹取值范围为 1 ~ 2 ** fingerprint_bits - 1
+        self._fp_mod = (1 << self.fingerprint_bits) - 1
+        self._dtype = np.dtype(f'uint{self.fingerprint_bits}')
+        self._pair = hex_pair if prehashed else hash_pair
+        self._pairs = hex_pairs if prehashed else hash_pairs
+        # 被踢出且无处安放的 (桶编号, 指纹)，不为空时过滤器已满
+        self._victim = None
+
+        self.table = array({8: 'B', 16: 'H', 32: 'I'}[self.fingerprint_bits])
+        self.table.frombytes(bytes(self.num_buckets * bucket_size * self._dtype.itemsize))
+
+    @property
+    def nbytes(self) -> int:
+        """指纹表占用的内存"""
+        return self.num_buckets * self.bucket_size * self._dtype.itemsize
+
+    @property
+    def full(self) -> bool:
+        return self._victim is not None
+
+    def _locate(self, h1, h2):
+        """元素的指纹和两个候选桶"""
+        fp = h2 % self._fp_mod + 1
+        i1 = h1 & self._mask
+        return fp, i1, i1 ^ ((fp * _M) & self._mask)
+
+    def _locate_many(self, h1, h2):
+        """_locate 的 NumPy 版本，uint64 乘法溢出只影响高位，与 _locate 结果一致"""
+        fp = h2 % np.uint64(self._fp_mod) + np.uint64(1)
+        mask = np.uint64(self._mask)
+        i1 = h1 & mask
+        i2 = i1 ^ ((fp * np.uint64(_M)) & mask)
+        return fp.astype(self._dtype), i1.astype(np.intp), i2.astype(np.intp)
+
+    def _alt(self, i, fp):
+        return i ^ ((fp * _M) & self._mask)
+
+    def _view(self):
+        return np.frombuffer(self.table, dtype=self._dtype).reshape(self.num_buckets, self.bucket_size)
+
+    def _bucket(self, i):
+        return self.table[i * self.bucket_size:(i + 1) * self.bucket_size]
+
+    def _put(self, i, fp) -> bool:
+        """放入桶中的空位，桶已满时返回 False"""
+
+        bucket = self._bucket(i)
+        if 0 not in bucket:
+            return False
+
+        self.table[i * self.bucket_size + bucket.index(0)] = fp
+        return True
+
+    def _has(self, fp, i1, i2) -> bool:
+
+        if fp in self._bucket(i1) or fp in self._bucket(i2):
+            return True
+
+        victim = self._victim
+        return victim is not None and victim[1] == fp and victim[0] in (i1, i2)
+
+    def _insert(self, fp, i1, i2) -> bool:
+        """插入指纹，过滤器已满时返回 False"""
+
+        if self._put(i1, fp) or self._put(i2, fp):
+            self.count += 1
+            return True
+
+        if self._victim is not None:
+            return False
+
+        # 随机踢出候选桶中的一个指纹，被踢出的指纹移到它的另一个候选桶
+        table, bucket_size = self.table, self.bucket_size
+        i = random.choice((i1, i2))
+        for _ in range_fn(self.max_kicks):
+            slot = i * bucket_size + random.randrange(bucket_size)
+            fp, table[slot] = table[slot], fp
+            i = self._alt(i, fp)
+            if self._put(i, fp):
+                self.count += 1
+                return True
+
+        # 最后被踢出的指纹暂存，查询和删除时一并检查
+        self._victim = (i, fp)
+        self.count += 1
+        return True
+
+    def _delete(self, fp, i1, i2) -> bool:
+
+        for i in (i1, i2):
+            bucket = self._bucket(i)
+            if fp in bucket:
+                self.table[i * self.bucket_size + bucket.index(fp)] = 0
+                self.count -= 1
+                self._reinsert_victim()
+                return True
+
+        victim = self._victim
+        if victim is not None and victim[1] == fp and victim[0] in (i1, i2):
+            self._victim = None
+            self.count -= 1
+            return True
+
+        return False
+
+    def _reinsert_victim(self):
+        """删除腾出空位后，尝试放回暂存的指纹"""
+
+        if self._victim is None:
+            return
+
+        i, fp = self._victim
+        if self._put(i, fp) or self._put(self._alt(i, fp), fp):
+            self._victim = None
+
+    def __contains__(self, key):
+        return self._has(*self._locate(*self._pair(key)))
+
+    def __len__(self):
+        return self.count
+
+    def add(self, key):
+        """添加元素，总是插入指纹，返回添加前是否可能已存在"""
+
+        loc = self._locate(*self._pair(key))
+        exists = self._has(*loc)
+
+        if not self._insert(*loc):
+            raise IndexError("CuckooFilter is at capacity")
+
+        return exists
+
+    def remove(self, key) -> bool:
+        """
+        删除元素，返回是否删除。只应删除添加过的元素，
+        删除未添加的元素时会以 error_rate 的概率删掉指纹和候选桶都相同的另一个元素
+        """
+        return self._delete(*self._locate(*self._pair(key)))
+
+    def _contains_hashed(self, fp, i1, i2):
+
+        view = self._view()
+        found = (view[i1] == fp[:, None]).any(axis=1) | (view[i2] == fp[:, None]).any(axis=1)
+
+        if self._victim is not None:
+            i, victim = self._victim
+            found |= (fp == victim) & ((i1 == i) | (i2 == i))
+
+        return found
+
+    def contains_many(self, keys):
+        """批量查询，返回与 keys 等长的布尔数组"""
+
+        keys = keys if isinstance(keys, (list, tuple)) else list(keys)
+
+        result = [
+            self._contains_hashed(*self._locate_many(*self._pairs(keys[i:i + self.chunk_size])))
+            for i in range_fn(0, len(keys), self.chunk_size)
+        ]
+
+        return np.concatenate(result) if result else np.zeros(0, dtype=bool)
+
+    def add_many(self, keys):
+        """
+        批量添加，摘要和查询批量计算，指纹逐个插入（同一批内的插入可能互相踢出，无法批量完成），
+        与 add 一样每个元素都插入，同一批内重复的元素插入多次
+        Return:
+            添加前是否可能已存在的布尔数组
+        """
+
+        keys = keys if isinstance(keys, (list, tuple)) else list(keys)
+
+        found = []
+        for i in range_fn(0, len(keys), self.chunk_size):
+            fp, i1, i2 = self._locate_many(*self._pairs(keys[i:i + self.chunk_size]))
+            found.append(self._contains_hashed(fp, i1, i2))
+            for loc in zip(fp.tolist(), i1.tolist(), i2.tolist()):
+                if not self._insert(*loc):
+                    raise IndexError("CuckooFilter is at capacity")
+
+        return np.concatenate(found) if found else np.zeros(0, dtype=bool)
+
+    def clear(self):
+        self._view()[:] = 0
+        self._victim = None
+        self.count = 0
+
+
+class ScalableCuckooFilter:
+    """
+    可扩容的布谷鸟过滤器，第一个分片的容量即内存预算，写满后追加一个容量为 mode 倍的新分片，
+    查询和删除时检查所有分片。各分片误判率相同，扩容后整体误判率随分片数量增加
+    Args:
+        initial_capacity: 第一个分片的容量
+        error_rate: 每个分片的错误率
+        mode: 分片容量增长倍数
+        prehashed: 元素是否为 md5 十六进制字符串
+    """
+
+    def __init__(self, initial_capacity=10000, error_rate=0.001, mode=2, prehashed=False):
+        if not (0 < error_rate < 1):
+            raise ValueError("Error_Rate must be between 0 and 1.")
+        if not initial_capacity > 0:
+            raise ValueError("Capacity must be > 0")
+
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.scale = mode
+        self.prehashed = prehashed
+        self._pair = hex_pair if prehashed else hash_pair
+        self._pairs = hex_pairs if prehashed else hash_pairs
+        self.filters = []
+
+    def _new_filter(self, capacity) -> CuckooFilter:
+        cuckoo = CuckooFilter(capacity=capacity, error_rate=self.error_rate, prehashed=self.prehashed)
+        self.filters.append(cuckoo)
+        return cuckoo
+
+    def _contains_pair(self, h1, h2):
+        # 新分片更大，命中的可能性更高，从后往前检查
+        for cuckoo in reversed(self.filters):
+            if cuckoo._has(*cuckoo._locate(h1, h2)):
+                return True
+        return False
+
+    def _insert_pair(self, h1, h2):
+        """插入当前分片，当前分片已满时追加新分片"""
+
+        cuckoo = self.filters[-1] if self.filters else self._new_filter(self.initial_capacity)
+        if not cuckoo._insert(*cuckoo._locate(h1, h2)):
+            cuckoo = self._new_filter(cuckoo.capacity * self.scale)
+            cuckoo._insert(*cuckoo._locate(h1, h2))
+
+    def __contains__(self, key):
+        return self._contains_pair(*self._pair(key))
+
+    def add(self, key):
+        """添加元素，与 CuckooFilter.add 一样总是插入指纹，返回添加前是否可能已存在"""
+
+        h1, h2 = self._pair(key)
+        exists = self._contains_pair(h1, h2)
+        self._insert_pair(h1, h2)
+
+        return exists
+
+    def remove(self, key) -> bool:
+        """删除元素，返回是否删除，与 CuckooFilter.remove 一样只应删除添加过的元素"""
+
+        h1, h2 = self._pair(key)
+        for cuckoo in reversed(self.filters):
+            if cuckoo._delete(*cuckoo._locate(h1, h2)):
+                return True
+
+        return False
+
+    def _contains_hashed(self, h1, h2):
+        found = np.zeros(len(h1), dtype=bool)
+        for cuckoo in self.filters:
+            found |= cuckoo._contains_hashed(*cuckoo._locate_many(h1, h2))
+        return found
+
+    def contains_many(self, keys):
+        """批量查询，返回与 keys 等长的布尔数组"""
+
+        keys = keys if isinstance(keys, (list, tuple)) else list(keys)
+
+        result = [
+            self._contains_hashed(*self._pairs(keys[i:i + CuckooFilter.chunk_size]))
+            for i in range_fn(0, len(keys), CuckooFilter.chunk_size)
+        ]
+
+        return np.concatenate(result) if result else np.zeros(0, dtype=bool)
+
+    def add_many(self, keys):
+        """批量添加，每个元素都插入，返回添加前是否可能已存在的布尔数组"""
+
+        keys = keys if isinstance(keys, (list, tuple)) else list(keys)
+
+        found = []
+        for i in range_fn(0, len(keys), CuckooFilter.chunk_size):
+            h1, h2 = self._pairs(keys[i:i + CuckooFilter.chunk_size])
+            found.append(self._contains_hashed(h1, h2))
+            for pair in zip(h1.tolist(), h2.tolist()):
+                self._insert_pair(*pair)
+
+        return np.concatenate(found) if found else np.zeros(0, dtype=bool)
+
+    @property
+    def capacity(self):
+        return sum(cuckoo.capacity for cuckoo in self.filters)
+
+    @property
+    def count(self):
+        return sum(cuckoo.count for cuckoo in self.filters)
+
+    @property
+    def nbytes(self):
+        return sum(cuckoo.nbytes for cuckoo in self.filters)
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        """清空并释放扩容出的分片，只保留第一个分片"""
+        del self.filters[1:]
+        if self.filters:
+            self.filters[0].clear()
@@ -168,10 +168,21 @@ class BaseRequest(object):
         for slot in self.__slots__:
             value = getattr(self, slot)
             if slot == 'callback' and callable(value):
-                value = f'{value.__module__}.{value.__self__.__class__.__name__}.{value.__name__}'
+                # 绑定方法和 from_dict 还原出的函数都序列化为 module.Class.method
+                value = f'{value.__module__}.{getattr(value, "__func__", value).__qualname__}'
             request_dict[slot] = tools.dump_json(value)
         return request_dict
 
+    def to_bytes(self) -> bytes:
+        """二进制编码，比 to_dict 更紧凑，见 AioSpider.http.codec"""
+        from AioSpider.http.codec import RequestCodec
+        return RequestCodec().encode(self)
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        from AioSpider.http.codec import RequestCodec
+        return RequestCodec().decode(data)
+
     @classmethod
     def from_dict(cls, request_dict):
 
@@ -186,13 +197,13 @@ class BaseRequest(object):
             request_dict['callback'] = module
 
         return cls(
-            url=request_dict['url'],
+            url=request_dict.get('url') or request_dict['_url'],
             method=request_dict['method'],
             callback=request_dict['callback'],
-            params=request_dict['params'],
+            params=request_dict.get('params', request_dict.get('_params')),
             headers=request_dict['headers'],
             encoding=request_dict['encoding'],
-            data=request_dict['data'],
+            data=request_dict.get('data', request_dict.get('_data')),
             cookies=request_dict['cookies'],
             timeout=request_dict['timeout'],
             proxy=request_dict['proxy'],
@@ -0,0 +1,249 @@
+"""
+BaseRequest 的二进制编码，用于 redis 队列、磁盘溢写和进程间传递请求
+
+    codec = RequestCodec()
+    data = codec.encode(request)
+    request = codec.decode(data)
+
+格式（小端）：
+    版本 B | 标志位 B | 优先级 i | 回调编号或回调名称长度 I | url 长度 I | help 长度 H | 指纹 16s
+    | url | help | 回调名称 | 其他非默认字段的 JSON
+常见的请求只包含 url、回调、help 和优先级，不需要 JSON 部分
+"""
+
+__all__ = ['CallbackRegistry', 'RequestCodec', 'callback_registry']
+
+import json
+import zlib
+import struct
+import inspect
+from urllib.parse import urlparse
+from typing import Callable, Dict, Iterable, List, Optional
+
+from AioSpider.http.base import BaseRequest
+
+
+VERSION = 1
+
+_HEADER = struct.Struct('<BBiIIH16s')
+
+# 标志位
+_DNT_FILTER = 1
+_NO_REFERER = 2
+_POST = 4
+_CALLBACK_NAME = 8
+_EXTRA = 16
+_HELP = 32
+_HASH = 64
+
+_INT32 = (-2 ** 31, 2 ** 31 - 1)
+_NO_HASH = bytes(16)
+
+
+class CallbackRegistry:
+    """
+    回调注册表，回调按 module.qualname 的 crc32 编号，编码时只写入4字节的编号。
+    编号只由名称决定，不同进程和节点只要注册了同一个回调就能解码；未注册的回调按名称编码
+    """
+
+    def __init__(self):
+        # {编号: 名称}
+        self._names: Dict[int, str] = {}
+        # {名称: 编号}
+        self._ids: Dict[str, int] = {}
+        # {名称: 回调}，按名称解析过的回调，避免每个请求都重新导入
+        self._callbacks: Dict[str, Callable] = {}
+
+    @staticmethod
+    def name_of(callback: Callable) -> str:
+        # 绑定方法和解码出的函数都记为 module.Class.method
+        return f'{callback.__module__}.{getattr(callback, "__func__", callback).__qualname__}'
+
+    def register(self, callback: Callable) -> Optional[int]:
+        """注册回调，返回编号，编号冲突时返回 None，该回调按名称编码"""
+
+        name = self.name_of(callback)
+        if name in self._ids:
+            return self._ids[name]
+
+        cid = zlib.crc32(name.encode())
+        if cid in self._names:
+            return None
+
+        self._names[cid] = name
+        self._ids[name] = cid
+        self._callbacks[name] = getattr(callback, '__func__', callback)
+        return cid
+
+    def register_spider(self, spider_cls: type):
+        """注册爬虫类中所有公开的方法"""
+
+        for name, func in inspect.getmembers(spider_cls, inspect.isfunction):
+            if not name.startswith('_'):
+                self.register(func)
+
+    def id_of(self, name: str) -> Optional[int]:
+        return self._ids.get(name)
+
+    def resolve(self, name: str) -> Callable:
+        """按名称解析回调，解析结果缓存"""
+
+        callback = self._callbacks.get(name)
+        if callback is not None:
+            return callback
+
+        components = name.split('.')
+        callback = __import__(components[0])
+        for component in components[1:]:
+            callback = getattr(callback, component)
+
+        self._callbacks[name] = callback
+        return callback
+
+    def callback_of(self, cid: int) -> Callable:
+
+        name = self._names.get(cid)
+        if name is None:
+            raise KeyError(f'回调编号 {cid} 未注册，请确认各节点运行的是同一个爬虫')
+
+        return self._callbacks[name]
+
+
+callback_registry = CallbackRegistry()
+
+
+class RequestCodec:
+    """
+    BaseRequest 二进制编解码器，解码时不经过 __init__，不再重新规范化 url 和计算指纹
+    Args:
+        registry: 回调注册表，默认使用全局注册表
+    """
+
+    def __init__(self, registry: CallbackRegistry = None):
+        self.registry = registry if registry is not None else callback_registry
+
+    def encode(self, request: BaseRequest) -> bytes:
+
+        flags = 0
+        extra = {}
+
+        if request.dnt_filter:
+            flags |= _DNT_FILTER
+        if not request.auto_referer:
+            flags |= _NO_REFERER
+
+        if request.method == 'POST':
+            flags |= _POST
+        elif request.method != 'GET':
+            extra['method'] = request.method
+
+        priority = request.priority
+        if not isinstance(priority, int) or not _INT32[0] <= priority <= _INT32[1]:
+            extra['priority'] = priority
+            priority = 0
+
+        name = b''
+        callback = request.callback
+        cid = 0
+        if callback is not None:
+            callback = callback if isinstance(callback, str) else self.registry.name_of(callback)
+            cid = self.registry.id_of(callback)
+            if cid is None:
+                flags |= _CALLBACK_NAME
+                name = callback.encode()
+                cid = len(name)
+
+        help = b''
+        if request.help is not None:
+            flags |= _HELP
+            help = str(request.help).encode()
+
+        digest = _NO_HASH
+        if request._hash is not None:
+            flags |= _HASH
+            digest = bytes.fromhex(request._hash)
+
+        # 只写入非默认值
+        if request.headers:
+            extra['headers'] = request.headers
+        if request._params:
+            extra['params'] = request._params
+        if request._data:
+            extra['data'] = request._data
+        if request.cookies:
+            extra['cookies'] = request.cookies
+        if request.timeout is not None:
+            extra['timeout'] = request.timeout
+        if request.proxy is not None:
+            extra['proxy'] = request.proxy
+        if request.encoding is not None:
+            extra['encoding'] = request.encoding
+        if request.meta:
+            extra['meta'] = request.meta
+
+        body = b''
+        if extra:
+            flags |= _EXTRA
+            body = json.dumps(extra, separators=(',', ':'), ensure_ascii=False).encode()
+
+        url = request._url.encode()
+
+        return b''.join((
+            _HEADER.pack(VERSION, flags, priority, cid, len(url), len(help), digest), url, help, name, body
+        ))
+
+    def decode(self, data: bytes) -> BaseRequest:
+
+        version, flags, priority, cid, url_len, help_len, digest = _HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ValueError(f'不支持的请求编码版本：{version}')
+
+        offset = _HEADER.size
+        url = data[offset:offset + url_len].decode()
+        offset += url_len
+        help = data[offset:offset + help_len].decode() if flags & _HELP else None
+        offset += help_len
+
+        if flags & _CALLBACK_NAME:
+            callback = self.registry.resolve(data[offset:offset + cid].decode())
+            offset += cid
+        elif cid:
+            callback = self.registry.callback_of(cid)
+        else:
+            callback = None
+
+        extra = json.loads(data[offset:]) if flags & _EXTRA else {}
+
+        parsed = urlparse(url)
+
+        request = BaseRequest.__new__(BaseRequest)
+        request._url = url
+        request.scheme = parsed.scheme
+        request.domain = parsed.netloc
+        request.website = parsed.scheme + '://' + parsed.netloc
+        request.path = parsed.path
+        request.method = extra.get('method', 'POST' if flags & _POST else 'GET')
+        request.headers = extra.get('headers', {})
+        request._params = extra.get('params')
+        request._data = extra.get('data', {})
+        request.cookies = extra.get('cookies', {})
+        request.timeout = extra.get('timeout')
+        request.proxy = extra.get('proxy')
+        request.encoding = extra.get('encoding')
+        request.callback = callback
+        request.dnt_filter = bool(flags & _DNT_FILTER)
+        request.priority = extra.get('priority', priority)
+        request.auto_referer = not flags & _NO_REFERER
+        request.help = help
+        request.meta = extra.get('meta', {})
+        request._hash = digest.hex() if flags & _HASH else None
+
+        return request
+
+    def encode_many(self, requests: Iterable[BaseRequest]) -> List[bytes]:
+        encode = self.encode
+        return [encode(request) for request in requests]
+
+    def decode_many(self, payloads: Iterable[bytes]) -> List[BaseRequest]:
+        decode = self.decode
+        return [decode(payload) for payload in payloads]
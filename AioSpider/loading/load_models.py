@@ -1,6 +1,7 @@
 __all__ = ['LoadModels']
 
 import inspect
+import importlib
 from typing import List, Type
 
 from AioSpider import tools
@@ -26,7 +27,8 @@ class LoadModels:
         """加载所有非抽象类的模型"""
 
         try:
-            models_module = __import__(self.spider.__module__)
+            # 爬虫位于包中时 __import__ 只返回顶层包，需要按完整模块名导入
+            models_module = importlib.import_module(self.spider.__module__)
         except Exception:
             models_module = __import__('models')
 
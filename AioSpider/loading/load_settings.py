@@ -1,6 +1,10 @@
 __all__ = ['LoadSettings']
 
+import copy
+import types
+
 from AioSpider import GlobalConstant
+from AioSpider import settings as system_settings
 from AioSpider.exceptions import SystemConfigError
 
 
@@ -62,9 +66,35 @@ class LoadSettings:
     def cover_gts(self, sts):
         """覆盖系统配置"""
 
-        gts = GlobalConstant().settings
-        self.merge_config_attrs(sts, gts)
-        return gts
+        # 合并到系统配置模块本身，GlobalConstant().settings 可能是其他爬虫的配置副本
+        self.merge_config_attrs(sts, system_settings)
+        return system_settings
+
+    def copy_config(self, value, modules):
+        """深拷贝配置项，配置类（包括嵌套的配置类）逐个复制为新类，其余无法拷贝的值（模块等）直接引用"""
+
+        if isinstance(value, type) and value.__module__ in modules:
+            return type(value.__name__, (), {
+                k: self.copy_config(v, modules) for k, v in vars(value).items()
+                if k not in ('__dict__', '__weakref__')
+            })
+
+        try:
+            return copy.deepcopy(value)
+        except (TypeError, copy.Error):
+            return value
+
+    def copy_settings(self, sts):
+        """复制配置，每个爬虫在自己的副本上合并爬虫配置，同一进程中运行的多个爬虫互不影响"""
+
+        settings = types.ModuleType(sts.__name__, sts.__doc__)
+        modules = {sts.__name__, 'settings'}
+
+        for k, v in vars(sts).items():
+            if not k.startswith('__'):
+                setattr(settings, k, self.copy_config(v, modules))
+
+        return settings
 
     def cover_sts(self, spider, gts):
         """覆盖项目配置"""
@@ -98,7 +128,7 @@ class LoadSettings:
 
         # 爬虫配置优先级：爬虫settings > 项目settings > 系统settings
         sts = self.cover_gts(sts)
-        sts = self.cover_sts(spider, sts)
+        sts = self.cover_sts(spider, self.copy_settings(sts))
 
         if not hasattr(sts.SystemConfig, 'AioSpiderPath'):
             raise Exception('settings.SystemConfig 中未配置 AioSpiderPath 工作路径')
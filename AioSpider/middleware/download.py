@@ -1,4 +1,5 @@
 import json
+import time
 import random
 import asyncio
 from pathlib import Path
@@ -6,6 +7,7 @@ from abc import ABCMeta, abstractmethod
 from asyncio import exceptions
 from urllib.parse import urlparse
 from urllib.request import getproxies
+from email.utils import parsedate_to_datetime
 from typing import Union, Dict
 from functools import reduce
 
@@ -20,7 +22,7 @@ from AioSpider import GlobalConstant, logger
 from AioSpider.http import Response
 from AioSpider.http.base import BaseRequest
 from AioSpider.models import ProxyPoolModel
-from AioSpider.constants import ProxyType, ProxyPoolStrategy, ProxyVerifySource
+from AioSpider.constants import ProxyType, ProxyPoolStrategy, ProxyVerifySource, Stage
 
 
 user_agent = json.load((Path(__file__).parent / "user-agent.json").open())
@@ -232,12 +234,38 @@ class RetryMiddleware(DownloadMiddleware):
         if response.status not in self.settings.SpiderRequestConfig.RETRY_STATUS:
             return False
 
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            # failure队列据此推迟重试时间
+            response.request.meta['retry_after'] = retry_after
+
         return response.request
 
+    @staticmethod
+    def retry_after(response: Response):
+        """解析 Retry-After 响应头，支持秒数和 HTTP 日期两种格式，返回需要等待的秒数"""
+
+        value = next((v for k, v in response.headers.items() if k.lower() == 'retry-after'), None)
+        if not value:
+            return None
+
+        value = str(value).strip()
+        if value.isdigit():
+            return float(value)
+
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+
+        return max(date.timestamp() - time.time(), 0)
+
 
 class LastMiddleware(DownloadMiddleware):
     """最后执行的中间件"""
 
+    stage = Stage.decode                # 耗时统计时归入响应解码阶段
+
     def __init__(self, *args, **kwargs):
         super(LastMiddleware, self).__init__(*args, **kwargs)
         self.encoding_map = {}
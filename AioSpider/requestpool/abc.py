@@ -1,6 +1,8 @@
 __all__ = ['RequestBaseABC']
 
 from abc import abstractmethod
+from typing import List
+
 from AioSpider.http.base import BaseRequest
 
 
@@ -10,6 +12,11 @@ class RequestBaseABC:
     async def put_request(self, request: BaseRequest):
         pass
 
+    async def put_requests(self, requests: List[BaseRequest]):
+        """批量添加请求，默认逐个添加"""
+        for request in requests:
+            await self.put_request(request)
+
     @abstractmethod
     async def get_requests(self):
         pass
@@ -25,3 +32,14 @@ class RequestBaseABC:
     @abstractmethod
     def request_size(self):
         pass
+
+    def ack(self, request: BaseRequest):
+        """请求已完成，共享队列借此删除请求的租约"""
+        pass
+
+    def ready_delay(self) -> float:
+        """距离下一个请求可以出队的秒数"""
+        return 0
+
+    async def close(self):
+        pass
@@ -0,0 +1,197 @@
+__all__ = ['RequestCheckpoint']
+
+import os
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Set
+
+from AioSpider import logger, tools
+from AioSpider.http.base import BaseRequest
+
+
+class CheckpointState:
+    """从断点文件中恢复出的请求池状态"""
+
+    def __init__(self):
+        # {hash: request_dict} 添加到 waiting 队列且尚未完成的请求，包括崩溃时处于 pending 队列中的请求
+        self.frontier: Dict[str, dict] = {}
+        # {hash: [request_dict, times]} 失败待重试的请求及失败次数
+        self.failure: Dict[str, list] = {}
+        self.success: Set[str] = set()
+        self.dropped: Set[str] = set()
+        self.seeds = 0
+        self.seeds_done = False
+
+    def apply(self, record: list):
+
+        op = record[0]
+
+        if op == 'put':
+            _, h, request = record
+            if h not in self.success and h not in self.dropped:
+                self.frontier[h] = request
+        elif op == 'ok':
+            self.success.add(record[1])
+            self.frontier.pop(record[1], None)
+            self.failure.pop(record[1], None)
+        elif op == 'fail':
+            _, h, request, times = record
+            self.frontier.pop(h, None)
+            self.failure[h] = [request, times]
+        elif op == 'drop':
+            self.dropped.add(record[1])
+            self.frontier.pop(record[1], None)
+            self.failure.pop(record[1], None)
+        elif op == 'seed':
+            self.seeds = record[1]
+        elif op == 'seed_end':
+            self.seeds_done = True
+
+    def records(self):
+        """将状态压缩为最少的记录"""
+
+        yield ['seed', self.seeds]
+        if self.seeds_done:
+            yield ['seed_end']
+        for h in self.success:
+            yield ['ok', h]
+        for h in self.dropped:
+            yield ['drop', h]
+        for h, (request, times) in self.failure.items():
+            yield ['fail', h, request, times]
+        for h, request in self.frontier.items():
+            yield ['put', h, request]
+
+    @property
+    def waiting_requests(self) -> List[BaseRequest]:
+        return [BaseRequest.from_dict(i) for i in self.frontier.values()]
+
+    @property
+    def failure_requests(self) -> Dict[BaseRequest, int]:
+        return {BaseRequest.from_dict(request): times for request, times in self.failure.values()}
+
+
+class RequestCheckpoint:
+    """
+    请求池断点，将 waiting、pending、failure、done 四个队列的变更追加写入本地文件，
+    异常退出后重启时根据断点文件重建队列，不需要重新枚举 start_requests
+    Args:
+        path: 断点文件路径
+        interval: 刷盘间隔，单位秒
+    """
+
+    def __init__(self, path: Path, interval: float = 5):
+        self.path = Path(path)
+        self.interval = interval
+        self.seeds = 0
+        self.seeds_done = False
+        # 是否从断点恢复，恢复后第一次运行需要跳过已取出的种子请求
+        self.resumed = False
+        self._buffer = []
+        self._file = None
+        self._last_flush = time.time()
+
+    def put(self, request: BaseRequest):
+        self._write(['put', request.hash, request.to_dict()])
+
+    def success(self, request: BaseRequest):
+        self._write(['ok', request.hash])
+
+    def failure(self, request: BaseRequest, times: int):
+        self._write(['fail', request.hash, request.to_dict(), times])
+
+    def drop(self, request: BaseRequest):
+        self._write(['drop', request.hash])
+
+    def seed(self, count: int):
+        """记录已从 start_requests 中取出并写入 waiting 队列的种子请求数量"""
+        self.seeds += count
+        self._write(['seed', self.seeds])
+
+    def seed_end(self):
+        if not self.seeds_done:
+            self.seeds_done = True
+            self._write(['seed_end'])
+
+    def _write(self, record: list):
+
+        self._buffer.append(tools.dump_json(record, separators=(',', ':'), ensure_ascii=False))
+
+        if time.time() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+
+        self._last_flush = time.time()
+
+        if not self._buffer:
+            return
+
+        if self._file is None:
+            tools.mkdir(self.path.parent)
+            self._file = self.path.open('a', encoding='utf-8')
+
+        self._file.write('\n'.join(self._buffer) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._buffer.clear()
+
+    def load(self) -> CheckpointState:
+        """读取断点文件并压缩重写，断点文件不存在时返回None"""
+
+        if not self.path.exists():
+            return None
+
+        state = CheckpointState()
+
+        with self.path.open('r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 崩溃时最后一行可能只写了一半
+                    continue
+                state.apply(record)
+
+        self._compact(state)
+
+        self.seeds = state.seeds
+        self.seeds_done = state.seeds_done
+        self.resumed = True
+
+        logger.info(
+            f'已从断点文件恢复请求池：waiting {len(state.frontier)} 个，failure {len(state.failure)} 个，'
+            f'done {len(state.success) + len(state.dropped)} 个，已取出种子请求 {state.seeds} 个 ---> {self.path}'
+        )
+
+        return state
+
+    def _compact(self, state: CheckpointState):
+        """将当前状态写入临时文件后原子替换断点文件，避免断点文件无限增长"""
+
+        tmp_path = self.path.with_suffix('.tmp')
+
+        with tmp_path.open('w', encoding='utf-8') as f:
+            for record in state.records():
+                f.write(tools.dump_json(record, separators=(',', ':'), ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, self.path)
+
+    def close(self, finished: bool = False):
+        """
+        关闭断点文件
+        Args:
+            finished: 爬取是否正常结束，正常结束时删除断点文件
+        """
+
+        self.flush()
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        if finished and self.path.exists():
+            self.path.unlink()
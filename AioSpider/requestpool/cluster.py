@@ -0,0 +1,95 @@
+__all__ = ['ClusterNode']
+
+import time
+from typing import Iterable, List, Tuple
+
+from AioSpider.requestpool import scripts
+from AioSpider.requestpool.done import RequestRedisDB
+from AioSpider.requestpool.waiting import WaitingRedisRequest
+
+
+class ClusterNode:
+    """
+    多节点协调，同一个爬虫的多个节点共享 redis waiting 队列和完成队列。
+    节点启动时注册并定期发送心跳，心跳同时续约本节点仍持有的请求（下载中或等待重试），
+    心跳超时的节点视为已退出，其持有的请求由存活的节点放回队列；
+    所有存活节点都空闲且队列中没有请求时采集结束，最后一个退出的节点清理协调用的 key
+    Args:
+        waiting: redis waiting队列
+        done: redis 完成队列
+        timeout: 节点心跳超时时间，单位秒，同时作为请求的租约时长
+        interval: 心跳间隔，单位秒
+        keep_done: 采集结束后是否保留完成队列，用于下次运行时过滤已完成的请求
+    """
+
+    # 本节点空闲时查询其他节点状态的间隔，单位秒
+    poll_interval = 0.5
+
+    def __init__(
+            self, waiting: WaitingRedisRequest, done: RequestRedisDB = None, timeout: float = 30,
+            interval: float = 5, keep_done: bool = False
+    ):
+        self.waiting = waiting
+        self.done = done
+        self.timeout = timeout
+        self.interval = interval
+        self.keep_done = keep_done
+
+        conn = waiting.conn
+        self._heartbeat = conn.register_script(scripts.HEARTBEAT_SCRIPT)
+        self._finished = conn.register_script(scripts.FINISHED_SCRIPT)
+        self._unregister = conn.register_script(scripts.UNREGISTER_SCRIPT)
+
+    @property
+    def node(self) -> str:
+        return self.waiting.node
+
+    @property
+    def prefix(self) -> str:
+        return self.waiting.prefix
+
+    async def register(self):
+        """注册节点，新节点视为忙碌"""
+
+        pipe = self.waiting.conn.pipeline()
+        pipe.zadd(self.prefix + 'nodes', {self.node: time.time()})
+        pipe.srem(self.prefix + 'idle', self.node)
+        await pipe.execute()
+
+    async def heartbeat(self, held: Iterable[str] = ()) -> List[Tuple[str, int]]:
+        """
+        发送心跳
+        Args:
+            held: 本节点仍持有的请求指纹，这些请求的租约会被续约，其余租约到期后放回队列
+        Return:
+            本次回收的超时节点及其被放回队列的请求数量
+        """
+
+        now = time.time()
+        reaped = await self._heartbeat(
+            args=[self.prefix, self.node, now, self.waiting.lease_deadline(now), self.timeout, *held]
+        )
+
+        return [(reaped[i], int(reaped[i + 1])) for i in range(0, len(reaped), 2)]
+
+    async def finished(self) -> bool:
+        """标记本节点空闲，返回所有节点是否都已空闲且队列为空"""
+
+        await self.waiting.flush_acks()
+        return bool(await self._finished(args=[self.prefix, self.node, time.time(), self.timeout]))
+
+    async def nodes(self) -> List[str]:
+        """存活的节点"""
+        return await self.waiting.conn.order_set.zrange(self.prefix + 'nodes', 0, -1)
+
+    async def unregister(self) -> int:
+        """
+        注销节点，本节点仍持有的请求放回队列
+        Return:
+            剩余的节点数量
+        """
+
+        await self.waiting.flush_acks()
+
+        keys = [] if self.keep_done or self.done is None else self.done.keys
+        return await self._unregister(args=[self.prefix, self.node, time.time(), *keys])
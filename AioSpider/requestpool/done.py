@@ -2,11 +2,15 @@ __all__ = ['RequestDB']
 
 import time
 import pickle
+import asyncio
 from pathlib import Path
 
 from AioSpider import tools
-from AioSpider.filter import BloomFilter
+from AioSpider.constants import BackendEngine
+from AioSpider.filter import ScalableCuckooFilter
 from AioSpider.http.base import BaseRequest
+from AioSpider.requestpool.index import RequestIndex
+from AioSpider.requestpool.snapshot import SnapshotStore
 
 
 class RequestBaseDB:
@@ -40,49 +44,83 @@ class RequestBaseDB:
     async def set_failure(self, request: BaseRequest):
         pass
 
+    async def load_hashes(self, success=(), failure=()):
+        pass
 
-class RequestQueueDB(RequestBaseDB):
-
-    def __init__(self):
-        super(RequestQueueDB, self).__init__()
-        self._filter = None
-        self.filter_max_count = 10000
-        self.y = 0
-
-    @property
-    def filter(self):
+    async def done_hashes(self, hashes) -> set:
+        return set()
 
-        if self._filter is None:
-            self._filter = [BloomFilter(capacity=self.filter_max_count)]
+    async def close(self):
+        pass
 
-        if self.success_count // self.filter_max_count != self.y:
-            self._filter.append(BloomFilter(capacity=self.filter_max_count))
-            self.y += 1
 
-        return self._filter[self.y]
+class RequestQueueDB(RequestBaseDB):
+    """
+    内存完成队列，成功和失败的请求指纹分别记录在两个布谷鸟过滤器中，内存占用由容量决定，失败状态可以删除。
+    success_hash 只缓存尚未写入快照的成功指纹，不开启请求缓存时不保存
+    Args:
+        capacity: 每个过滤器的容量，超出后按倍数扩容
+        error_rate: 过滤器误判率
+        buffered: 是否缓存成功指纹用于写入快照
+    """
+
+    def __init__(self, capacity: int = 1000000, error_rate: float = 0.001, buffered: bool = True):
+        super(RequestQueueDB, self).__init__()
+        self.filter_max_count = 10000
+        self.buffered = buffered
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.filter = self._new_filter()
+        self.failure_filter = self._new_filter()
+        # 正在写入快照的成功过滤器，写入完成前继续参与查询
+        self._dumping = []
+        # 历史运行和本次运行写入磁盘的完成指纹快照
+        self.store = None
+
+    def _new_filter(self) -> ScalableCuckooFilter:
+        # 请求指纹是 md5 十六进制字符串，直接作为摘要
+        return ScalableCuckooFilter(initial_capacity=self.capacity, error_rate=self.error_rate, prehashed=True)
+
+    def _store(self, path: Path) -> SnapshotStore:
+        if self.store is None:
+            self.store = SnapshotStore(path)
+        return self.store
 
     async def set_success(self, request: BaseRequest):
-        self.success_hash.add(request.hash)
-        self.filter.add(request.hash)
+        if self.buffered:
+            self.success_hash.add(request.hash)
+        # 成功指纹不会删除，已存在时不再插入，避免重复采集的请求（dnt_filter）在同一对桶中堆积指纹
+        if request.hash not in self.filter:
+            self.filter.add(request.hash)
         self.success_count += 1
 
     async def set_failure(self, request: BaseRequest):
-        self.failure_hash.add(request.hash)
+        # 失败指纹可能被删除，每次都插入，与 remove_failure 一一对应
+        self.failure_filter.add(request.hash)
         self.failure_count += 1
 
+    async def load_hashes(self, success=(), failure=()):
+        if self.buffered:
+            self.success_hash.update(success)
+        self.filter.add_many(success)
+        self.success_count += len(success)
+        if failure:
+            self.failure_filter.add_many(failure)
+            self.failure_count += len(failure)
+
     async def clear_success(self):
-        self._filter = None
-        self.y = 0
+        self.filter.clear()
         self.success_count = 0
         self.success_hash.clear()
 
     async def clear_failure(self):
         self.failure_count = 0
-        self.failure_hash.clear()
+        self.failure_filter.clear()
 
     async def remove_failure(self, request: BaseRequest):
-        if request.hash in self.failure_hash:
-            self.failure_hash.discard(request.hash)
+        # 每个成功的请求都会调用。已失败完成的请求只有不过滤（dnt_filter）时才会被再次采集，
+        # 其余请求不可能有失败记录，不删除，避免删掉与它指纹冲突的其他请求
+        if request.dnt_filter and self.failure_count and self.failure_filter.remove(request.hash):
             self.failure_count -= 1
 
     async def has_request(self, request: BaseRequest):
@@ -90,54 +128,91 @@ class RequestQueueDB(RequestBaseDB):
         if request.dnt_filter:
             return False
 
-        return request.hash in self.filter or request.hash in self.failure_hash
+        return bool(await self.done_hashes([request.hash]))
+
+    async def done_hashes(self, hashes) -> set:
+        """返回已完成的请求指纹，先批量查询成功、失败过滤器，其余指纹再查询快照"""
+
+        hashes = hashes if isinstance(hashes, list) else list(hashes)
+        if not hashes:
+            return set()
+
+        found = self.filter.contains_many(hashes) | self.failure_filter.contains_many(hashes)
+        for dumping in self._dumping:
+            found |= dumping.contains_many(hashes)
+        done = {h for h, hit in zip(hashes, found.tolist()) if hit}
+
+        if self.store:
+            done |= self.store.done_hashes([h for h, hit in zip(hashes, found.tolist()) if not hit])
+
+        return done
 
     async def request_size(self):
         return self.success_count + self.failure_count
 
     async def load_requests(self, path: Path = None, status='success'):
+        """打开未过期的快照，只读取文件头，查询时按需从磁盘换页"""
 
         if not path or not path.exists():
             return False
 
-        file_list = path.iterdir()
-        expire_list = [tools.type_converter(i.stem.split('_')[-1], to=int, force=True) for i in file_list]
-        expire = tools.max(expire_list)
-
-        if expire < time.time():
-            return
-
-        file_path = path / f'{expire}.aio'
-        if not file_path.exists():
-            return
-
-        with file_path.open('rb') as f:
-            txt = f.read().decode()
-
-        for request in txt.split('\n'):
-            self.success_hash.add(request)
+        return bool(self._store(path).load())
 
     async def dump_requests(self, path: Path, expire: int, strict=True):
 
         if strict and len(self.success_hash) < self.filter_max_count:
             return False
 
-        file_path = path / f'{expire}.aio'
-
-        txt = '\n'.join(self.success_hash)
-        await self.clear_success()
+        if not self.success_hash:
+            return False
 
-        with open(file_path, 'ab') as f:
-            f.write(txt.encode())
+        # 换用新的过滤器记录之后的成功指纹，旧的过滤器在快照写入并发布之前继续参与查询，
+        # 否则写入期间这些指纹既不在过滤器中也不在快照中，重新发现的请求会被再次采集
+        hashes, dumping = list(self.success_hash), self.filter
+        self.filter = self._new_filter()
+        self.success_hash = set()
+        self.success_count = 0
+        self._dumping.append(dumping)
+
+        try:
+            # 排序、写入和合并快照在后台线程中进行，被合并掉的快照回到事件循环中再关闭
+            store = self._store(path)
+            stale = await asyncio.get_running_loop().run_in_executor(None, store.add, hashes, expire)
+            store.discard(stale)
+        except Exception:
+            # 写入失败时指纹放回当前过滤器，下次再写入
+            self.success_hash.update(hashes)
+            self.filter.add_many(hashes)
+            self.success_count += len(hashes)
+            raise
+        finally:
+            self._dumping.remove(dumping)
 
         return True
 
+    async def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
 
-class RequestRedisDB(RequestBaseDB):
 
-    def __init__(self, connector):
+class RequestRedisDB(RequestBaseDB):
+    """
+    redis 完成队列，成功和失败的请求指纹保存在两个集合中，由共享同一个队列的节点共用
+    Args:
+        connector: 数据库连接
+        name: key 前缀，与 waiting 队列使用相同的名称
+    """
+
+    def __init__(self, connector, name: str = 'AioSpider'):
         super().__init__()
         self.conn = connector['redis']['DEFAULT']
+        self.success_status = f'aiospider:{name}:success'
+        self.failure_status = f'aiospider:{name}:failure'
+
+    @property
+    def keys(self):
+        return [self.success_status, self.failure_status]
 
     async def set_success(self, request: BaseRequest):
         await self.conn.set.sadd(self.success_status, request.hash)
@@ -149,24 +224,50 @@ class RequestRedisDB(RequestBaseDB):
         self.failure_hash.add(request.hash)
         self.failure_count += 1
 
+    async def load_hashes(self, success=(), failure=()):
+
+        pipe = self.conn.pipeline()
+        if success:
+            pipe.sadd(self.success_status, *success)
+        if failure:
+            pipe.sadd(self.failure_status, *failure)
+        await pipe.execute()
+
+        self.success_hash.update(success)
+        self.failure_hash.update(failure)
+        self.success_count += len(success)
+        self.failure_count += len(failure)
+
     async def clear_success(self):
-        await self.conn.set.sadd(self.failure_status)
+        # redis 中的集合由其他节点共用，只清空本地缓存
         self.success_hash.clear()
 
+    async def clear_failure(self):
+        self.failure_hash.clear()
+
     async def remove_failure(self, request: BaseRequest):
         await self.conn.set.srem(self.failure_status, request.hash)
         self.failure_hash.discard(request.hash)
 
     async def has_request(self, request: BaseRequest):
+        return bool(await self.done_hashes([request.hash]))
 
-        if request.hash in self.success_hash or request.hash in self.failure_hash:
-            return True
-        elif await self.conn.set.sismember(self.success_status, request.hash):
-            return True
-        elif await self.conn.set.sismember(self.failure_status, request.hash):
-            return True
-        else:
-            return False
+    async def done_hashes(self, hashes) -> set:
+        """返回已完成的请求指纹，本地缓存中没有的指纹通过一个管道批量查询"""
+
+        done = {h for h in hashes if h in self.success_hash or h in self.failure_hash}
+        rest = [h for h in hashes if h not in done]
+
+        if not rest:
+            return done
+
+        pipe = self.conn.pipeline()
+        for h in rest:
+            pipe.sismember(self.success_status, h)
+            pipe.sismember(self.failure_status, h)
+        result = await pipe.execute()
+
+        return done | {h for i, h in enumerate(rest) if result[2 * i] or result[2 * i + 1]}
 
     async def request_size(self):
         return self.success_count + self.failure_count
@@ -219,21 +320,27 @@ class RequestRedisDB(RequestBaseDB):
 
 class RequestDB:
 
-    def __init__(self, spider, settings, connector):
+    def __init__(self, spider, settings, connector, index: RequestIndex = None):
 
         self.name = 'done'
         self.spider = spider
         self.settings = settings
+        self.index = index if index is not None else RequestIndex()
 
         self._expire = None
         self._cache_path = None
         backend = settings.SystemConfig.BackendCacheEngine
 
-        if backend == 'queue':
-            self.done = RequestQueueDB()
+        if backend in (BackendEngine.queue, BackendEngine.disk):
+            cache_settings = settings.RequestFilterConfig
+            self.done = RequestQueueDB(
+                capacity=getattr(cache_settings, 'FilterCapacity', 1000000),
+                error_rate=getattr(cache_settings, 'FilterErrorRate', 0.001),
+                buffered=bool(cache_settings.Enabled)
+            )
 
         if backend == 'redis':
-            self.done = RequestRedisDB(connector)
+            self.done = RequestRedisDB(connector, spider.name)
 
     @property
     def expire(self):
@@ -272,16 +379,28 @@ class RequestDB:
     async def has_request(self, request):
         return await self.done.has_request(request=request)
 
+    async def done_hashes(self, hashes) -> set:
+        """批量查询已完成的请求指纹，完成状态不在索引中，由完成队列记录"""
+        return await self.done.done_hashes(hashes)
+
     async def set_success(self, request):
         await self.dump_requests()
         await self.done.set_success(request)
+        self.index.remove(request)
+        self.index.clear_failure(request)
 
     async def set_failure(self, request):
         await self.done.set_failure(request)
+        self.index.remove(request)
+        self.index.clear_failure(request)
 
     async def remove_failure(self, request):
         return await self.done.remove_failure(request)
 
+    async def load_hashes(self, success=(), failure=()):
+        """批量恢复已完成请求的哈希，用于断点续爬"""
+        await self.done.load_hashes(success=success, failure=failure)
+
     async def request_size(self):
         return await self.done.request_size()
 
@@ -305,3 +424,4 @@ class RequestDB:
     async def close(self):
         await self.done.clear_success()
         await self.done.clear_failure()
+        await self.done.close()
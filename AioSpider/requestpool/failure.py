@@ -1,50 +1,161 @@
 __all__ = ['FailureRequest']
 
+import time
+import heapq
+import random
+import itertools
 from collections import defaultdict
-from typing import Dict
+from typing import Dict, List, Tuple
 
 from AioSpider import logger
+from AioSpider.constants import RequestState
 from AioSpider.http.base import BaseRequest
 from AioSpider.requestpool.abc import RequestBaseABC
+from AioSpider.requestpool.index import RequestIndex
+from AioSpider.requestpool.limiter import DomainLimiter
 
 
 class FailureRequest(RequestBaseABC):
+    """
+    失败待重试的请求，每个请求带有最早重试时间，按时间排序的堆中只释放已到期的请求。
+    第 n 次失败后等待 RETRY_BACKOFF * 2 ** (n - 1) 秒并按 RETRY_JITTER 随机缩短，
+    服务端通过 Retry-After 指定的等待时间更长时以 Retry-After 为准，最长不超过 RETRY_BACKOFF_MAX。
+    指定 limiter 时，到期的请求同样需要获取域名的令牌和并发数，不足时推迟到令牌可用或该域名有请求完成后
+    Args:
+        settings: 爬虫配置
+        index: 请求状态索引
+        limiter: 域名限速器
+    """
 
-    def __init__(self, settings):
+    def __init__(self, settings, index: RequestIndex = None, limiter: DomainLimiter = None):
         self.name = 'failure'
-        # {request: times} 记录失败的URL的次数
-        self.failure: Dict[BaseRequest: int] = defaultdict(int)
-        self.max_failure_times = settings.SpiderRequestConfig.MAX_RETRY_TIMES
+        self.index = index if index is not None else RequestIndex()
+        # {hash: request} 失败待重试的请求，失败次数记录在索引中，重试期间不会丢失
+        self.failure: Dict[str, BaseRequest] = {}
+        # {hash: 最早重试时间}
+        self.not_before: Dict[str, float] = {}
+        # [(最早重试时间, 序号, hash)]，请求被移除或重新加入后堆中的旧记录在出堆时跳过
+        self._due: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self.limiter = limiter
+        # {host: 因并发数已满而挂起的请求指纹}，该域名有请求完成后重新到期
+        self._blocked = defaultdict(list)
+
+        if limiter is not None:
+            limiter.listeners.append(self._unblock)
+
+        config = settings.SpiderRequestConfig
+        self.max_failure_times = config.MAX_RETRY_TIMES
+        self.backoff = getattr(config, 'RETRY_BACKOFF', 0) or 0
+        self.backoff_max = getattr(config, 'RETRY_BACKOFF_MAX', 300)
+        self.jitter = getattr(config, 'RETRY_JITTER', 0) or 0
+
+    def retry_delay(self, times: int, retry_after: float = None) -> float:
+        """
+        第 times 次失败后的等待时间
+        Args:
+            times: 失败次数
+            retry_after: 服务端通过 Retry-After 指定的等待时间
+        """
+
+        delay = self.backoff * 2 ** (times - 1) if self.backoff else 0
+        delay *= 1 - random.uniform(0, self.jitter)
+
+        if retry_after:
+            delay = max(delay, retry_after)
+
+        return min(delay, self.backoff_max)
+
+    def _unblock(self, host: str):
+        hashes = self._blocked.pop(host, None)
+        if not hashes:
+            return
+        now = time.time()
+        for h in hashes:
+            if h in self.failure:
+                self._schedule(self.failure[h], now)
+
+    def _schedule(self, request: BaseRequest, not_before: float):
+        self.failure[request.hash] = request
+        self.not_before[request.hash] = not_before
+        heapq.heappush(self._due, (not_before, next(self._seq), request.hash))
 
     async def put_request(self, request: BaseRequest):
         """将请求添加到队列"""
 
-        if self.failure.get(request, 0) >= self.max_failure_times:
+        retry_after = request.meta.pop('retry_after', None)
+
+        if self.index.failure_times(request) >= self.max_failure_times:
             logger.warning(f'{request}失败次数超限，系统将其自动丢弃处理！')
             return False
 
-        self.failure[request] = self.failure.get(request, 0) + 1
+        self.index.add_failure(request)
+        self.index.set(request, RequestState.failure)
+        self._schedule(request, time.time() + self.retry_delay(self.index.failure_times(request), retry_after))
         return True
 
+    def restore(self, request: BaseRequest, times: int):
+        """从断点恢复失败请求及其失败次数，恢复后立即可以重试"""
+
+        self.index.set_failure_times(request, times)
+        self.index.set(request, RequestState.failure)
+        self._schedule(request, time.time())
+
     async def remove_request(self, request: BaseRequest):
         """将请求移除队列"""
-        self.failure.pop(request)
+
+        self.failure.pop(request.hash, None)
+        self.not_before.pop(request.hash, None)
+        self.index.clear_failure(request)
+        self.index.discard(request, RequestState.failure)
+
+    def _pop_stale(self):
+        """弹出堆顶已失效的记录"""
+        while self._due and self.not_before.get(self._due[0][2]) != self._due[0][0]:
+            heapq.heappop(self._due)
 
     async def get_requests(self, count):
-        """从队列中获取一个请求"""
-        
-        count = count if count <= self.request_size() else self.request_size()
-        if not self.failure:
-            return
+        """按最早重试时间依次取出已到期的请求"""
+
+        now = time.time()
+        obtained = 0
+
+        while obtained < count:
+            self._pop_stale()
+            if not self._due or self._due[0][0] > now:
+                break
+            _, _, h = heapq.heappop(self._due)
+            request = self.failure[h]
+
+            if self.limiter is not None:
+                wait = self.limiter.acquire(request, now)
+                if wait == float('inf'):
+                    del self.not_before[h]
+                    self._blocked[request.domain].append(h)
+                    continue
+                if wait > 0:
+                    self._schedule(request, now + wait)
+                    continue
+
+            del self.not_before[h]
+            obtained += 1
+            yield self.failure.pop(h)
+
+    def ready_delay(self) -> float:
+        """距离下一个请求到期的秒数，没有请求时返回0"""
+
+        self._pop_stale()
+
+        if not self._due:
+            return 0
 
-        for _ in range(count):
-            yield self.failure.popitem()[0]
+        return max(self._due[0][0] - time.time(), 0)
 
     async def has_request(self, request: BaseRequest):
-        return True if request in self.failure else False
+        return request.hash in self.failure
 
     def request_size(self):
         return self.failure.__len__()
 
     def get_failure_times(self, request: BaseRequest):
-        return self.failure.get(request, 0)
+        return self.index.failure_times(request)
@@ -0,0 +1,54 @@
+__all__ = ['RequestIndex']
+
+from typing import Dict, Optional
+
+from AioSpider.constants import RequestState
+from AioSpider.http.base import BaseRequest
+
+
+class RequestIndex:
+    """
+    请求状态索引，waiting、pending、failure 三个队列共用，请求入队或出队时更新状态。
+    已完成的请求不在索引中，由完成队列记录（过滤器、快照或 redis），索引大小只与正在处理的请求数量有关
+    """
+
+    def __init__(self):
+        # {hash: RequestState}
+        self.states: Dict[str, str] = {}
+        # {hash: 失败次数}，请求重试期间保留，成功后清除
+        self.failures: Dict[str, int] = {}
+
+    def get(self, request: BaseRequest) -> Optional[str]:
+        return self.states.get(request.hash)
+
+    def set(self, request: BaseRequest, state: str):
+        self.states[request.hash] = state
+
+    def remove(self, request: BaseRequest):
+        self.states.pop(request.hash, None)
+
+    def discard(self, request: BaseRequest, state: str):
+        """请求处于 state 状态时删除，已转移到其他状态时保留"""
+        if self.states.get(request.hash) == state:
+            del self.states[request.hash]
+
+    def add_failure(self, request: BaseRequest) -> int:
+        times = self.failures.get(request.hash, 0) + 1
+        self.failures[request.hash] = times
+        return times
+
+    def failure_times(self, request: BaseRequest) -> int:
+        return self.failures.get(request.hash, 0)
+
+    def set_failure_times(self, request: BaseRequest, times: int):
+        self.failures[request.hash] = times
+
+    def clear_failure(self, request: BaseRequest):
+        self.failures.pop(request.hash, None)
+
+    def clear(self):
+        self.states.clear()
+        self.failures.clear()
+
+    def __len__(self):
+        return len(self.states)
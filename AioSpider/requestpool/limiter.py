@@ -0,0 +1,149 @@
+__all__ = ['TokenBucket', 'DomainLimiter']
+
+import time
+from typing import Callable, Dict, List, Set, Tuple, Union
+
+from AioSpider.http.base import BaseRequest
+
+
+class TokenBucket:
+    """
+    令牌桶，每秒生成 rate 个令牌，最多积攒 burst 个
+    Args:
+        rate: 每秒生成的令牌数
+        burst: 令牌桶容量
+    """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'last')
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.last = time.time()
+
+    def _refill(self, now: float):
+        # 调用方传入的时间可能早于令牌桶的创建时间，不回退
+        if now > self.last:
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+
+    def wait_time(self, now: float) -> float:
+        """距离下一个令牌可用的秒数"""
+
+        self._refill(now)
+
+        if self.tokens >= 1:
+            return 0
+
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+
+class DomainLimiter:
+    """
+    按域名限速，QPS 由令牌桶控制，并发数按正在下载的请求数量控制。
+    请求的 qps、concurrency 参数只作用于该请求，不改变所属域名的限速：
+    带 qps 的请求使用该域名下按 qps 单独建立的令牌桶，带 concurrency 的请求在该域名正在下载的请求数小于该值时才出队
+    Args:
+        qps: 默认每个域名每秒最大请求数，None 表示不限制
+        concurrency: 默认每个域名最大并发数，None 表示不限制
+        limits: 指定域名的限速，{domain: {'qps': 1, 'concurrency': 2, 'burst': 1}}
+    """
+
+    def __init__(self, qps: float = None, concurrency: int = None, limits: Dict[str, dict] = None):
+        self.qps = qps
+        self.concurrency = concurrency
+        self.limits: Dict[str, dict] = {k: dict(v) for k, v in (limits or {}).items()}
+        # {domain 或 (domain, 请求的 qps): 令牌桶}
+        self.buckets: Dict[Union[str, Tuple[str, float]], TokenBucket] = {}
+        # {domain: 正在下载的请求指纹}
+        self.active: Dict[str, Set[str]] = {}
+        # 域名的并发数释放后的回调，waiting队列借此重新调度因并发数超限而挂起的域名
+        self.listeners: List[Callable[[str], None]] = []
+
+    @classmethod
+    def from_settings(cls, settings):
+        config = settings.SpiderRequestConfig
+        return cls(
+            qps=getattr(config, 'DOMAIN_QPS', None), concurrency=getattr(config, 'DOMAIN_CONCURRENCY', None),
+            limits=getattr(config, 'DOMAIN_LIMITS', None)
+        )
+
+    def configure(self, domain: str, qps: float = None, concurrency: int = None, burst: float = None):
+        """设置或覆盖指定域名的限速"""
+
+        limit = self.limits.setdefault(domain, {})
+
+        if qps is not None:
+            limit['qps'] = qps
+            self.buckets.pop(domain, None)
+        if burst is not None:
+            limit['burst'] = burst
+            self.buckets.pop(domain, None)
+        if concurrency is not None:
+            limit['concurrency'] = concurrency
+
+    def _bucket(self, domain: str, qps: float = None) -> TokenBucket:
+        """域名的令牌桶，指定 qps 时返回该域名下按请求的 qps 单独建立的令牌桶"""
+
+        key = domain if qps is None else (domain, qps)
+        bucket = self.buckets.get(key)
+        if bucket is not None:
+            return bucket
+
+        limit = self.limits.get(domain, {})
+        if qps is None:
+            qps = limit.get('qps', self.qps)
+        if not qps:
+            return None
+
+        bucket = self.buckets[key] = TokenBucket(qps, limit.get('burst', 1))
+        return bucket
+
+    def acquire(self, request: BaseRequest, now: float = None) -> float:
+        """
+        尝试为请求获取下载许可
+        Return:
+            0 表示获取成功；正数表示需要等待的秒数；inf 表示并发数已满，需要等待其他请求完成
+        """
+
+        domain, meta = request.domain, request.meta
+        concurrency = meta.get('concurrency') or self.limits.get(domain, {}).get('concurrency', self.concurrency)
+        active = self.active.get(domain)
+
+        if concurrency and active is not None and len(active) >= concurrency:
+            return float('inf')
+
+        bucket = self._bucket(domain, meta.get('qps'))
+        if bucket is not None:
+            wait = bucket.wait_time(now or time.time())
+            if wait > 0:
+                return wait
+            bucket.consume()
+
+        # 所有请求都计入正在下载的数量，带 concurrency 参数的请求按域名的实际并发数判断
+        self.active.setdefault(domain, set()).add(request.hash)
+
+        return 0
+
+    @property
+    def enabled(self) -> bool:
+        """是否配置了任何限速"""
+        return bool(self.qps or self.concurrency or self.limits)
+
+    def release(self, request: BaseRequest):
+        """请求下载完成或被回收后释放并发数"""
+
+        active = self.active.get(request.domain)
+        if active is None or request.hash not in active:
+            return
+
+        active.discard(request.hash)
+        if not active:
+            del self.active[request.domain]
+
+        for listener in self.listeners:
+            listener(request.domain)
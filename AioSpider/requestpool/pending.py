@@ -1,40 +1,87 @@
 __all__ = ['PendingRequest']
 
 import time
-from typing import Tuple
+from typing import Dict, List, Tuple
 
+from AioSpider.constants import RequestState
 from AioSpider.http.base import BaseRequest
 from AioSpider.requestpool.abc import RequestBaseABC
+from AioSpider.requestpool.index import RequestIndex
+from AioSpider.requestpool.limiter import DomainLimiter
 
 
 class PendingRequest(RequestBaseABC):
+    """
+    正在下载的请求，按 request.hash 索引，每个请求带有租约截止时间
+    Args:
+        lease: 租约时长，单位秒，请求超过该时间仍未完成视为下载卡死或任务异常退出，None 表示不限制
+        index: 请求状态索引
+        limiter: 域名限速器，请求移出队列时释放域名并发数
+    """
 
-    def __init__(self):
-        # {(request, time.time()), (request, time.time())}
+    def __init__(self, lease: float = None, index: RequestIndex = None, limiter: DomainLimiter = None):
         self.name = 'pending'
-        self.pending: Tuple[BaseRequest, int] = set()
+        self.lease = lease
+        self.index = index if index is not None else RequestIndex()
+        self.limiter = limiter
+        # {hash: (request, 租约截止时间)}，租约时长固定，插入顺序即截止时间顺序
+        self.pending: Dict[str, Tuple[BaseRequest, float]] = {}
 
     async def put_request(self, request: BaseRequest):
         """将请求添加到队列"""
-        self.pending.add((request, time.time()))
+
+        deadline = time.time() + self.lease if self.lease else float('inf')
+        # 先删除再插入，保证字典顺序与截止时间一致
+        self.pending.pop(request.hash, None)
+        self.pending[request.hash] = (request, deadline)
+        self.index.set(request, RequestState.pending)
+
         return request
 
     async def get_request(self):
         """从url池中取url"""
-        return self.pending.pop()[0] if self.pending else None
+
+        if not self.pending:
+            return None
+
+        request = self.pending.popitem()[1][0]
+        self._release(request)
+
+        return request
 
     async def has_request(self, request: BaseRequest):
         """ 判断请求是否存在 """
-        return True if request in [i[0] for i in self.pending] else False
+        return request.hash in self.pending
 
     async def remove_request(self, request: BaseRequest):
         """把request移出队列"""
+        if self.pending.pop(request.hash, None) is not None:
+            self._release(request)
+
+    def _release(self, request: BaseRequest):
+        self.index.discard(request, RequestState.pending)
+        if self.limiter is not None:
+            self.limiter.release(request)
+
+    def pop_expired(self) -> List[BaseRequest]:
+        """移出并返回所有租约已过期的请求"""
+
+        if not self.lease:
+            return []
+
+        now = time.time()
+        expired = []
+
+        for request, deadline in self.pending.values():
+            if deadline > now:
+                break
+            expired.append(request)
+
+        for request in expired:
+            self.pending.pop(request.hash, None)
+            self._release(request)
 
-        for i in self.pending:
-            if request not in i:
-                continue
-            self.pending.remove(i)
-            break
+        return expired
 
     def request_size(self):
         return self.pending.__len__()
@@ -1,26 +1,52 @@
+from pathlib import Path
 from typing import List, Union
 
 from AioSpider import logger
 from AioSpider import constants
+from AioSpider.constants import RequestState
 from AioSpider.exceptions import SystemConfigError
 from AioSpider.http.base import BaseRequest
+from AioSpider.http.codec import callback_registry
 from AioSpider.requestpool.done import RequestDB
+from AioSpider.requestpool.checkpoint import RequestCheckpoint
+from AioSpider.requestpool.cluster import ClusterNode
+from AioSpider.requestpool.index import RequestIndex
+from AioSpider.requestpool.limiter import DomainLimiter
 from AioSpider.requestpool.pending import PendingRequest
 from AioSpider.requestpool.failure import FailureRequest
-from AioSpider.requestpool.waiting import WaitingRequest, WaitingRedisRequest
+from AioSpider.requestpool.waiting import WaitingRequest, WaitingRedisRequest, WaitingDiskRequest
 from AioSpider import pretty_table
 
 
 class RequestPool:
 
-    def __init__(self, spider, settings, connector):
+    def __init__(self, spider, settings, connector, shard=None, checkpoint=True, metrics=None):
 
         self.spider = spider
         self.settings = settings
+        self.shard = shard
+        # 请求按回调编号编码，解码前需要注册爬虫的回调
+        callback_registry.register_spider(type(spider))
+        # waiting、pending、failure 三个队列共用的请求状态索引，done 状态由去重过滤器回答
+        self.index = RequestIndex()
+        # 按域名限速，waiting、failure队列出队前获取令牌和并发数，请求移出pending队列时释放并发数
+        self.limiter = DomainLimiter.from_settings(settings)
         self.waiting = self._init_waiting(connector)
-        self.pending = PendingRequest()
-        self.failure = FailureRequest(settings)
-        self.done = RequestDB(spider, settings, connector)
+        self.pending = PendingRequest(
+            getattr(settings.SpiderRequestConfig, 'PENDING_LEASE_TIMEOUT', None), index=self.index,
+            limiter=self.limiter
+        )
+        # redis 引擎不按域名限速，重试的请求同样不限速
+        self.failure = FailureRequest(
+            settings, index=self.index,
+            limiter=None if isinstance(self.waiting, WaitingRedisRequest) else self.limiter
+        )
+        self.done = RequestDB(spider, settings, connector, index=self.index)
+        self.cluster = self._init_cluster()
+        self.checkpoint = self._init_checkpoint() if checkpoint else None
+        self.metrics = metrics
+        # redis 引擎的请求可能由其他节点取出，入队时间无法在本节点对应，不统计排队耗时
+        self._waiting_metrics = None if isinstance(self.waiting, WaitingRedisRequest) else metrics
         self._last_percent = 0
 
     def _init_waiting(self, connector):
@@ -28,17 +54,73 @@ class RequestPool:
         backend = self.settings.SystemConfig.BackendCacheEngine
 
         if backend == constants.BackendEngine.queue:
-            return WaitingRequest()
+            return WaitingRequest(index=self.index, delay=self._host_delay, limiter=self.limiter)
 
         if backend == constants.BackendEngine.redis:
-            return WaitingRedisRequest(connector)
+            if self.limiter.enabled:
+                # 请求由 Lua 脚本从共享队列中原子地取出并写入租约，取出后无法再按本节点的令牌推迟
+                logger.warning(
+                    'redis 引擎暂不支持按域名限速，DOMAIN_QPS、DOMAIN_CONCURRENCY、DOMAIN_LIMITS 及请求的 qps、concurrency '
+                    '参数不会生效，需要限速时请使用 PER_HOST_DELAY 或 queue、disk 引擎'
+                )
+            # 租约由节点心跳续约，节点超时后其持有的请求放回队列
+            return WaitingRedisRequest(
+                connector, name=self._queue_name, index=self.index, delay=self._host_delay,
+                lease=getattr(self.settings.SystemConfig, 'ClusterNodeTimeout', 30),
+                node=getattr(self.settings.SystemConfig, 'ClusterNodeName', None)
+            )
+
+        if backend == constants.BackendEngine.disk:
+            return WaitingDiskRequest(
+                Path(self.settings.SystemConfig.WaitingSpillPath) / f'{self._queue_name}.db',
+                memory_size=self.settings.SystemConfig.WaitingMemorySize, index=self.index, delay=self._host_delay,
+                limiter=self.limiter
+            )
 
         raise SystemConfigError(flag=2)
 
-    async def close(self):
+    def _init_cluster(self):
+
+        if not isinstance(self.waiting, WaitingRedisRequest):
+            return None
+
+        config = self.settings.SystemConfig
+        return ClusterNode(
+            self.waiting, self.done.done, timeout=getattr(config, 'ClusterNodeTimeout', 30),
+            interval=getattr(config, 'ClusterHeartbeat', 5), keep_done=self.settings.RequestFilterConfig.Enabled
+        )
+
+    def held_hashes(self) -> List[str]:
+        """本节点持有的请求指纹，包括下载中和等待重试的请求"""
+        return [*self.pending.pending.keys(), *self.failure.failure.keys()]
+
+    @property
+    def _queue_name(self):
+        return self.spider.name if self.shard is None else f'{self.spider.name}_{self.shard.index}'
+
+    @property
+    def _host_delay(self):
+        return getattr(self.settings.SpiderRequestConfig, 'PER_HOST_DELAY', 0) or 0
+
+    def _init_checkpoint(self):
+
+        cache_settings = self.settings.RequestFilterConfig
+
+        if not getattr(cache_settings, 'Checkpoint', False):
+            return None
+
+        path = Path(cache_settings.CheckpointPath) / f'{self._queue_name}.ckpt'
+
+        return RequestCheckpoint(path, cache_settings.CheckpointInterval)
+
+    async def close(self, finished: bool = True):
+        # 关闭断点文件，正常结束时删除
+        if self.checkpoint is not None:
+            self.checkpoint.close(finished=finished)
         # 缓存
         await self._dumps_cache()
         # 清空waiting队列
+        await self.waiting.close()
         self.waiting = None
         # 清空pending队列
         self.pending = None
@@ -46,9 +128,29 @@ class RequestPool:
         self.failure = None
         # 清空done队列
         await self.done.close()
+        self.index.clear()
 
     async def loads_cache(self):
         await self.done.load_requests()
+        await self._resume_checkpoint()
+
+    async def _resume_checkpoint(self):
+        """从断点文件重建四个队列，崩溃时处于pending队列中的请求重新放回waiting队列"""
+
+        if self.checkpoint is None:
+            return
+
+        state = self.checkpoint.load()
+        if state is None:
+            return
+
+        await self.done.load_hashes(success=state.success, failure=state.dropped)
+
+        for request in state.waiting_requests:
+            await self.waiting.put_request(request)
+
+        for request, times in state.failure_requests.items():
+            self.failure.restore(request, times)
 
     async def _dumps_cache(self):
         await self.done.dump_requests(strict=False)
@@ -58,8 +160,7 @@ class RequestPool:
         request = response.request
 
         # 从pending队列中删除
-        if await self.pending.has_request(request):
-            await self.pending.remove_request(request)
+        await self.pending.remove_request(request)
 
         await self.update_status(response, request)
         await self.update_progress(request, response)
@@ -70,15 +171,32 @@ class RequestPool:
         """更新状态"""
 
         if response.status == 200:
+            await self.failure.remove_request(request)
             await self.done.set_success(request)
-            if await self.failure.has_request(request):
-                await self.failure.remove_request(request)
-            if await self.done.has_request(request):
-                await self.done.remove_failure(request)
+            self._ack(request)
+            await self.done.remove_failure(request)
+            if self.checkpoint is not None:
+                self.checkpoint.success(request)
         else:
-            r = await self.failure.put_request(request)
-            if not r:
-                await self.done.set_failure(request)
+            await self._put_failure(request)
+
+    async def _put_failure(self, request: BaseRequest):
+        """请求加入failure队列，失败次数超限时标记为失败完成"""
+
+        r = await self.failure.put_request(request)
+        if not r:
+            await self.done.set_failure(request)
+            self._ack(request)
+        if self.checkpoint is not None and r:
+            self.checkpoint.failure(request, self.failure.get_failure_times(request))
+        elif self.checkpoint is not None:
+            self.checkpoint.drop(request)
+
+    def _ack(self, request: BaseRequest):
+        """请求已完成或被丢弃，删除共享队列中的租约和排队耗时记录"""
+        self.waiting.ack(request)
+        if self._waiting_metrics is not None:
+            self._waiting_metrics.discard(request)
 
     async def update_progress(self, request, response):
         """更新进度"""
@@ -117,76 +235,157 @@ class RequestPool:
     async def push_to_waiting(self, request: Union[BaseRequest, List[BaseRequest]]):
         """将request添加到waiting队列"""
 
-        count = await self._push_requests_to_waiting(request)
+        requests = request if isinstance(request, list) else [request]
+        if not requests:
+            return
+
+        count, duplicate, invalid = await self._push_requests_to_waiting(requests)
+
         item = [{
-            '请求名称': request[-1].help if isinstance(request, list) else request.help,
-            '添加数量': count, "待发数量": await self.waiting_size(), "进行数量": self.pending_size(),
+            '请求名称': requests[-1].help, '添加数量': count, '重复数量': duplicate, '无效数量': invalid,
+            "待发数量": await self.waiting_size(), "进行数量": self.pending_size(),
             "失败数量": self.failure_size(), '成功数量': await self.done_size()
         }]
-        logger.debug(f'{count} 个请求添加到 waiting 队列，请求池详情表：\n{pretty_table(item)}')
-
-    async def _push_requests_to_waiting(self, request: Union[BaseRequest, List[BaseRequest]]):
-        """将多个request添加到waiting队列"""
-
-        if not isinstance(request, list):
-            request = [request]
-
-        count = 0
-        for req in request:
-            if await self._is_request_valid_and_unique(req):
-                await self.waiting.put_request(req)
-                count += 1
-
-        return count
-
-    async def _is_request_valid_and_unique(self, request: BaseRequest):
-        """判断请求是否有效且唯一"""
-
-        queue = await self._request_exists_queue(request)
-        if queue:
-            logger.debug(f'request 已存在{queue}队列中 ---> {request}')
-            return False
-
-        if not request.domain or '.' not in request.domain or 'http' not in request.website:
-            logger.debug(f'该request可能存在问题，已自动丢弃 ---> {request}')
-            return False
-
-        return True
-
-    async def _request_exists_queue(self, request: BaseRequest):
-        for queue in [self.waiting, self.pending, self.failure, self.done]:
-            if await queue.has_request(request):
-                return queue.name
-        return None
+        # 整批只输出一条日志，日志级别高于DEBUG时不渲染表格
+        logger.opt(lazy=True).debug(
+            '{} 个请求添加到 waiting 队列，请求池详情表：\n{}', lambda: count, lambda: pretty_table(item)
+        )
+
+    async def _push_requests_to_waiting(self, requests: List[BaseRequest]):
+        """
+        批量将request添加到waiting队列，批内和请求池内的去重都通过集合运算完成
+        Return:
+            (添加数量, 重复数量, 无效数量)
+        """
+
+        if self.shard is not None:
+            # 不属于本分片的请求按分片分组后批量转发给对应的工作进程
+            requests = self.shard.route_many(requests)
+
+        # 批内去重，相同指纹只保留第一个请求
+        batch = {}
+        for req in requests:
+            batch.setdefault(req.hash, req)
+
+        # 已在 waiting、pending、failure 队列中的请求；redis 引擎的索引只有本节点持有的请求，
+        # 共享队列中排队的请求由写入脚本去重
+        fresh = batch.keys() - self.index.states.keys()
+
+        if fresh:
+            # 已完成的请求由完成队列判断，不过滤的请求允许重复采集已完成的请求
+            fresh -= await self.done.done_hashes([h for h in fresh if not batch[h].dnt_filter])
+
+        # 保持请求的原始顺序
+        unique = [req for h, req in batch.items() if h in fresh]
+        valid = [req for req in unique if self._is_request_valid(req)]
+
+        if valid:
+            await self.waiting.put_requests(valid)
+
+        for req in valid:
+            if self._waiting_metrics is not None:
+                self._waiting_metrics.enqueue(req)
+            if self.checkpoint is not None:
+                self.checkpoint.put(req)
+
+        return len(valid), len(requests) - len(unique), len(unique) - len(valid)
+
+    @staticmethod
+    def _is_request_valid(request: BaseRequest):
+        """判断请求是否有效"""
+        return bool(request.domain) and '.' in request.domain and 'http' in request.website
+
+    async def _request_state(self, request: BaseRequest):
+        """请求所处的队列，不在请求池中时返回None"""
+        return (await self._request_states([request]))[0]
+
+    async def _request_states(self, requests: List[BaseRequest]) -> list:
+        """批量查询请求所处的队列，索引中查不到的请求通过一次查询判断是否已完成"""
+
+        states, missing = [], []
+
+        for request in requests:
+            state = self.index.get(request)
+            # 不过滤的请求允许重复采集，不查询完成状态
+            if state is None and not request.dnt_filter:
+                missing.append(request.hash)
+            states.append(state)
+
+        if missing:
+            done = await self.done.done_hashes(missing)
+            states = [
+                RequestState.done if state is None and request.hash in done else state
+                for request, state in zip(requests, states)
+            ]
+
+        return states
+
+    async def reap_pending(self) -> List[BaseRequest]:
+        """将租约过期的请求从pending队列移回waiting队列，返回被回收的请求"""
+
+        expired = self.pending.pop_expired()
+
+        for request in expired:
+            if await self._request_state(request) == RequestState.done:
+                continue
+            logger.warning(f'请求处于pending队列超过 {self.pending.lease} 秒仍未完成，已重新放回waiting队列 ---> {request}')
+            await self.waiting.put_request(request)
+            if self._waiting_metrics is not None:
+                self._waiting_metrics.enqueue(request)
+
+        return expired
 
     async def push_to_failure(self, request: BaseRequest):
 
-        if await self.done.has_request(request):
-            return None
-        if await self.pending.has_request(request) or await self.waiting.has_request(request):
-            await self.failure.put_request(request)
+        if await self._request_state(request) in (RequestState.done, RequestState.failure):
             return None
 
+        await self._put_failure(request)
+
     async def get_request(self, count: int):
         """从请求池中获取request"""
 
         async def _get_valid_request():
-            while True:
-                if not await self.waiting_empty():
-                    requests = self.waiting.get_requests(count)
-                elif not self.failure_empty():
-                    requests = self.failure.get_requests(count)
-                else:
+            remaining = count
+            while remaining > 0:
+                # 优先取waiting队列，waiting队列为空或没有就绪的域名时取failure队列
+                requests = []
+                for queue in (self.waiting, self.failure):
+                    requests = [request async for request in queue.get_requests(remaining)]
+                    for request, state in zip(requests, await self._request_states(requests)):
+                        if state not in (RequestState.pending, RequestState.done):
+                            remaining -= 1
+                            yield request
+                            continue
+                        # 丢弃的请求已经占用了域名并发数
+                        self.limiter.release(request)
+                        if state == RequestState.done:
+                            # 已由其他节点完成，删除共享队列中的租约
+                            self._ack(request)
+                        elif self._waiting_metrics is not None:
+                            self._waiting_metrics.discard(request)
+                    if requests:
+                        break
+                if not requests:
                     return
 
-                async for request in requests:
-                    if not (await self.pending.has_request(request) or await self.done.has_request(request)):
-                        yield request
-
         async for request in _get_valid_request():
             if request is not None:
+                if self._waiting_metrics is not None:
+                    self._waiting_metrics.dequeue(request)
                 yield await self.pending.put_request(request)
 
+    def ready_delay(self) -> float:
+        """距离waiting队列中下一个域名就绪或failure队列中下一个请求到期的秒数"""
+
+        delay = self.waiting.ready_delay()
+
+        if self.failure.request_size():
+            # waiting队列为空时返回0，此时只等待failure队列
+            return min(delay, self.failure.ready_delay()) if delay else self.failure.ready_delay()
+
+        return delay
+
     async def waiting_size(self):
         return await self.waiting.request_size()
 
@@ -0,0 +1,215 @@
+"""
+redis waiting队列和分布式节点协调使用的Lua脚本，所有脚本的 ARGV[1] 为 key 前缀，其余 key 由前缀拼接：
+    {prefix}ready           有序集合，有请求的域名 -> 就绪时间
+    {prefix}queue:{host}    有序集合，请求指纹 -> 负的优先级
+    {prefix}data            哈希表，请求指纹 -> 'host score 请求编码'，排队中和租约中的请求都保存在这里
+    {prefix}leases          有序集合，请求指纹 -> 租约截止时间
+    {prefix}owners          哈希表，请求指纹 -> 持有租约的节点
+    {prefix}node:{node}     集合，节点持有租约的请求指纹
+    {prefix}nodes           有序集合，节点 -> 最近一次心跳时间
+    {prefix}idle            集合，空闲的节点
+key 由脚本动态拼接，不支持 redis cluster
+"""
+
+__all__ = [
+    'PUSH_SCRIPT', 'POP_SCRIPT', 'ACK_SCRIPT', 'REMOVE_SCRIPT', 'HEARTBEAT_SCRIPT', 'FINISHED_SCRIPT',
+    'UNREGISTER_SCRIPT'
+]
+
+
+# 公共函数：释放租约并将请求放回所属域名的队列
+_REQUEUE = """
+local prefix = ARGV[1]
+
+local function requeue(h, now)
+    redis.call('ZREM', prefix .. 'leases', h)
+    local owner = redis.call('HGET', prefix .. 'owners', h)
+    if owner then
+        redis.call('HDEL', prefix .. 'owners', h)
+        redis.call('SREM', prefix .. 'node:' .. owner, h)
+    end
+    local payload = redis.call('HGET', prefix .. 'data', h)
+    if payload then
+        local host, score = string.match(payload, '^(%S+) (%S+) ')
+        redis.call('ZADD', prefix .. 'queue:' .. host, score, h)
+        redis.call('ZADD', prefix .. 'ready', 'NX', now, host)
+    end
+end
+"""
+
+# 批量写入请求，指纹已存在（排队中或租约中）的请求跳过，本节点持有租约的请求放回队列
+# ARGV: 前缀, 节点, 当前时间, 之后每4个为一组 (hash, host, score, payload)
+PUSH_SCRIPT = _REQUEUE + """
+local node, now = ARGV[2], tonumber(ARGV[3])
+local added = 0
+
+for i = 4, #ARGV, 4 do
+    local h, host = ARGV[i], ARGV[i + 1]
+    if redis.call('HSETNX', prefix .. 'data', h, ARGV[i + 3]) == 1 then
+        redis.call('ZADD', prefix .. 'queue:' .. host, ARGV[i + 2], h)
+        redis.call('ZADD', prefix .. 'ready', 'NX', now, host)
+        added = added + 1
+    elseif redis.call('HGET', prefix .. 'owners', h) == node then
+        redis.call('HSET', prefix .. 'data', h, ARGV[i + 3])
+        requeue(h, now)
+        added = added + 1
+    end
+end
+
+return added
+"""
+
+# 先将租约过期的请求放回队列，再按就绪时间轮转各域名出队，出队的请求写入租约并登记到本节点
+# ARGV: 前缀, 节点, 数量, 当前时间, 租约截止时间, 域名出队间隔
+POP_SCRIPT = _REQUEUE + """
+local node, count, now = ARGV[2], tonumber(ARGV[3]), tonumber(ARGV[4])
+local deadline, delay = ARGV[5], tonumber(ARGV[6])
+
+for _, h in ipairs(redis.call('ZRANGEBYSCORE', prefix .. 'leases', '-inf', now, 'LIMIT', 0, count)) do
+    requeue(h, now)
+end
+
+local result = {}
+while #result < count do
+    local hosts = redis.call('ZRANGEBYSCORE', prefix .. 'ready', '-inf', now, 'LIMIT', 0, count - #result)
+    if #hosts == 0 then
+        break
+    end
+    for _, host in ipairs(hosts) do
+        local queue = prefix .. 'queue:' .. host
+        local item = redis.call('ZPOPMIN', queue)
+        if #item > 0 then
+            local payload = redis.call('HGET', prefix .. 'data', item[1])
+            if payload then
+                redis.call('ZADD', prefix .. 'leases', deadline, item[1])
+                redis.call('HSET', prefix .. 'owners', item[1], node)
+                redis.call('SADD', prefix .. 'node:' .. node, item[1])
+                table.insert(result, payload)
+            end
+        end
+        if redis.call('EXISTS', queue) == 1 then
+            redis.call('ZADD', prefix .. 'ready', now + delay, host)
+        else
+            redis.call('ZREM', prefix .. 'ready', host)
+        end
+    end
+end
+
+-- 取到请求的节点不再空闲，与出队在同一个脚本中完成，避免其他节点误判采集结束
+if #result > 0 then
+    redis.call('SREM', prefix .. 'idle', node)
+end
+
+local first = redis.call('ZRANGE', prefix .. 'ready', 0, 0, 'WITHSCORES')
+return {result, first[2] or ''}
+"""
+
+# 确认请求已完成，删除租约和请求数据；租约已不属于本节点的请求不受影响
+# ARGV: 前缀, 节点, 请求指纹...
+ACK_SCRIPT = """
+local prefix, node = ARGV[1], ARGV[2]
+
+for i = 3, #ARGV do
+    local h = ARGV[i]
+    if redis.call('HGET', prefix .. 'owners', h) == node then
+        redis.call('ZREM', prefix .. 'leases', h)
+        redis.call('HDEL', prefix .. 'owners', h)
+        redis.call('HDEL', prefix .. 'data', h)
+    end
+    redis.call('SREM', prefix .. 'node:' .. node, h)
+end
+
+return #ARGV - 2
+"""
+
+# 从队列中删除排队中的请求
+# ARGV: 前缀, host, 请求指纹
+REMOVE_SCRIPT = """
+local prefix = ARGV[1]
+
+if redis.call('ZREM', prefix .. 'queue:' .. ARGV[2], ARGV[3]) == 1 then
+    redis.call('HDEL', prefix .. 'data', ARGV[3])
+    return 1
+end
+
+return 0
+"""
+
+# 节点心跳：刷新心跳时间，续约本节点仍持有的请求，回收心跳超时节点的全部租约
+# ARGV: 前缀, 节点, 当前时间, 租约截止时间, 节点超时时间, 本节点持有的请求指纹...
+HEARTBEAT_SCRIPT = _REQUEUE + """
+local node, now, deadline = ARGV[2], tonumber(ARGV[3]), ARGV[4]
+
+redis.call('ZADD', prefix .. 'nodes', now, node)
+
+for i = 6, #ARGV do
+    if redis.call('HGET', prefix .. 'owners', ARGV[i]) == node then
+        redis.call('ZADD', prefix .. 'leases', 'XX', deadline, ARGV[i])
+    end
+end
+
+local reaped = {}
+for _, dead in ipairs(redis.call('ZRANGEBYSCORE', prefix .. 'nodes', '-inf', now - tonumber(ARGV[5]))) do
+    local count = 0
+    for _, h in ipairs(redis.call('SMEMBERS', prefix .. 'node:' .. dead)) do
+        if redis.call('HGET', prefix .. 'owners', h) == dead then
+            requeue(h, now)
+            count = count + 1
+        end
+    end
+    redis.call('DEL', prefix .. 'node:' .. dead)
+    redis.call('ZREM', prefix .. 'nodes', dead)
+    redis.call('SREM', prefix .. 'idle', dead)
+    table.insert(reaped, dead)
+    table.insert(reaped, count)
+end
+
+return reaped
+"""
+
+# 标记本节点空闲，所有存活节点都空闲且队列中没有请求（包括租约中的请求）时返回1
+# ARGV: 前缀, 节点, 当前时间, 节点超时时间
+FINISHED_SCRIPT = """
+local prefix, node = ARGV[1], ARGV[2]
+
+redis.call('SADD', prefix .. 'idle', node)
+
+if redis.call('HLEN', prefix .. 'data') > 0 then
+    return 0
+end
+
+local alive = tonumber(ARGV[3]) - tonumber(ARGV[4])
+for _, other in ipairs(redis.call('ZRANGEBYSCORE', prefix .. 'nodes', alive, '+inf')) do
+    if redis.call('SISMEMBER', prefix .. 'idle', other) == 0 then
+        return 0
+    end
+end
+
+return 1
+"""
+
+# 节点退出：放回本节点持有的请求并注销，最后一个节点退出且队列为空时删除协调用的 key 和传入的 key
+# ARGV: 前缀, 节点, 当前时间, 需要一并删除的 key...
+UNREGISTER_SCRIPT = _REQUEUE + """
+local node, now = ARGV[2], tonumber(ARGV[3])
+
+for _, h in ipairs(redis.call('SMEMBERS', prefix .. 'node:' .. node)) do
+    if redis.call('HGET', prefix .. 'owners', h) == node then
+        requeue(h, now)
+    end
+end
+
+redis.call('DEL', prefix .. 'node:' .. node)
+redis.call('ZREM', prefix .. 'nodes', node)
+redis.call('SREM', prefix .. 'idle', node)
+
+local remaining = redis.call('ZCARD', prefix .. 'nodes')
+if remaining == 0 and redis.call('HLEN', prefix .. 'data') == 0 then
+    redis.call('DEL', prefix .. 'ready', prefix .. 'leases', prefix .. 'owners', prefix .. 'idle')
+    for i = 4, #ARGV do
+        redis.call('DEL', ARGV[i])
+    end
+end
+
+return remaining
+"""
@@ -0,0 +1,430 @@
+"""
+已完成请求的指纹快照，每个快照文件保存排好序的16字节 md5 指纹，通过 mmap 打开后按二分查找判断指纹是否存在。
+加载时只读取文件头，内存占用由操作系统按需换页，与文件大小相当（每个请求16字节）。
+每个快照旁有一个同名的 .bloom 布隆过滤器文件，同样通过 mmap 打开，不存在的指纹（新请求）大多不需要二分查找。
+目录下的 done.sbf 是覆盖全部快照的可扩容布隆过滤器，查询时先用它一次排除新请求，再逐个查询快照
+
+快照文件格式：魔数 8s | 指纹数量 Q | 指纹 16s * 数量
+文件名为 {编号}_{过期时间}.aio，旧版本的十六进制文本快照在加载时自动转换
+done.sbf 文件格式：快照文件名长度 Q | 以换行分隔的快照文件名 | ScalableBloomFilter.tofile 的内容
+"""
+
+__all__ = ['DoneSnapshot', 'SnapshotStore']
+
+import os
+import mmap
+import time
+import heapq
+import uuid
+import struct
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from AioSpider import tools
+from AioSpider.filter import BloomFilter, ScalableBloomFilter
+
+
+class DoneSnapshot:
+    """
+    单个快照文件，只读
+    Args:
+        path: 快照文件路径
+    """
+
+    MAGIC = b'AIODONE1'
+    width = 16
+
+    _HEADER = struct.Struct('<8sQ')
+
+    def __init__(self, path: Path):
+
+        self.path = Path(path)
+
+        with self.path.open('rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self._HEADER.size:
+                raise ValueError(f'{self.path} 不是快照文件')
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count = self._HEADER.unpack_from(self._mm)
+        if magic != self.MAGIC or size != self._HEADER.size + self.count * self.width:
+            self._mm.close()
+            raise ValueError(f'{self.path} 不是快照文件或已损坏')
+
+        self.bloom, self._bloom_mm = self._open_bloom()
+
+    @staticmethod
+    def bloom_path(path: Path) -> Path:
+        return Path(path).with_suffix('.bloom')
+
+    @staticmethod
+    def expire_of(path: Path) -> Optional[int]:
+        """文件名中的过期时间"""
+        return tools.type_converter(Path(path).stem.split('_')[-1], to=int, force=True)
+
+    @property
+    def expire(self) -> Optional[int]:
+        return self.expire_of(self.path)
+
+    def _open_bloom(self) -> Tuple[Optional[BloomFilter], Optional[mmap.mmap]]:
+        """mmap 打开布隆过滤器，文件不存在或已损坏时只使用二分查找"""
+
+        path = self.bloom_path(self.path)
+        if not path.exists():
+            return None, None
+
+        try:
+            with path.open('rb') as f:
+                return BloomFilter.frommmap(f)
+        except (ValueError, OSError):
+            return None, None
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, h: str) -> bool:
+        return self.has(h)
+
+    def has(self, h: str, digest: bytes = None) -> bool:
+        """先查布隆过滤器，可能存在时再二分查找"""
+
+        if self.bloom is not None and h not in self.bloom:
+            return False
+
+        return self.has_digest(digest or bytes.fromhex(h))
+
+    def done_hashes(self, hashes: List[str]) -> set:
+        """批量查询，布隆过滤器批量排除不存在的指纹后再二分查找其余指纹"""
+
+        if self.bloom is not None:
+            hashes = [h for h, maybe in zip(hashes, self.bloom.contains_many(hashes)) if maybe]
+
+        return {h for h in hashes if self.has_digest(bytes.fromhex(h))}
+
+    def has_digest(self, digest: bytes) -> bool:
+
+        mm, width, base = self._mm, self.width, self._HEADER.size
+        lo, hi = 0, self.count
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = base + mid * width
+            value = mm[offset:offset + width]
+            if value < digest:
+                lo = mid + 1
+            elif value > digest:
+                hi = mid
+            else:
+                return True
+
+        return False
+
+    def __iter__(self) -> Iterator[bytes]:
+
+        mm, width = self._mm, self.width
+        start = self._HEADER.size
+        # 按块读取，避免逐个切片时频繁访问 mmap
+        step = width * 4096
+
+        for offset in range(start, start + self.count * width, step):
+            chunk = mm[offset:min(offset + step, start + self.count * width)]
+            for i in range(0, len(chunk), width):
+                yield chunk[i:i + width]
+
+    def pairs(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """按块返回指纹的两个64位整数 (h1, h2)，与布隆过滤器对十六进制指纹计算的摘要一致"""
+
+        mm, width = self._mm, self.width
+        start, end = self._HEADER.size, self._HEADER.size + self.count * width
+        step = width * BloomFilter.chunk_size
+
+        for offset in range(start, end, step):
+            # 切片复制了数据，数组不引用 mmap
+            chunk = np.frombuffer(mm[offset:min(offset + step, end)], dtype='<u8')
+            yield chunk[0::2].astype(np.uint64), chunk[1::2].astype(np.uint64)
+
+    def close(self):
+        self._mm.close()
+        if self._bloom_mm is not None:
+            # 位数组引用着 mmap，先释放再关闭
+            self.bloom = None
+            self._bloom_mm.close()
+            self._bloom_mm = None
+
+    def unlink(self):
+        self.close()
+        self.path.unlink(missing_ok=True)
+        self.bloom_path(self.path).unlink(missing_ok=True)
+
+    @classmethod
+    def write(cls, path: Path, digests: Iterable[bytes], capacity: int = 0) -> 'DoneSnapshot':
+        """
+        写入快照，先写入临时文件再替换，不会留下写了一半的快照
+        Args:
+            path: 快照文件路径
+            digests: 升序排列的指纹，相邻的重复指纹只写入一次
+            capacity: 指纹数量上限，大于0时同时写入布隆过滤器
+        """
+
+        path = Path(path)
+        tmp = path.with_suffix('.tmp')
+        bloom = BloomFilter(capacity=capacity) if capacity > 0 else None
+
+        count, last, keys = 0, None, []
+        with tmp.open('wb') as f:
+            f.write(cls._HEADER.pack(cls.MAGIC, 0))
+            for digest in digests:
+                if digest == last:
+                    continue
+                f.write(digest)
+                if bloom is not None:
+                    keys.append(digest.hex())
+                    if len(keys) >= bloom.chunk_size:
+                        bloom.add_many(keys, skip_check=True)
+                        keys = []
+                last = digest
+                count += 1
+            f.seek(0)
+            f.write(cls._HEADER.pack(cls.MAGIC, count))
+
+        if keys:
+            bloom.add_many(keys, skip_check=True)
+
+        os.replace(tmp, path)
+
+        # 快照先落盘，布隆过滤器缺失时快照仍然可用
+        if bloom is not None:
+            with tmp.open('wb') as f:
+                bloom.tofile(f)
+            os.replace(tmp, cls.bloom_path(path))
+
+        return cls(path)
+
+
+class SnapshotStore:
+    """
+    一个目录下的全部快照。加载时打开所有未过期的快照并删除已过期的快照；
+    每次写入生成一个新快照，与之前的快照（包括历史运行留下的快照）中相邻两个大小相近、过期时间接近时合并，
+    快照数量保持在对数级别，不会随重启次数增长
+    Args:
+        path: 快照目录
+    """
+
+    suffix = '.aio'
+    filter_name = 'done.sbf'
+    # 重新生成的过滤器第一个分片的最小容量
+    filter_capacity = 1 << 16
+    # 两个快照的过期时间之差不超过较晚的快照剩余时间的该比例时才合并，合并后使用较早的过期时间
+    merge_window = 0.1
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        # 整体替换而不是原地修改，后台线程写入时事件循环中的查询不受影响
+        self.snapshots: Tuple[DoneSnapshot, ...] = ()
+        # 参与合并的快照，大小大致递减，新快照追加在末尾
+        self._merging: List[DoneSnapshot] = []
+        # 覆盖全部快照的可扩容布隆过滤器，只会添加元素，后台线程写入时查询不会漏掉已有的指纹
+        self.filter: Optional[ScalableBloomFilter] = None
+        self._filter_mm: Optional[mmap.mmap] = None
+        # 过滤器是否有尚未写入 done.sbf 的修改
+        self._filter_dirty = False
+
+    def __len__(self):
+        return sum(snapshot.count for snapshot in self.snapshots)
+
+    def __contains__(self, h: str) -> bool:
+        digest = bytes.fromhex(h)
+        return any(snapshot.has(h, digest) for snapshot in self.snapshots)
+
+    def done_hashes(self, hashes) -> set:
+        """批量查询存在于任一快照中的指纹"""
+
+        rest, done = list(hashes), set()
+
+        if self.filter is not None and rest:
+            rest = [h for h, maybe in zip(rest, self.filter.contains_many(rest)) if maybe]
+
+        for snapshot in self.snapshots:
+            if not rest:
+                break
+            found = snapshot.done_hashes(rest)
+            if found:
+                done |= found
+                rest = [h for h in rest if h not in found]
+
+        return done
+
+    def _new_path(self, expire: int) -> Path:
+        # 多个分片进程可能同时写入同一个目录，编号使用随机值
+        return self.path / f'{uuid.uuid4().hex[:12]}_{expire}{self.suffix}'
+
+    def load(self) -> int:
+        """打开未过期的快照，返回加载的指纹数量，只读取文件头"""
+
+        if not self.path.exists():
+            return 0
+
+        now = time.time()
+        snapshots = []
+
+        for path in sorted(self.path.glob(f'*{self.suffix}')):
+
+            expire = DoneSnapshot.expire_of(path)
+            if not expire:
+                continue
+
+            if expire < now:
+                path.unlink(missing_ok=True)
+                DoneSnapshot.bloom_path(path).unlink(missing_ok=True)
+                continue
+
+            try:
+                snapshots.append(DoneSnapshot(path))
+            except ValueError:
+                snapshots.append(self._convert(path, expire))
+
+        self.snapshots += tuple(snapshots)
+        # 历史快照按大小递减排在前面，之后写入的快照逐级与它们合并
+        self._merging[:0] = sorted(snapshots, key=lambda snapshot: snapshot.count, reverse=True)
+        self._load_filter()
+        return sum(snapshot.count for snapshot in snapshots)
+
+    def _new_filter(self, capacity: int = 0) -> ScalableBloomFilter:
+        return ScalableBloomFilter(initial_capacity=max(capacity, self.filter_capacity), prehashed=True)
+
+    def _load_filter(self):
+        """
+        mmap 打开 done.sbf，它覆盖当前全部快照时直接使用，否则由快照重新生成，关闭时写回。
+        过滤器只用于排除不存在的指纹，覆盖已过期删除的快照只会多查询几次快照，不影响结果
+        """
+
+        self._close_filter()
+        names = {snapshot.path.name for snapshot in self.snapshots}
+        total = sum(snapshot.count for snapshot in self.snapshots)
+        path = self.path / self.filter_name
+
+        if path.exists():
+            try:
+                with path.open('rb') as f:
+                    size, = struct.unpack('<Q', f.read(8))
+                    covered = set(f.read(size).decode().split())
+                    bloom, mm = ScalableBloomFilter.frommmap(f, 8 + size)
+            except (ValueError, OSError, struct.error):
+                pass
+            else:
+                # 过期快照留下的指纹超过一半时重新生成，避免过滤器只增不减
+                if names <= covered and bloom.count <= 2 * total + self.filter_capacity:
+                    self.filter, self._filter_mm = bloom, mm
+                    return
+                bloom = None
+                mm.close()
+
+        self.filter = self._new_filter(total)
+        for snapshot in self.snapshots:
+            for h1, h2 in snapshot.pairs():
+                self.filter.add_pairs(h1, h2)
+        self._filter_dirty = bool(self.snapshots)
+
+    def _dump_filter(self):
+        """写入 done.sbf，记录过滤器覆盖的快照文件名，先写入临时文件再替换"""
+
+        names = '\n'.join(snapshot.path.name for snapshot in self.snapshots).encode()
+        path = self.path / self.filter_name
+        # 多个分片进程可能同时写回，临时文件使用随机名称
+        tmp = self.path / f'{uuid.uuid4().hex[:12]}.tmp'
+
+        with tmp.open('wb') as f:
+            f.write(struct.pack('<Q', len(names)))
+            f.write(names)
+            self.filter.tofile(f)
+
+        # 已映射的旧文件在替换后仍然有效
+        os.replace(tmp, path)
+        self._filter_dirty = False
+
+    def _close_filter(self):
+        # 过滤器的分片引用着 mmap，先释放再关闭
+        self.filter = None
+        if self._filter_mm is not None:
+            self._filter_mm.close()
+            self._filter_mm = None
+
+    def _convert(self, path: Path, expire: int) -> DoneSnapshot:
+        """将旧版本的十六进制文本快照转换为二进制快照"""
+
+        digests = set()
+        with path.open('rb') as f:
+            for line in f:
+                line = line.strip()
+                if len(line) == DoneSnapshot.width * 2:
+                    digests.add(bytes.fromhex(line.decode()))
+
+        snapshot = DoneSnapshot.write(self._new_path(expire), sorted(digests), len(digests))
+        path.unlink(missing_ok=True)
+
+        return snapshot
+
+    def add(self, hashes: Iterable[str], expire: int) -> List[DoneSnapshot]:
+        """
+        写入一个新快照并合并，可以在后台线程中调用
+        Return:
+            被合并掉的快照，由调用方在没有查询进行时调用 discard 关闭并删除
+        """
+
+        digests = sorted({bytes.fromhex(h) for h in hashes})
+        if not digests:
+            return []
+
+        merging = self._merging
+        merging.append(DoneSnapshot.write(self._new_path(expire), digests, len(digests)))
+
+        # 先写入过滤器再发布快照，发布后的快照中的指纹不会被过滤器排除
+        if self.filter is None:
+            self.filter = self._new_filter()
+        pairs = np.frombuffer(b''.join(digests), dtype='<u8')
+        self.filter.add_pairs(pairs[0::2].astype(np.uint64), pairs[1::2].astype(np.uint64))
+        self._filter_dirty = True
+
+        now, stale = time.time(), []
+        while len(merging) >= 2 and self._mergeable(merging[-2], merging[-1], now):
+            newer, older = merging.pop(), merging.pop()
+            merging.append(DoneSnapshot.write(
+                self._new_path(min(older.expire, newer.expire)), heapq.merge(older, newer),
+                older.count + newer.count
+            ))
+            stale.extend((older, newer))
+
+        self.snapshots = tuple(
+            snapshot for snapshot in self.snapshots if snapshot not in stale and snapshot not in merging
+        ) + tuple(merging)
+
+        return stale
+
+    def _mergeable(self, older: DoneSnapshot, newer: DoneSnapshot, now: float) -> bool:
+        """大小相近且过期时间接近的两个快照可以合并"""
+
+        if older.count > newer.count * 2:
+            return False
+
+        early, late = sorted((older.expire, newer.expire))
+        return late - early <= (late - now) * self.merge_window
+
+    @staticmethod
+    def discard(snapshots: Iterable[DoneSnapshot]):
+        for snapshot in snapshots:
+            snapshot.unlink()
+
+    def close(self):
+        if self.filter is not None and self._filter_dirty and self.path.exists():
+            try:
+                self._dump_filter()
+            except OSError:
+                # 写入失败时下次加载由快照重新生成
+                pass
+        self._close_filter()
+        for snapshot in self.snapshots:
+            snapshot.close()
+        self.snapshots = ()
+        self._merging.clear()
@@ -1,53 +1,144 @@
-__all__ = ['WaitingRequest', 'WaitingRedisRequest']
+__all__ = ['WaitingRequest', 'WaitingRedisRequest', 'WaitingDiskRequest']
 
+import os
+import time
+import uuid
 import heapq
-import random
+import socket
+import itertools
+import sqlite3
 import asyncio
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
 
 from AioSpider import tools
+from AioSpider.constants import RequestState
 from AioSpider.http.base import BaseRequest
+from AioSpider.http.codec import RequestCodec
 from AioSpider.requestpool.abc import RequestBaseABC
+from AioSpider.requestpool.index import RequestIndex
+from AioSpider.requestpool.limiter import DomainLimiter
+from AioSpider.requestpool import scripts
 
 
 class WaitingRequest(RequestBaseABC):
-
-    def __init__(self):
+    """
+    内存waiting队列，每个域名一个按优先级排序的堆，域名之间按就绪时间轮转出队，
+    同一域名两次出队至少间隔 delay 秒，选择域名的复杂度为 O(log hosts)。
+    指定 limiter 时，域名的令牌或并发数不足时推迟到令牌可用或有请求完成后再出队
+    Args:
+        index: 请求状态索引
+        delay: 同一域名两次出队的最小间隔，单位秒
+        limiter: 域名限速器
+    """
+
+    def __init__(self, index: RequestIndex = None, delay: float = 0, limiter: DomainLimiter = None):
         self.name = 'waiting'
+        self.index = index if index is not None else RequestIndex()
+        self.delay = delay
+        self.limiter = limiter
+        # {host: [(-priority, hash, request)]}
         self.waiting = {}
         self.waiting_count = 0
-        self.max_host_name = ''
-        self.max_host_count = 0
         self.request_hashes = defaultdict(set)
+        # [(就绪时间, 序号, host)]，每个有请求的域名在堆中只出现一次，就绪时间相同时按入堆顺序轮转
+        self._ready = []
+        # {host: 下次就绪时间}，域名的请求取完后仍保留，避免重新入队时绕过间隔限制
+        self._host_ready = {}
+        self._seq = itertools.count()
+        # 并发数已满而挂起的域名，有请求完成后重新调度
+        self._blocked = set()
+
+        if limiter is not None:
+            limiter.listeners.append(self._unblock)
+
+    def _unblock(self, host: str):
+        if host in self._blocked:
+            self._blocked.discard(host)
+            self._schedule(host)
+
+    def _schedule(self, host: str):
+        heapq.heappush(self._ready, (self._host_ready.get(host, 0), next(self._seq), host))
 
     async def put_request(self, request: BaseRequest):
         host = request.domain
         if host not in self.waiting:
             self.waiting[host] = []
+            self._schedule(host)
         heapq.heappush(self.waiting[host], (-request.priority, request.hash, request))
         self.waiting_count += 1
         self.request_hashes[host].add(request.hash)
-        self._update_max_host(host)
+        self.index.set(request, RequestState.waiting)
+
+    async def put_requests(self, requests: List[BaseRequest]):
+        """按域名分组后一次性写入各域名的堆"""
+
+        groups = defaultdict(list)
+        for request in requests:
+            groups[request.domain].append((-request.priority, request.hash, request))
+
+        states = self.index.states
+
+        for host, entries in groups.items():
+            if host not in self.waiting:
+                self.waiting[host] = []
+                self._schedule(host)
+            heap = self.waiting[host]
+            if len(entries) > len(heap):
+                # 新增数量较多时整体重建堆比逐个插入更快
+                heap.extend(entries)
+                heapq.heapify(heap)
+            else:
+                for entry in entries:
+                    heapq.heappush(heap, entry)
+            hashes = [entry[1] for entry in entries]
+            self.request_hashes[host].update(hashes)
+            states.update(dict.fromkeys(hashes, RequestState.waiting))
+
+        self.waiting_count += len(requests)
 
     async def get_requests(self, count):
+        """按就绪时间依次从各域名取出优先级最高的请求，没有就绪的域名时提前结束"""
 
+        now = time.time()
         requests_obtained = 0
 
-        while requests_obtained < count and self.waiting_count > 0:
-            max_requests_to_get = min(self.max_host_count, count - requests_obtained)
+        while requests_obtained < count and self._ready and self._ready[0][0] <= now:
+            _, _, host = heapq.heappop(self._ready)
+            heap = self.waiting[host]
+
+            if self.limiter is not None:
+                wait = self.limiter.acquire(heap[0][2], now)
+                if wait == float('inf'):
+                    self._blocked.add(host)
+                    continue
+                if wait > 0:
+                    heapq.heappush(self._ready, (now + wait, next(self._seq), host))
+                    continue
+
+            _, _, request = heapq.heappop(heap)
+            self.request_hashes[host].discard(request.hash)
+            self.waiting_count -= 1
+            requests_obtained += 1
+            self._host_ready[host] = now + self.delay
+
+            if heap:
+                self._schedule(host)
+            else:
+                del self.waiting[host]
+                del self.request_hashes[host]
 
-            for _ in range(max_requests_to_get):
-                _, _, request = heapq.heappop(self.waiting[self.max_host_name])
-                self.request_hashes[self.max_host_name].remove(request.hash)
-                requests_obtained += 1
-                self.waiting_count -= 1
+            yield request
 
-                if not self.waiting[self.max_host_name]:
-                    self.waiting.pop(self.max_host_name)
+    def ready_delay(self) -> float:
+        """距离下一个域名就绪的秒数，没有请求时返回0"""
 
-                yield request
+        if not self._ready:
+            return 0
 
-            self._update_max_host()
+        return max(self._ready[0][0] - time.time(), 0)
 
     async def has_request(self, request: BaseRequest):
         host = request.domain
@@ -56,94 +147,350 @@ class WaitingRequest(RequestBaseABC):
     async def request_size(self):
         return self.waiting_count
 
-    def _update_max_host(self, new_host=None):
-        if new_host and len(self.waiting[new_host]) > self.max_host_count:
-            self.max_host_name = new_host
-            self.max_host_count = len(self.waiting[new_host])
-        else:
-            if self.waiting:
-                self.max_host_name, host_list = max(
-                    self.waiting.items(), key=lambda x: len(x[1])
-                )
-                self.max_host_count = len(host_list)
-            else:
-                self.max_host_name, self.max_host_count = '', 0
-
 
 class WaitingRedisRequest(RequestBaseABC):
-
-    def __init__(self, connector):
+    """
+    redis waiting队列，多个节点可以共享同一个队列。每个域名一个按优先级排序的有序集合，
+    有请求的域名及其就绪时间登记在 ready 有序集合中，出队时不需要遍历 key；
+    请求以二进制编码保存在一个哈希表中，出队和写入租约由 Lua 脚本原子完成，多个节点不会取到同一个请求，
+    租约过期（节点异常退出）的请求在下次出队时放回队列。写入、出队和确认都通过管道批量发送，
+    key 的布局见 AioSpider.requestpool.scripts
+    Args:
+        connector: 数据库连接
+        name: key 前缀，共享同一个队列的节点使用相同的名称
+        index: 请求状态索引，只记录本节点持有的（pending、failure）请求，排队中的请求不登记
+        delay: 同一域名两次出队的最小间隔，单位秒，在所有节点之间生效
+        lease: 租约时长，单位秒，None 表示不限制
+        node: 节点名称，None 表示根据主机名和进程号自动生成
+    """
+
+    # 每个脚本调用写入的请求数量，避免单个脚本阻塞 redis 过久
+    chunk_size = 500
+
+    def __init__(
+            self, connector, name: str = 'AioSpider', index: RequestIndex = None, delay: float = 0,
+            lease: float = None, node: str = None
+    ):
         self.name = 'redis waiting'
+        self.index = index if index is not None else RequestIndex()
+        self.delay = delay
+        self.lease = lease
+        self.node = node or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
         self.conn = connector['redis']['DEFAULT']
-        self.request_info = {}
+        # 请求编码是二进制数据，写入和出队使用不解码响应的连接，按原始字节保存
+        self.raw = self.conn.binary
+        self.prefix = f'aiospider:{name}:'
+        self.codec = RequestCodec()
+
+        self._push = self.raw.register_script(scripts.PUSH_SCRIPT)
+        self._pop = self.raw.register_script(scripts.POP_SCRIPT)
+        self._ack = self.raw.register_script(scripts.ACK_SCRIPT)
+        self._remove = self.raw.register_script(scripts.REMOVE_SCRIPT)
+
+        # 待确认的请求指纹，随下一次写入或出队一起发送
+        self._acks = []
+        # 最近一次出队时最早就绪的域名的就绪时间
+        self._next_ready = None
+
+    def _dumps(self, request: BaseRequest) -> bytes:
+        """序列化为 b'host score 二进制编码'"""
+        return f'{request.domain} {-request.priority} '.encode() + self.codec.encode(request)
+
+    def _loads(self, payload: bytes) -> BaseRequest:
+        return self.codec.decode(payload.split(b' ', 2)[2])
+
+    def lease_deadline(self, now: float):
+        return now + self.lease if self.lease else '+inf'
+
+    def ack(self, request: BaseRequest):
+        """请求已完成，删除 redis 中的租约和请求数据"""
+        self._acks.append(request.hash)
+
+    async def flush_acks(self, client=None):
+        """发送待确认的请求，client 为管道时随管道一起发送"""
+        if self._acks:
+            acks, self._acks = self._acks, []
+            await self._ack(args=[self.prefix, self.node, *acks], client=client)
 
     async def put_request(self, request: BaseRequest):
-        request_info = request.to_dict()
-        help = str(request.help)
-        await self.conn.order_set.zadd('url_' + help, {request.url: request.priority})
-        if self.request_info.get(help) is None:
-            await self.conn.hash.hmset('request_' + help, request_info)
-            self.request_info[help] = request_info
-
-    async def _get_url_keys_count(self):
-        keys = {}
-        for i in await self.conn.keys():
-            if tools.re_match(i, '^url_.*'):
-                count = await self.conn.order_set.zcard(i)
-            else:
-                continue
-            if count > 0:
-                keys[i] = count
-        return keys
-
-    async def _get_request_infos(self, name):
-        if name in self.request_info:
-            return self.request_info[name]
-
-        key = f"request_{name}"
-        if await self.conn.hash.hlen(key) > 0:
-            info = await self.conn.hash.hgetall(key)
-            info = {k: tools.load_json(v) for k, v in info.items()}
-            return info
-
-        return None
-
-    async def _fetch_urls(self, key, count):
-        new_urls = await self.conn.order_set.zrange(key, 0, count - 1)
-        await self.conn.order_set.zrem(key, *new_urls)
-        requests = []
-        request_info = await self._get_request_infos(tools.re_text(key, '^url_(.*)'))
-        for url in new_urls:
-            request_info['url'] = '"' + url + '"'
-            requests.append(BaseRequest.from_dict(request_info))
-        return requests
+        await self.put_requests([request])
+
+    async def put_requests(self, requests: List[BaseRequest]):
+        """分批调用写入脚本，所有批次通过一个管道发送"""
+
+        pipe = self.raw.pipeline()
+        await self.flush_acks(pipe)
+
+        now = time.time()
+        for i in range(0, len(requests), self.chunk_size):
+            args = [self.prefix, self.node, now]
+            for request in requests[i:i + self.chunk_size]:
+                args.extend((request.hash, request.domain, -request.priority, self._dumps(request)))
+            await self._push(args=args, client=pipe)
+
+        # 共享队列中的请求可能由其他节点取出和完成，不登记到本节点的索引，否则索引只增不减；
+        # 排队中和租约中的请求由写入脚本去重，已完成的请求由 redis 完成集合去重
+        await pipe.execute()
 
     async def get_requests(self, count):
-        keys = await self._get_url_keys_count()
+        """原子地取出至多 count 个请求并写入租约，待确认的请求在同一个管道中发送"""
+
+        now = time.time()
+
+        pipe = self.raw.pipeline()
+        await self.flush_acks(pipe)
+        await self._pop(
+            args=[self.prefix, self.node, count, now, self.lease_deadline(now), self.delay], client=pipe
+        )
+        payloads, first = (await pipe.execute())[-1]
+        self._next_ready = float(first) if first else None
+
+        for payload in payloads:
+            yield self._loads(payload)
+
+    def ready_delay(self) -> float:
+        """距离下一个域名就绪的秒数，根据最近一次出队的结果估算"""
+
+        if self._next_ready is None:
+            return 0
+
+        return max(self._next_ready - time.time(), 0)
+
+    async def has_request(self, request: BaseRequest):
+        return await self.conn.order_set.zscore(
+            f'{self.prefix}queue:{request.domain}', request.hash
+        ) is not None
+
+    async def remove_request(self, request: BaseRequest):
+        await self._remove(args=[self.prefix, request.domain, request.hash])
 
-        if not keys:
+    async def request_size(self):
+        pipe = self.conn.pipeline()
+        pipe.hlen(self.prefix + 'data')
+        pipe.zcard(self.prefix + 'leases')
+        total, leased = await pipe.execute()
+        return total - leased
+
+    async def close(self):
+        await self.flush_acks()
+
+
+class WaitingDiskRequest(RequestBaseABC):
+    """
+    磁盘溢写的waiting队列，内存中最多保留 memory_size 个请求，其余请求序列化后写入本地 SQLite 文件，
+    按域名和优先级建立索引。内存中的请求低于一半时在后台线程中提前从磁盘补充，
+    补充时在各域名之间轮转，每个域名内按优先级从高到低读取
+    Args:
+        path: 溢写文件路径
+        memory_size: 内存中保留的最大请求数量
+        index: 请求状态索引
+        delay: 同一域名两次出队的最小间隔，单位秒
+        limiter: 域名限速器
+    """
+
+    # 溢写缓冲区达到该数量时批量写入磁盘
+    flush_size = 1000
+
+    def __init__(
+            self, path: Path, memory_size: int = 10000, index: RequestIndex = None, delay: float = 0,
+            limiter: DomainLimiter = None
+    ):
+        self.name = 'disk waiting'
+        self.path = Path(path)
+        self.memory_size = memory_size
+        self.index = index if index is not None else RequestIndex()
+        self.memory = WaitingRequest(index=self.index, delay=delay, limiter=limiter)
+        self.codec = RequestCodec()
+        # 已溢写（包括缓冲区中尚未写入磁盘）的请求数量
+        self.spilled = 0
+        # {host: 磁盘中该域名的请求数量}
+        self.host_spilled = defaultdict(int)
+        # 补充时轮转的域名顺序
+        self._hosts = deque()
+        self._buffer = []
+        self._refill_task = None
+        self._lock = asyncio.Lock()
+        # SQLite 连接只在该线程中使用，读写按提交顺序串行执行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='AioSpider-waiting')
+        self._conn = None
+
+    def _connect(self):
+
+        if self._conn is not None:
+            return self._conn
+
+        tools.mkdir(self.path.parent)
+        # 溢写文件只在本次运行中有效，断点续爬由断点文件负责
+        if self.path.exists():
+            self.path.unlink()
+
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=OFF')
+        self._conn.execute('PRAGMA synchronous=OFF')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS waiting ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, host TEXT, priority INTEGER, hash TEXT, data BLOB)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS host_priority ON waiting (host, priority DESC, id)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS request_hash ON waiting (hash)')
+
+        return self._conn
+
+    async def _run(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    def _write_rows(self, rows: list):
+        conn = self._connect()
+        conn.execute('BEGIN')
+        conn.executemany('INSERT INTO waiting (host, priority, hash, data) VALUES (?, ?, ?, ?)', rows)
+        conn.execute('COMMIT')
+
+    def _read_rows(self, quotas: list) -> list:
+        """按 [(host, 数量)] 读取并删除各域名优先级最高的请求"""
+
+        conn = self._connect()
+        rows = []
+
+        for host, limit in quotas:
+            rows.extend(conn.execute(
+                'SELECT id, host, hash, data FROM waiting WHERE host = ? ORDER BY priority DESC, id LIMIT ?',
+                (host, limit)
+            ).fetchall())
+
+        if rows:
+            conn.execute('BEGIN')
+            conn.executemany('DELETE FROM waiting WHERE id = ?', [(row[0],) for row in rows])
+            conn.execute('COMMIT')
+
+        return rows
+
+    def _exists(self, h: str) -> bool:
+        return self._connect().execute('SELECT 1 FROM waiting WHERE hash = ? LIMIT 1', (h,)).fetchone() is not None
+
+    def _spill(self, requests: List[BaseRequest]):
+
+        for request in requests:
+            host = request.domain
+            if not self.host_spilled[host]:
+                self._hosts.append(host)
+            self.host_spilled[host] += 1
+            self._buffer.append((
+                host, request.priority, request.hash, self.codec.encode(request)
+            ))
+            self.index.set(request, RequestState.waiting)
+
+        self.spilled += len(requests)
+
+    async def _flush(self):
+
+        if not self._buffer:
+            return
+
+        rows, self._buffer = self._buffer, []
+        await self._run(self._write_rows, rows)
+
+    async def put_request(self, request: BaseRequest):
+        await self.put_requests([request])
+
+    async def put_requests(self, requests: List[BaseRequest]):
+
+        # 磁盘中已有请求时新请求也写入磁盘，避免后来的请求插队
+        room = 0 if self.spilled else max(self.memory_size - self.memory.waiting_count, 0)
+
+        if room:
+            await self.memory.put_requests(requests[:room])
+
+        if len(requests) > room:
+            # 与补充串行执行，补充读取磁盘期间写入的请求等读取完成后再登记
+            async with self._lock:
+                self._spill(requests[room:])
+                if len(self._buffer) >= self.flush_size:
+                    await self._flush()
+
+    async def _refill(self):
+        """从磁盘补充请求到内存，补满 memory_size"""
+
+        async with self._lock:
+
+            need = self.memory_size - self.memory.waiting_count
+            if need <= 0 or not self.spilled:
+                return
+
+            await self._flush()
+
+            # 在有请求的域名之间轮转分配补充数量，每次补充每个域名最多读取一次；
+            # 分配的数量先从 host_spilled 中扣除，剩余数量不为 0 的域名放回轮转，与 _spill 的登记规则一致
+            quotas = {}
+            share = max(need // max(len(self._hosts), 1), 1)
+            for _ in range(len(self._hosts)):
+                if need <= 0:
+                    break
+                host = self._hosts.popleft()
+                limit = min(share, need, self.host_spilled[host])
+                quotas[host] = limit
+                need -= limit
+                self.host_spilled[host] -= limit
+                if self.host_spilled[host]:
+                    self._hosts.append(host)
+
+            rows = await self._run(self._read_rows, list(quotas.items()))
+
+            # 编码中带有指纹，不需要重新计算
+            requests = [self.codec.decode(data) for _, _, _, data in rows]
+
+            for host in quotas:
+                if self.host_spilled.get(host) == 0:
+                    del self.host_spilled[host]
+
+            self.spilled -= sum(quotas.values())
+            await self.memory.put_requests(requests)
+
+    def _prefetch(self):
+        """内存中的请求低于一半时在后台提前补充"""
+
+        if not self.spilled or self.memory.waiting_count > self.memory_size // 2:
             return
 
-        shuffled_keys = list(keys.keys())
-        random.shuffle(shuffled_keys)
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def get_requests(self, count):
+
+        if self.memory.waiting_count < count and self.spilled:
+            await self._refill()
 
-        tasks = []
-        remaining_count = count
+        async for request in self.memory.get_requests(count):
+            yield request
 
-        for key in shuffled_keys:
-            url_count = min(keys[key], remaining_count)
-            tasks.append(self._fetch_urls(key, url_count))
-            remaining_count -= url_count
-            if remaining_count == 0:
-                break
+        self._prefetch()
 
-        for future in asyncio.as_completed(tasks):
-            requests = await future
-            for request in requests:
-                yield request
+    def ready_delay(self) -> float:
+        return self.memory.ready_delay()
 
     async def has_request(self, request: BaseRequest):
-        return await self.conn.order_set.zscore(request.domain, request.url) is not None
+
+        if await self.memory.has_request(request):
+            return True
+
+        if request.hash in {row[2] for row in self._buffer}:
+            return True
+
+        return self.spilled > 0 and await self._run(self._exists, request.hash)
 
     async def request_size(self):
-        return sum((await self._get_url_keys_count()).values())
+        return self.memory.waiting_count + self.spilled
+
+    async def close(self):
+
+        if self._refill_task is not None and not self._refill_task.done():
+            self._refill_task.cancel()
+
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            if self.path.exists():
+                self.path.unlink()
+
+        await self._run(_close)
+        self._executor.shutdown(wait=True)
@@ -15,7 +15,17 @@ class SystemConfig:
     """系统配置项"""
 
     AioSpiderPath = Path(__file__).parent               # 工作路径
-    BackendCacheEngine = BackendEngine.queue            # url缓存方式，默认 queue（队列引擎），redis（redis引擎）
+    BackendCacheEngine = BackendEngine.queue            # url缓存方式，默认 queue（队列引擎），redis（redis引擎），disk（磁盘溢写引擎）
+    EventLoopMode = LoopMode.nested                     # 事件循环模式，nested（兼容模式），fast（高性能模式），uvloop（uvloop模式）
+    GlobalConcurrency = None                            # 多爬虫运行时所有爬虫共享的并发总数，None 表示不限制
+    StageMetrics = False                                # 是否统计请求各阶段耗时（排队、中间件、下载、解码、解析、入库）
+    StageMetricsInterval = 60                           # 各阶段耗时统计表打印间隔 秒，0 表示只在爬虫结束时打印
+    WaitingMemorySize = 10000                           # disk 引擎内存中保留的请求数量，超出部分写入磁盘
+    WaitingSpillPath = AioSpiderPath / "cache" / "waiting"    # disk 引擎溢写文件存储路径
+    ClusterNodeName = None                              # redis 引擎的节点名称，多台机器运行同一个爬虫时共享队列，None 表示根据主机名和进程号生成
+    ClusterHeartbeat = 5                                # redis 引擎的节点心跳间隔 秒
+    ClusterNodeTimeout = 30                             # redis 引擎的节点心跳超时时间 秒，超时节点持有的请求放回队列
+    OffloadWorkers = None                               # 解析进程池大小，用于 offload 回调，None 表示使用 CPU 核数
 
 
 class LoggingConfig:
@@ -67,13 +77,27 @@ class SpiderRequestConfig:
     REQUEST_USE_SESSION = False                     # 使用会话
     REQUEST_USE_METHOD = RequestWay.aiohttp         # 使用 aiohttp 库进行请求
 
-    REQUEST_CONCURRENCY_SLEEP = 1                   # 单位秒，每 task_limit 个请求休眠n秒
+    REQUEST_SCHEDULER_MODE = SchedulerMode.batch    # 调度模式，batch（批次模式），window（滑动窗口模式）
+    REQUEST_CONCURRENCY_SLEEP = 1                   # 单位秒，每 task_limit 个请求休眠n秒，仅批次模式生效
     PER_REQUEST_SLEEP = 0                           # 单位秒，每并发1个请求时休眠1秒
+    PER_HOST_DELAY = 0                              # 单位秒，同一域名两次出队的最小间隔，waiting队列在各域名之间轮转出队
+    DOMAIN_QPS = None                               # 单个域名每秒最大请求数，None表示不限制
+    DOMAIN_CONCURRENCY = None                       # 单个域名最大并发数，None表示不限制
+    # 指定域名的限速，优先级高于 DOMAIN_QPS 和 DOMAIN_CONCURRENCY，burst 为令牌桶容量，默认为1
+    # 单个请求也可以通过 Request(url, qps=1, concurrency=2) 指定限速，只作用于该请求，不改变所属域名的限速
+    DOMAIN_LIMITS = {
+        # 'www.example.com': {'qps': 1, 'concurrency': 2, 'burst': 1},
+    }
     REQUEST_TIMEOUT = 300                           # 请求最大超时时间
+    PENDING_LEASE_TIMEOUT = 600                     # 单位秒，请求下载超过该时间仍未完成时重新放回waiting队列，None表示不限制
+    CALLBACK_BUFFER_SIZE = 1000                     # 回调产生的请求缓冲数量，超过后立即写入waiting队列
 
     RETRY_ENABLED = True                            # 请求失败是否要重试
     MAX_RETRY_TIMES = 3                             # 每个请求最大重试次数，RETRY_ENABLE指定为True时生效
     RETRY_STATUS = [400, 403, 404, 500, 503]        # 重试状态码，MAX_RETRY_TIMES大于0和RETRY_ENABLE指定为True时生效
+    RETRY_BACKOFF = 1                               # 单位秒，第n次重试前等待 RETRY_BACKOFF * 2 ** (n - 1) 秒，0表示立即重试
+    RETRY_BACKOFF_MAX = 300                         # 单位秒，重试最长等待时间，响应头 Retry-After 指定的等待时间同样受此限制
+    RETRY_JITTER = 0.5                              # 重试等待时间的随机缩短比例，避免大量请求同时重试
 
     DepthPriority = True                            # 深度优先
 
@@ -193,11 +217,17 @@ class RequestFilterConfig:
     ExpireTime = 60 * 60 * 24                           # 缓存时间 秒
     CachePath = SystemConfig.AioSpiderPath / "cache"    # 数据和资源缓存路径
     FilterForever = True                                # 是否永久去重，配置此项 CACHED_EXPIRE_TIME 无效
+    FilterCapacity = 1000000                            # 内存中成功、失败请求指纹过滤器各自的容量，内存占用固定（约 4MB），超出后按倍数扩容
+    FilterErrorRate = 0.001                             # 请求指纹过滤器误判率，误判的请求被当作已完成跳过
 
     AllowedFailureTimes = 3                             # 允许最大失败次数
     IgnoreStamp = True                                  # 去重忽略时间戳
     ExcludeStamp = ['_']                                # 时间戳字段名，一般指请求中params、data中的参数
 
+    Checkpoint = False                                  # 是否开启断点续爬，定期将请求池四个队列的变更追加写入本地文件
+    CheckpointInterval = 5                              # 断点文件刷盘间隔 秒
+    CheckpointPath = SystemConfig.AioSpiderPath / "checkpoint"  # 断点文件存储路径
+
 # -------------------------------------------------------------------------------- #
 
 
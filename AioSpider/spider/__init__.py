@@ -1,8 +1,9 @@
 __all__ = [
-    'Spider', 'BatchSpider', 'BatchDaySpider'
+    'Spider', 'BatchSpider', 'BatchDaySpider', 'offload'
 ]
 
 from AioSpider.spider.spider import Spider
+from AioSpider.spider.offload import offload
 from AioSpider.spider.batch_spider import (
     BatchSpider, BatchSecondSpider, BatchMiniteSpider, BatchHourSpider,
     BatchDaySpider, BatchWeekSpider, BatchMonthSpider, BatchSeasonSpider,
@@ -0,0 +1,16 @@
+__all__ = ['offload']
+
+from typing import Callable
+
+
+def offload(func: Callable) -> Callable:
+    """
+    标记解析回调在进程池中执行，适用于 xpath、css 等CPU密集型的解析逻辑
+    注意：回调在子进程中运行，self 是未初始化的爬虫实例，只能访问类属性；只支持同步回调，meta 通过 response.request 访问
+    """
+
+    from AioSpider.core.offload import OffloadExecutor
+    OffloadExecutor.check(func)
+
+    func.__offload__ = True
+    return func
@@ -63,6 +63,8 @@ class Spider:
             call_login: Callable[[str, str], str] = None,
     ):
 
+        # 运行状态按实例复制，同一进程中运行多个爬虫时互不影响
+        self.attrs = dict(self.attrs)
         self.id: Optional[int] = None
         self.status: int = 0
         self.count: int = 0
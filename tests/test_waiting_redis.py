@@ -0,0 +1,98 @@
+"""
+WaitingRedisRequest 的多节点行为，使用 fakeredis 运行出队、租约和确认脚本，不需要 redis 服务
+"""
+
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+
+try:
+    from AioSpider.db.async_db.RedisDB.redis import AsyncRdisAPI
+except (ImportError, TypeError):
+    # aioredis 2.x 在 Python 3.11 及以上版本导入时报错
+    pytest.skip('aioredis 不可用', allow_module_level=True)
+
+from AioSpider.http import Request
+from AioSpider.requestpool.waiting import WaitingRedisRequest
+
+
+def _connector(server):
+    """两个连接共用同一个 FakeServer，与 AsyncRdisAPI 相同，另配一个不解码响应的连接"""
+
+    conn = object.__new__(AsyncRdisAPI)
+    conn._pool = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    binary = object.__new__(AsyncRdisAPI)
+    binary._pool = fakeredis.FakeAsyncRedis(server=server)
+    binary._binary = None
+    conn._binary = binary
+
+    return {'redis': {'DEFAULT': conn}}
+
+
+def _requests(count, hosts=5):
+    return [Request(f'http://a{i % hosts}.example.com/{i}') for i in range(count)]
+
+
+def test_concurrent_pop_without_duplicates():
+    """两个节点同时出队，每个请求只被一个节点取到"""
+
+    async def main():
+        server = fakeredis.FakeServer()
+        a = WaitingRedisRequest(_connector(server), name='test', node='a')
+        b = WaitingRedisRequest(_connector(server), name='test', node='b')
+
+        requests = _requests(200)
+        await a.put_requests(requests)
+
+        async def drain(waiting):
+            hashes = []
+            while True:
+                batch = [request.hash async for request in waiting.get_requests(7)]
+                if not batch:
+                    return hashes
+                hashes.extend(batch)
+                await asyncio.sleep(0)
+
+        return requests, await asyncio.gather(drain(a), drain(b))
+
+    requests, (got_a, got_b) = asyncio.run(main())
+
+    assert got_a and got_b
+    assert len(got_a) + len(got_b) == len(requests)
+    assert not set(got_a) & set(got_b)
+    assert set(got_a) | set(got_b) == {request.hash for request in requests}
+
+
+def test_lease_expiry_requeues_request():
+    """节点取出请求后未确认，租约过期后其他节点可以再次取到，确认后从队列中删除"""
+
+    async def main():
+        server = fakeredis.FakeServer()
+        a = WaitingRedisRequest(_connector(server), name='test', node='a', lease=0.2)
+        b = WaitingRedisRequest(_connector(server), name='test', node='b', lease=0.2)
+
+        request = _requests(1)[0]
+        await a.put_request(request)
+
+        first = [r.hash async for r in a.get_requests(10)]
+        leased = [r.hash async for r in b.get_requests(10)]
+        leased_size = await b.request_size()
+
+        await asyncio.sleep(0.3)
+        second = [r.hash async for r in b.get_requests(10)]
+
+        b.ack(request)
+        await b.close()
+
+        return first, leased, leased_size, second, await a.request_size(), await a.has_request(request)
+
+    first, leased, leased_size, second, size, exists = asyncio.run(main())
+
+    assert first == [_requests(1)[0].hash]
+    # 租约期间其他节点取不到，也不计入排队数量
+    assert leased == [] and leased_size == 0
+    assert second == first
+    assert size == 0 and not exists